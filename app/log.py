@@ -0,0 +1,122 @@
+"""
+JSON lines logging for production, selected with `LOG_FORMAT = "json"`.
+
+Request threads only put records on a queue; a `QueueListener` thread formats
+them, tracebacks included, and writes them out. Every record carries the id of
+the request it was logged during, set by `RequestLogMiddleware`.
+"""
+
+import copy
+import json
+import logging
+import queue
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+REQUEST_ID_RE = re.compile(r"^[\w.-]{1,128}$")
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes of every LogRecord, the others were passed in `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+access_logger = logging.getLogger("app.requests")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueJSONHandler(QueueHandler):
+    """
+    Queues records for a listener thread writing them as JSON lines to
+    `stream`.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JSONFormatter())
+        self.listener = QueueListener(self.queue, target)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Only merge the arguments, which may change once the call returns.
+        # The listener formats the rest, including the traceback.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def close(self):
+        # Called by logging.shutdown at exit, writes out the queued records
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+class RequestLogMiddleware:
+    """
+    Gives each request an id, from the `X-Request-ID` header of the proxy or
+    generated, returned in the same header, and logs one line per request
+    with its status and duration.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        header = request.headers.get("X-Request-ID", "")
+        # Ids are logged and echoed, only trust short plain ones
+        request.id = header if REQUEST_ID_RE.match(header) else uuid.uuid4().hex
+        # Not reset afterwards: Django logs error responses, and runserver
+        # each request, once the middleware returned. The next request of the
+        # thread replaces it.
+        request_id.set(request.id)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        user = getattr(request, "user", None)
+        access_logger.info(
+            "%s %s %s",
+            request.method,
+            request.path,
+            response.status_code,
+            extra={
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+                "user_id": user.id if user is not None and user.is_authenticated else None,
+            },
+        )
+        response["X-Request-ID"] = request.id
+        return response
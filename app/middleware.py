@@ -0,0 +1,154 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import SAFE_METHODS, ReplicaState, pin_to_primary, replica_request
+
+logger = logging.getLogger(__name__)
+
+# Collapses the placeholders of IN lists, whose length varies with the rows
+IN_LIST_RE = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the reads of safe requests use the read replicas, and pins users to
+    the primary after they write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        state = None
+        if safe:
+            # Resolves the session user before any read is routed
+            user = getattr(request, "user", None)
+            state = ReplicaState(user.pk if user and user.is_authenticated else None)
+        token = replica_request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_request.reset(token)
+
+        user = getattr(request, "user", None)
+        if not safe and response.status_code < 400 and user and user.is_authenticated:
+            pin_to_primary(user)
+        return response
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql: str) -> str:
+    return NUMBER_RE.sub("?", IN_LIST_RE.sub("(%s...)", sql))
+
+
+class QueryStats:
+    """
+    Database execute wrapper recording the queries of a request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+        self.fingerprint_durations: Counter = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            key = fingerprint(sql)
+            self.duration += elapsed
+            self.count += 1
+            self.fingerprints[key] += 1
+            self.fingerprint_durations[key] += elapsed
+
+    def fork(self) -> "QueryStats":
+        """
+        Returns empty stats for queries run on another thread, see `merge`.
+        """
+        return type(self)()
+
+    def merge(self, other: "QueryStats") -> None:
+        self.count += other.count
+        self.duration += other.duration
+        self.fingerprints.update(other.fingerprints)
+        self.fingerprint_durations.update(other.fingerprint_durations)
+
+    def duplicates(self, threshold: int) -> Dict[str, int]:
+        return {sql: count for sql, count in self.fingerprints.items() if count >= threshold}
+
+    def slowest(self, limit: int) -> List[Dict]:
+        return [
+            {"sql": sql, "count": self.fingerprints[sql], "duration_ms": round(duration * 1000, 2)}
+            for sql, duration in self.fingerprint_durations.most_common(limit)
+        ]
+
+
+def get_query_budget(view, request) -> Optional[int]:
+    """
+    Returns the number of queries the view may run for the request, from the
+    `query_budgets` dict of the view keyed by action (or lowercased method for
+    views without actions), else `QUERY_BUDGET_DEFAULT`.
+    """
+    budgets = getattr(view, "query_budgets", {})
+    action = getattr(view, "action", None) or request.method.lower()
+    return budgets.get(action, getattr(settings, "QUERY_BUDGET_DEFAULT", None))
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the queries, duplicated SQL and database time of each request, and
+    logs, or raises with `QUERY_BUDGET_RAISE`, when a view exceeds its query
+    budget or repeats a query `QUERY_BUDGET_DUPLICATE_THRESHOLD` times, the
+    usual sign of a per-row query. The stats are kept on `request.query_stats`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", False):
+            return self.get_response(request)
+
+        stats = request.query_stats = QueryStats()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        response["Server-Timing"] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        )
+        view = getattr(response, "renderer_context", {}).get("view")
+        request.query_budget = get_query_budget(view, request)
+        self.check(request, stats)
+        return response
+
+    def check(self, request, stats: QueryStats) -> None:
+        problems = []
+        if request.query_budget is not None and stats.count > request.query_budget:
+            problems.append(f"{stats.count} queries for a budget of {request.query_budget}")
+        threshold = getattr(settings, "QUERY_BUDGET_DUPLICATE_THRESHOLD", 5)
+        for sql, count in stats.duplicates(threshold).items():
+            problems.append(f"{count} times: {sql}")
+        if not problems:
+            return
+
+        message = f"{request.method} {request.path}: " + "; ".join(problems)
+        if getattr(settings, "QUERY_BUDGET_RAISE", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,35 @@
+from django.shortcuts import get_object_or_404
+
+
+class MemoizedObjectMixin:
+    """
+    Memoizes `get_object()` for the current request.
+
+    A viewset instance only lives for one request, so the object looked up by
+    `get_serializer_class`, the permission checks and the action itself is
+    fetched once. `object_select_related` lists the relations loaded with it.
+    """
+
+    object_select_related = ()
+
+    def get_object(self):
+        if "_object" in self.__dict__:
+            return self._object
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.object_select_related:
+            queryset = queryset.select_related(*self.object_select_related)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        assert lookup_url_kwarg in self.kwargs, (
+            "Expected view %s to be called with a URL keyword argument "
+            'named "%s".' % (self.__class__.__name__, lookup_url_kwarg)
+        )
+        obj = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+
+        # Only memoize once the object permissions passed
+        self.check_object_permissions(self.request, obj)
+        self._object = obj
+        return obj
@@ -1,12 +1,21 @@
+from django.contrib.auth.models import User
 from rest_framework import permissions
 
+
+def is_owner(obj, user):
+    """
+    Whether `user` owns `obj`, comparing ids so that neither the owning
+    `User` nor, for objects with a loaded `profile`, anything else is fetched.
+    """
+    if hasattr(obj, 'profile_id'):
+        # obj is a Post or a Comment
+        return obj.profile.user_id == user.id
+    # obj is a Profile
+    return obj.user_id == user.id
+
+
 class IsAccountOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, 'profile'):
-            # obj is a Post or a Comment
-            return obj.profile.user == request.user or request.user.is_staff
-        elif hasattr(obj, 'user'):
-            # obj is a Profile
-            return obj.user == request.user or request.user.is_staff
-        else:
-            return obj.username == request.user or request.user.is_staff
\ No newline at end of file
+        if isinstance(obj, User):
+            return obj.pk == request.user.id or request.user.is_staff
+        return is_owner(obj, request.user) or request.user.is_staff
@@ -0,0 +1,244 @@
+"""
+Renderers and parsers replacing DRF's stdlib `json` ones.
+
+`ORJSONRenderer` encodes with orjson, which handles dicts, lists, datetimes
+and UUIDs natively and is several times faster on large pages. Other values,
+e.g. lazy translations, Decimals or querysets, go through the same fallback
+as DRF's `JSONEncoder`. `MessagePackRenderer` answers clients sending
+`Accept: application/msgpack` when msgpack is installed.
+
+`CompactJSONRenderer` is an opt-in columnar format meant for the large list
+endpoints, see `CompactEncoder`.
+"""
+
+import codecs
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+import orjson
+from django.conf import settings
+from django.utils.http import parse_header_parameters
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    # Optional, see MessagePackRenderer
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+
+def default(value):
+    # Raises TypeError for the values it cannot encode either
+    return _encoder.default(value)
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def get_options(self, accepted_media_type, renderer_context) -> int:
+        options = orjson.OPT_NON_STR_KEYS
+        # orjson only indents by 2, any requested indent gets that, e.g. the
+        # browsable API's
+        params = parse_header_parameters(accepted_media_type)[1] if accepted_media_type else {}
+        if params.get("indent", "0") != "0" or (renderer_context or {}).get("indent"):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return orjson.dumps(
+            data, default=default, option=self.get_options(accepted_media_type, renderer_context)
+        )
+
+
+class ORJSONParser(BaseParser):
+    media_type = "application/json"
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if codecs.lookup(encoding).name != "utf-8":
+                content = content.decode(encoding).encode()
+            return orjson.loads(content)
+        except (ValueError, UnicodeError) as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=default, datetime=False)
+
+
+# Fields whose values repeat across rows, by the lookup table storing them
+COMPACT_LOOKUPS = {"profile": "profiles", "tags": "tags"}
+
+# Values copied as they are into the compact format
+SCALAR_TYPES = (str, int, float)
+
+
+def is_scalar(value) -> bool:
+    return value is None or isinstance(value, SCALAR_TYPES)
+
+
+def all_scalar(values: list) -> bool:
+    # Checks each type once, values are mostly of one or two types
+    return all(
+        kind is type(None) or issubclass(kind, SCALAR_TYPES) for kind in set(map(type, values))
+    )
+
+
+class CompactEncoder:
+    """
+    Rewrites serialized data in the compact format: every list of objects
+    becomes a table of its field names and row arrays, e.g.
+
+        {"fields": ["id", "profile", "images"],
+         "nested": {"images": ["id", "image", "thumbnail"]},
+         "rows": [[1, 0, [[7, "a.jpg", "a_thumb.jpg"]]]]}
+
+    Lists of objects inside rows, like the post images, are row arrays too,
+    their fields listed in `nested`. Values of the `lookups` fields are
+    replaced by their index in a lookup table shared by the whole response,
+    returned in `lookups`.
+    """
+
+    def __init__(self, lookups: Dict[str, str] = COMPACT_LOOKUPS):
+        self.lookups = lookups
+        self.tables: Dict[str, Dict] = {}
+
+    def encode(self, data):
+        if is_scalar(data):
+            return data
+        if isinstance(data, dict):
+            return {key: self.encode(value) for key, value in data.items()}
+        if isinstance(data, list):
+            if data and all(isinstance(item, dict) for item in data):
+                return self.tabulate(data)
+            return [self.encode(item) for item in data]
+        return data
+
+    def tabulate(self, items: List[dict]) -> dict:
+        fields = list(dict.fromkeys(chain.from_iterable(items)))
+        nested = {}
+        rows = self.rows(items, fields, nested)
+        table = {"fields": fields}
+        if nested:
+            table["nested"] = nested
+        table["rows"] = rows
+        return table
+
+    def rows(self, items: List[dict], fields: List[str], nested: Optional[Dict] = None) -> list:
+        """
+        Returns the rows of `items`. Columns holding lists of objects are
+        turned into rows as well and their fields added to `nested`, or
+        encoded as tables when `nested` is None.
+        """
+        # Rows are read whole, then the few columns which need it rewritten
+        if len(fields) > 1 and set(map(len, items)) == {len(fields)}:
+            get = itemgetter(*fields)
+            rows = [list(get(item)) for item in items]
+        else:
+            rows = [[item.get(field) for field in fields] for item in items]
+
+        for column, field in enumerate(fields):
+            values = [row[column] for row in rows]
+            if field in self.lookups:
+                values = self.lookup(self.lookups[field], values)
+            elif all_scalar(values):
+                continue
+            else:
+                children = self.nested_items(values) if nested is not None else None
+                if children is not None:
+                    names = list(dict.fromkeys(chain.from_iterable(children)))
+                    nested[field] = names
+                    # Rows of all the lists at once, then split back
+                    child_rows = iter(self.rows(children, names))
+                    values = [
+                        value if value is None else list(islice(child_rows, len(value)))
+                        for value in values
+                    ]
+                else:
+                    values = [self.encode(value) for value in values]
+            for row, value in zip(rows, values):
+                row[column] = value
+        return rows
+
+    @staticmethod
+    def nested_items(values: list) -> Optional[List[dict]]:
+        """
+        Returns the objects of a column holding lists of objects, None for
+        other columns.
+        """
+        lists = [value for value in values if value is not None]
+        if not lists or set(map(type, lists)) != {list}:
+            return None
+        items = list(chain.from_iterable(lists))
+        if not items or not all(issubclass(kind, dict) for kind in set(map(type, items))):
+            return None
+        return items
+
+    def lookup(self, name: str, values: list) -> list:
+        """
+        Replaces values, or the items of list values, by their index in the
+        `name` lookup table.
+        """
+        table = self.tables.setdefault(name, {})
+        index = table.setdefault
+        result = []
+        for value in values:
+            if isinstance(value, (str, int)):
+                result.append(index(value, len(table)))
+                continue
+            if isinstance(value, list):
+                try:
+                    result.append([index(item, len(table)) for item in value])
+                    continue
+                except TypeError:
+                    # Unhashable items, e.g. objects
+                    pass
+            result.append(self.encode(value))
+        return result
+
+    def result(self, data):
+        encoded = self.encode(data)
+        if self.tables and isinstance(encoded, dict):
+            encoded["lookups"] = {name: list(table) for name, table in self.tables.items()}
+        return encoded
+
+
+def compact(data, lookups: Dict[str, str] = COMPACT_LOOKUPS):
+    return CompactEncoder(lookups).result(data)
+
+
+class CompactJSONRenderer(ORJSONRenderer):
+    """
+    Renders responses in the compact format of `CompactEncoder`, selected
+    with `?format=compact` or `Accept: application/vnd.instagram-clone.compact+json`.
+    """
+
+    media_type = "application/vnd.instagram-clone.compact+json"
+    format = "compact"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return super().render(compact(data), accepted_media_type, renderer_context)
+
@@ -0,0 +1,105 @@
+"""
+Read replica routing.
+
+`ReplicaRoutingMiddleware` marks safe requests as replica readable, and
+`ReplicaRouter` then sends their reads to one of `DATABASE_REPLICAS`. Writes
+always go to the primary. After a successful write a user is pinned to the
+primary for `DATABASE_REPLICA_PIN_SECONDS`, so they read their own writes
+while the replicas catch up.
+
+The router never evaluates `request.user`, whose lazy loading queries the
+database and would route again. The middleware records the session user it
+already resolved, and the API authentication records the token user.
+
+Pins are stored in `DATABASE_REPLICA_PIN_CACHE_ALIAS`, which must be shared by
+all workers: with a process local cache, e.g. the default `LocMemCache`, the
+other workers would not see a pin, so authenticated users always read from the
+primary and only anonymous requests use the replicas.
+"""
+
+import random
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class ReplicaState:
+    """
+    Routing state of a safe request.
+    """
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.pinned: Optional[bool] = None
+
+
+# The state of the request whose reads may use a replica, if any
+replica_request: ContextVar[Optional[ReplicaState]] = ContextVar("replica_request", default=None)
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_cache():
+    return caches[getattr(settings, "DATABASE_REPLICA_PIN_CACHE_ALIAS", "default")]
+
+
+def can_pin() -> bool:
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def _pin_key(user_id) -> str:
+    return f"db:pin:{user_id}"
+
+
+def pin_to_primary(user) -> None:
+    if can_pin():
+        get_cache().set(
+            _pin_key(user.pk), True, getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10)
+        )
+
+
+def set_replica_user(user) -> None:
+    """
+    Records the authenticated user of the current request, once resolved.
+    """
+    state = replica_request.get()
+    if state is not None and user is not None and user.is_authenticated:
+        state.user_id = user.pk
+        state.pinned = None
+
+
+def is_pinned(state: ReplicaState) -> bool:
+    if state.user_id is None:
+        # Anonymous, or not authenticated yet
+        return False
+    if state.pinned is None:
+        state.pinned = not can_pin() or bool(get_cache().get(_pin_key(state.user_id)))
+    return state.pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        replicas = get_replicas()
+        state = replica_request.get()
+        if not replicas or state is None:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or is_pinned(state):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # Replicas hold the same data as the primary
+        return True
@@ -1,3 +1,14 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import yaml
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_cache_control
 from rest_framework.renderers import TemplateHTMLRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
@@ -6,7 +17,93 @@ from rest_framework.views import APIView
 from drf_spectacular.plumbing import get_relative_url, set_query_parameters
 from drf_spectacular.settings import spectacular_settings
 from drf_spectacular.utils import extend_schema
-from drf_spectacular.views import AUTHENTICATION_CLASSES
+from drf_spectacular.views import AUTHENTICATION_CLASSES, SpectacularAPIView
+
+
+@dataclass
+class RenderedSchema:
+    content: bytes
+    content_type: str
+    etag: str
+
+
+_schemas: Dict[Tuple, dict] = {}
+_rendered: Dict[Tuple, RenderedSchema] = {}
+_rendered_lock = threading.Lock()
+
+
+def is_cache_enabled() -> bool:
+    return getattr(settings, "SCHEMA_CACHE_ENABLED", False)
+
+
+def reset_schema_cache() -> None:
+    with _rendered_lock:
+        _schemas.clear()
+        _rendered.clear()
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    Serves the OpenAPI schema rendered once per process instead of walking
+    every view on each request. The schema is read from `SCHEMA_FILE` when
+    set, e.g. generated at build time with `manage.py spectacular --file`,
+    else generated on the first request. The YAML and JSON bytes are kept
+    with an ETag, so documentation pages reloading the schema get a 304.
+    """
+
+    def _get_schema_response(self, request):
+        if not is_cache_enabled():
+            return super()._get_schema_response(request)
+
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        renderer = request.accepted_renderer
+        schema_key = (version, translation.get_language())
+        key = (*schema_key, renderer.media_type)
+        rendered = _rendered.get(key)
+        if rendered is None:
+            with _rendered_lock:
+                rendered = _rendered.get(key)
+                if rendered is None:
+                    # Every format renders the same generated schema
+                    if schema_key not in _schemas:
+                        _schemas[schema_key] = self._load_schema(version)
+                    rendered = _rendered[key] = self._render(
+                        request, _schemas[schema_key], renderer
+                    )
+
+        if request.headers.get("If-None-Match") == rendered.etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(rendered.content, content_type=rendered.content_type)
+            response["Content-Disposition"] = (
+                f'inline; filename="{self._get_filename(request, version)}"'
+            )
+        response["ETag"] = rendered.etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def _load_schema(self, version: Optional[str]) -> dict:
+        schema_file = getattr(settings, "SCHEMA_FILE", "")
+        # The file holds the default version of the schema only
+        if schema_file and version is None and os.path.exists(schema_file):
+            with open(schema_file) as schema:
+                return yaml.safe_load(schema)
+        generator = self.generator_class(
+            urlconf=self.urlconf, api_version=version, patterns=self.patterns
+        )
+        # Without a request, the schema is the same for every user
+        return generator.get_schema(request=None, public=True)
+
+    def _render(self, request, schema: dict, renderer) -> RenderedSchema:
+        content = renderer.render(schema, renderer.media_type, {"request": request})
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        return RenderedSchema(
+            content=content,
+            content_type=content_type,
+            etag=f'"{hashlib.sha256(content).hexdigest()[:32]}"',
+        )
 
 
 class SpectacularElementsView(APIView):
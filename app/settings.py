@@ -12,7 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
+import importlib.util
 import json
 import os
 
@@ -30,6 +31,14 @@ if FILE_UPLOAD_STORAGE == "local":
     MEDIA_ROOT_NAME = "media"
     MEDIA_ROOT = os.path.join(BASE_DIR, MEDIA_ROOT_NAME)
     MEDIA_URL = f"/{MEDIA_ROOT_NAME}/"
+    STORAGES = {
+        "default": {
+            "BACKEND": "app.storage.TimedFileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
 
 
 # Quick-start development settings - unsuitable for production
@@ -66,7 +75,7 @@ else:
     ]
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3.S3Storage",
+            "BACKEND": "app.storage.TimedS3Storage",
             "OPTIONS": {
                 "location": "media",
             },
@@ -104,15 +113,78 @@ else:
         }
     }
 
+# Read replicas, as SQLite file names or server hosts depending on the engine.
+# Safe requests read from them, see app/routers.py.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(config("SQL_REPLICAS", default="", cast=Csv())):
+    alias = f"replica_{index + 1}"
+    location = "NAME" if DATABASES["default"]["ENGINE"].endswith("sqlite3") else "HOST"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        location: replica,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["app.routers.ReplicaRouter"]
+# Seconds a user keeps reading from the primary after a write. The pins need a
+# cache shared by the workers, with a process local one authenticated users
+# always read from the primary.
+DATABASE_REPLICA_PIN_SECONDS = 10
+DATABASE_REPLICA_PIN_CACHE_ALIAS = "default"
+
+# Per request query accounting, see app/middleware.py. Views declare budgets
+# per action in a `query_budgets` dict, the others get QUERY_BUDGET_DEFAULT.
+QUERY_BUDGET_ENABLED = config("QUERY_BUDGET_ENABLED", default=DEBUG, cast=bool)
+QUERY_BUDGET_RAISE = config("QUERY_BUDGET_RAISE", default=False, cast=bool)
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGET_DUPLICATE_THRESHOLD = 5
+
+# Request profiling, see profiling/middleware.py. Staff users profile a request
+# by sending PROFILING_HEADER, other requests are sampled at PROFILING_SAMPLE_RATE.
+# Profiles are listed and downloaded from /api/profiling/.
+PROFILING_ENABLED = config("PROFILING_ENABLED", default=True, cast=bool)
+PROFILING_HEADER = "X-Profile"
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)
+PROFILING_DIRECTORY = config(
+    "PROFILING_DIRECTORY", default=os.path.join(BASE_DIR, "request_profiles")
+)
+PROFILING_MAX_FILES = 200
+
+# Prometheus metrics, see metrics/registry.py, served on /metrics/ to the
+# scrapers sending METRICS_TOKEN, or without a token to METRICS_ALLOWED_IPS.
+# With several worker processes METRICS_DIRECTORY must be set, entrypoint.sh
+# empties it on startup.
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="127.0.0.1,::1", cast=Csv())
+METRICS_DIRECTORY = config("METRICS_DIRECTORY", default=None)
+METRICS_FLUSH_INTERVAL = 5
+
+
+# "rich" renders colored console logs while developing, "json" writes JSON
+# lines from a background thread, see app/log.py.
+LOG_FORMAT = config("LOG_FORMAT", default="rich")
+LOG_HANDLERS = {
+    "rich": {
+        "class": "rich.logging.RichHandler",  # <-- this
+    },
+    "json": {
+        "class": "app.log.QueueJSONHandler",
+        "filters": ["request_id"],
+    },
+}
 
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "handlers": {
-        "console": {
-            "class": "rich.logging.RichHandler",  # <-- this
+    "filters": {
+        "request_id": {
+            "()": "app.log.RequestIdFilter",
         },
     },
+    "handlers": {
+        "console": LOG_HANDLERS[LOG_FORMAT],
+    },
     "root": {
         "handlers": ["console"],
         "level": "INFO",
@@ -123,6 +195,10 @@ LOGGING = {
             "level": os.getenv("DJANGO_LOG_LEVEL", "INFO"),
             "propagate": False,
         },
+        # One line per request, runserver already logs them while developing
+        "app.requests": {
+            "level": "INFO" if LOG_FORMAT == "json" else "WARNING",
+        },
     },
 }
 
@@ -144,6 +220,9 @@ INSTALLED_APPS = [
     "tags",
     "feed",
     "search",
+    "benchmarks",
+    "profiling",
+    "metrics",
     "django_extensions",
     "rest_framework_simplejwt.token_blacklist",
     "corsheaders",
@@ -152,11 +231,26 @@ INSTALLED_APPS = [
     "drf_spectacular",
 ]
 
+# orjson encodes and decodes JSON, see app/renderers.py. Clients may ask for
+# MessagePack with `Accept: application/msgpack` when msgpack is installed, and
+# for the columnar compact format with `?format=compact`.
+DEFAULT_RENDERER_CLASSES = ["app.renderers.ORJSONRenderer"]
+if importlib.util.find_spec("msgpack") is not None:
+    DEFAULT_RENDERER_CLASSES.append("app.renderers.MessagePackRenderer")
+DEFAULT_RENDERER_CLASSES.append("app.renderers.CompactJSONRenderer")
+DEFAULT_RENDERER_CLASSES.append("rest_framework.renderers.BrowsableAPIRenderer")
+
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": DEFAULT_RENDERER_CLASSES,
+    "DEFAULT_PARSER_CLASSES": [
+        "app.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 9,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "auth.authentication.StatelessJWTAuthentication",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
         "app.throttles.BurstRateThrottle",
@@ -165,10 +259,59 @@ REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_RATES": {
         "burst": "30/min",
         "sustained": "1000/day",
+        "autocomplete": "120/min",
     },
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Text search configuration used for the PostgreSQL full-text index
+SEARCH_TEXT_CONFIG = config("SEARCH_TEXT_CONFIG", default="english")
+
+# Post search backend, "search.backends.inverted_index.InvertedIndexBackend" serves
+# search from an on-disk index at SEARCH_INDEX_PATH (see `manage.py rebuild_search_index`)
+SEARCH_BACKEND = config(
+    "SEARCH_BACKEND", default="search.backends.database.DatabaseSearchBackend"
+)
+SEARCH_INDEX_PATH = config("SEARCH_INDEX_PATH", default=str(BASE_DIR / "search_index.bin"))
+# Maximum number of post ids a search returns
+SEARCH_MAX_RESULTS = 1000
+# Threads running the post and profile searches of a combined search in parallel
+SEARCH_CONCURRENCY = 4
+# Cache of search result ids, invalidated by versioned keys bumped on writes
+SEARCH_CACHE_ENABLED = True
+SEARCH_CACHE_ALIAS = "default"
+SEARCH_CACHE_TIMEOUT = 300
+
+# Bloom filter in front of the refresh token blacklist, see auth/blacklist.py.
+# Workers share revocations through the cache, the filter is disabled when
+# TOKEN_BLACKLIST_CACHE_ALIAS is a process local cache like the default LocMemCache.
+TOKEN_BLACKLIST_BLOOM_ENABLED = config("TOKEN_BLACKLIST_BLOOM_ENABLED", default=True, cast=bool)
+TOKEN_BLACKLIST_BLOOM_CAPACITY = 10000
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = 0.001
+TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL = 300
+TOKEN_BLACKLIST_CACHE_ALIAS = "default"
+
+# Number of profiles and tags returned by the autocomplete endpoint
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 25
+# "database" or "memory", the latter serves typeahead from an in-process index
+# loaded at startup from AUTOCOMPLETE_SNAPSHOT_PATH (see `manage.py
+# rebuild_autocomplete`, run by entrypoint.sh), the database answers until then
+AUTOCOMPLETE_ENGINE = config("AUTOCOMPLETE_ENGINE", default="database")
+AUTOCOMPLETE_SNAPSHOT_PATH = config(
+    "AUTOCOMPLETE_SNAPSHOT_PATH", default=str(BASE_DIR / "search_autocomplete.json")
+)
+# Seconds between checks for a snapshot rebuilt by another process. Writes only
+# update the index of their own worker, the others see them once the snapshot
+# is rebuilt, so schedule `rebuild_autocomplete` accordingly.
+AUTOCOMPLETE_RELOAD_INTERVAL = 60
+
+# The OpenAPI schema is rendered once per process, from SCHEMA_FILE when set
+# (generated by entrypoint.sh), see app/schema.py. Disabled while developing
+# so the schema follows code changes.
+SCHEMA_CACHE_ENABLED = config("SCHEMA_CACHE_ENABLED", default=not DEBUG, cast=bool)
+SCHEMA_FILE = config("SCHEMA_FILE", default="")
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Instagram DRF Clone",
     "DESCRIPTION": "This Instagram DRF Clone is a full-fledged social media platform built using Django Rest Framework. It provides a range of functionalities similar to the original Instagram platform, including user authentication, profile management, post creation, commenting, tagging, searching, and more. POST to /api/users/ to create an account then POST to /api/token/ to retrieve your token. Use your token with the Authorize button to begin making authenticated requests to the API.",
@@ -179,11 +322,16 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    "app.log.RequestLogMiddleware",
+    "metrics.middleware.MetricsMiddleware",
+    "app.middleware.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "app.middleware.ReplicaRoutingMiddleware",
+    "profiling.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
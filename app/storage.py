@@ -0,0 +1,43 @@
+import time
+
+from django.core.files.storage import FileSystemStorage
+from storages.backends.s3 import S3Storage
+
+from metrics.instruments import STORAGE_DURATION
+
+
+class TimedStorageMixin:
+    """
+    Records the duration of the storage operations in the
+    `storage_operation_duration_seconds` metric.
+    """
+
+    def _timed(self, operation: str, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            STORAGE_DURATION.observe(time.perf_counter() - start, operation=operation)
+
+    def _open(self, name, mode="rb"):
+        return self._timed("open", super()._open, name, mode)
+
+    def _save(self, name, content):
+        return self._timed("save", super()._save, name, content)
+
+    def delete(self, name):
+        return self._timed("delete", super().delete, name)
+
+    def exists(self, name):
+        return self._timed("exists", super().exists, name)
+
+    def size(self, name):
+        return self._timed("size", super().size, name)
+
+
+class TimedFileSystemStorage(TimedStorageMixin, FileSystemStorage):
+    pass
+
+
+class TimedS3Storage(TimedStorageMixin, S3Storage):
+    pass
@@ -0,0 +1,115 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.test import SimpleTestCase as DjangoSimpleTestCase
+from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase as DjangoTransactionTestCase
+from django.urls import reverse
+
+from app.urls import router
+
+
+def router_get_urls(
+    lookups: Dict[str, str],
+    exclude: Iterable[str] = (),
+    query_params: Optional[Dict[str, dict]] = None,
+) -> List[Tuple[str, str]]:
+    """
+    Returns the (url name, url) of every GET route of the API router. Detail
+    routes are only included for the basenames given a lookup value, and
+    `query_params` adds query strings by url name.
+    """
+    query_params = query_params or {}
+    urls = []
+    for prefix, viewset, basename in router.registry:
+        routes = []
+        if hasattr(viewset, "list"):
+            routes.append(("list", False))
+        if hasattr(viewset, "retrieve"):
+            routes.append(("detail", True))
+        for action in viewset.get_extra_actions():
+            # Routes taking more URL arguments than the lookup are left out
+            if "get" in action.mapping and "(?P<" not in action.url_path:
+                routes.append((action.url_name, action.detail))
+
+        for url_name, detail in routes:
+            name = f"{basename}-{url_name}"
+            if name in exclude or (detail and basename not in lookups):
+                continue
+            kwargs = {viewset.lookup_field: lookups[basename]} if detail else {}
+            url = reverse(name, kwargs=kwargs)
+            if name in query_params:
+                url = f"{url}?{urlencode(query_params[name])}"
+            urls.append((name, url))
+    return urls
+
+
+class QueryBudgetTestMixin:
+    """
+    Requests every GET endpoint of the router, checking that it stays within
+    its query budget and that its number of queries does not grow with the
+    number of rows it returns.
+    """
+
+    def count_queries(self, url: str) -> int:
+        # Throttles would reject the many requests of a test
+        with self.settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=False), mock.patch(
+            "rest_framework.views.APIView.check_throttles"
+        ):
+            response = self.client.get(url)
+        self.assertLess(response.status_code, 400, f"{url} returned {response.status_code}")
+        stats = response.wsgi_request.query_stats
+        budget = response.wsgi_request.query_budget
+        if budget is not None:
+            self.assertLessEqual(stats.count, budget, f"{url} exceeds its query budget")
+        return stats.count
+
+    def assertQueryBudgets(
+        self,
+        lookups: Dict[str, str],
+        add_rows: Callable[[], None],
+        exclude: Iterable[str] = (),
+        query_params: Optional[Dict[str, dict]] = None,
+    ) -> None:
+        urls = router_get_urls(lookups, exclude, query_params)
+        for _, url in urls:
+            # The first request fills caches which later requests skip
+            self.count_queries(url)
+        before = {url: self.count_queries(url) for _, url in urls}
+
+        add_rows()
+        for name, url in urls:
+            with self.subTest(name):
+                self.assertEqual(
+                    self.count_queries(url),
+                    before[url],
+                    f"{url} runs queries per row",
+                )
+
+
+class CacheClearingMixin:
+    """
+    Clears the caches before every test. Throttle counters, search results and
+    the like would otherwise leak from one test into the next, e.g. get a
+    later test's requests throttled. Done in `run`, so test classes need not
+    call `super().setUp()`.
+    """
+
+    def run(self, result=None):
+        for cache in caches.all():
+            cache.clear()
+        return super().run(result)
+
+
+class SimpleTestCase(CacheClearingMixin, DjangoSimpleTestCase):
+    pass
+
+
+class TransactionTestCase(CacheClearingMixin, DjangoTransactionTestCase):
+    pass
+
+
+class TestCase(CacheClearingMixin, DjangoTestCase):
+    pass
@@ -0,0 +1,335 @@
+import datetime
+import decimal
+import io
+import json
+import logging
+import tempfile
+import uuid
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+from .log import QueueJSONHandler, RequestIdFilter, RequestLogMiddleware, request_id
+from .middleware import ReplicaRoutingMiddleware
+from .renderers import MessagePackRenderer, ORJSONParser, ORJSONRenderer, compact, msgpack
+from .routers import ReplicaRouter, set_replica_user
+from .schema import reset_schema_cache
+from .testing import QueryBudgetTestMixin, SimpleTestCase, TestCase
+from .throttles import SlidingWindowRateThrottle
+
+
+class FiveASecondThrottle(SlidingWindowRateThrottle):
+    rate = '5/sec'
+
+
+class SlidingWindowRateThrottleTestCase(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.request = APIRequestFactory().get('/')
+        self.request.user = None
+
+    def throttle(self):
+        throttle = FiveASecondThrottle()
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def test_limits_within_window(self):
+        results = [self.throttle().allow_request(self.request, None) for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+
+    def test_previous_window_is_weighted(self):
+        for _ in range(5):
+            self.throttle().allow_request(self.request, None)
+
+        # Half of the previous window still overlaps: 5 * 0.5 + 2 allowed
+        self.now = 1001.5
+        results = [self.throttle().allow_request(self.request, None) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+        throttle = self.throttle()
+        self.assertFalse(throttle.allow_request(self.request, None))
+        self.assertAlmostEqual(throttle.wait(), 0.1)
+
+    def test_rejected_requests_are_not_counted(self):
+        for _ in range(20):
+            self.throttle().allow_request(self.request, None)
+        self.now = 1002.0
+        self.assertTrue(self.throttle().allow_request(self.request, None))
+
+    def test_action_costs(self):
+        view = APIView()
+        view.action = 'download'
+        view.throttle_costs = {'download': 3}
+        throttle = self.throttle()
+        self.assertTrue(throttle.allow_request(self.request, view))
+        throttle = self.throttle()
+        self.assertFalse(throttle.allow_request(self.request, view))
+        self.assertAlmostEqual(throttle.wait(), 1 + (1 - 2 / 3))
+        # Cheaper actions still fit in what is left
+        view.action = 'retrieve'
+        self.assertTrue(self.throttle().allow_request(self.request, view))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'],
+    # Pins need a cache shared between processes
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp(),
+        }
+    },
+)
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = SimpleNamespace(pk=1, is_authenticated=True)
+        self.aliases = []
+
+    def view(self, request):
+        # The API authentication records the token user
+        set_replica_user(self.user)
+        request.user = self.user
+        self.aliases.append(ReplicaRouter().db_for_read(None))
+        return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+    def test_reads_use_replicas_until_write(self):
+        middleware = ReplicaRoutingMiddleware(self.view)
+        middleware(self.factory.get('/'))
+        middleware(self.factory.post('/'))
+        middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases, ['replica_1', 'default', 'default'])
+        self.assertEqual(ReplicaRouter().db_for_read(None), 'default')
+
+        self.user = SimpleNamespace(pk=2, is_authenticated=True)
+        middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases[-1], 'replica_1')
+
+    def test_local_cache_reads_primary_when_authenticated(self):
+        middleware = ReplicaRoutingMiddleware(self.view)
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        ):
+            middleware(self.factory.get('/'))
+            self.user = None
+            middleware(self.factory.get('/'))
+        self.assertEqual(self.aliases, ['default', 'replica_1'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaSessionTestCase(TestCase):
+    def test_session_user_is_resolved_before_routing(self):
+        # Loading the session user must not route through the router again
+        user = User.objects.create_user(username='admin', password='rootroot', is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        from comments.models import Comment
+        from posts.models import Post
+        from tags.models import Tag
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='rootroot', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.profile = self.user.profile
+        self.post = Post.objects.create(title='First', body='body', profile=self.profile)
+        self.tag = Tag.objects.create(name='first')
+        self.comment = Comment.objects.create(profile=self.profile, post=self.post, body='hi')
+        self.rows = 0
+        self.add_rows(1)
+
+    def add_rows(self, count):
+        from comments.models import Comment
+        from posts.models import Post
+        from tags.models import Tag
+
+        for _ in range(count):
+            self.rows += 1
+            other = User.objects.create_user(username=f'user{self.rows}', password='rootroot').profile
+            post = Post.objects.create(title=f'Post {self.rows}', body='body', profile=self.profile)
+            tag = Tag.objects.create(name=f'tag{self.rows}')
+            post.tags.add(tag, self.tag)
+            post.likes.add(other)
+            self.post.tags.add(tag)
+            self.post.likes.add(other)
+            self.profile.follows.add(other)
+            self.profile.followed_by.add(other)
+            self.profile.favorite_posts.add(post)
+            other.favorite_posts.add(post)
+            Comment.objects.create(profile=other, post=post, body='hi')
+            Comment.objects.create(profile=other, post=self.post, body='hi')
+            self.comment.likes.add(other)
+
+    def test_router_query_budgets(self):
+        self.assertQueryBudgets(
+            {
+                'users': 'alice',
+                'profiles': 'alice',
+                'posts': self.post.slug,
+                'tags': self.tag.slug,
+                'comments': self.comment.id,
+            },
+            lambda: self.add_rows(6),
+            # Users cannot be retrieved, downloads fetch the images over HTTP
+            exclude=['users-detail', 'posts-download'],
+            query_params={'comments-list': {'post_id': self.post.id}},
+        )
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True)
+    def test_exceeded_budget_raises(self):
+        from posts.views import PostViewSet
+        from .middleware import QueryBudgetExceeded
+
+        with mock.patch.dict(PostViewSet.query_budgets, {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/posts/')
+
+
+@override_settings(SCHEMA_CACHE_ENABLED=True, SCHEMA_FILE='')
+class CachedSchemaTestCase(SimpleTestCase):
+    def setUp(self):
+        reset_schema_cache()
+        self.addCleanup(reset_schema_cache)
+
+    def test_schema_is_generated_once(self):
+        with mock.patch(
+            'drf_spectacular.generators.SchemaGenerator.get_schema', return_value={'openapi': '3.0.3'}
+        ) as get_schema:
+            first = self.client.get('/api/schema/')
+            second = self.client.get('/api/schema/')
+            as_json = self.client.get('/api/schema/?format=json')
+        self.assertEqual(get_schema.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertIn(b'openapi', first.content)
+        self.assertEqual(as_json.json(), {'openapi': '3.0.3'})
+        self.assertNotEqual(as_json['ETag'], first['ETag'])
+
+        not_modified = self.client.get('/api/schema/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_schema_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yml', delete=False) as schema_file:
+            schema_file.write('openapi: 3.0.3\ninfo:\n  title: From file\n')
+        with self.settings(SCHEMA_FILE=schema_file.name), mock.patch(
+            'drf_spectacular.generators.SchemaGenerator.get_schema'
+        ) as get_schema:
+            response = self.client.get('/api/schema/?format=json')
+        get_schema.assert_not_called()
+        self.assertEqual(response.json()['info']['title'], 'From file')
+
+
+class JSONLoggingTestCase(SimpleTestCase):
+    def test_queue_handler_writes_json_lines(self):
+        stream = io.StringIO()
+        handler = QueueJSONHandler(stream)
+        handler.addFilter(RequestIdFilter())
+        logger = logging.getLogger('app.tests.json')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        token = request_id.set('abc')
+        try:
+            logger.warning('Hello %s', 'world', extra={'duration_ms': 1.5})
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logger.exception('Failed')
+        finally:
+            request_id.reset(token)
+        handler.close()
+
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(first['message'], 'Hello world')
+        self.assertEqual(first['request_id'], 'abc')
+        self.assertEqual(first['duration_ms'], 1.5)
+        self.assertEqual(first['level'], 'WARNING')
+        self.assertIn('ValueError: boom', second['exception'])
+
+    def test_request_ids(self):
+        seen = []
+
+        def view(request):
+            seen.append(request_id.get())
+            return HttpResponse()
+
+        middleware = RequestLogMiddleware(view)
+        factory = APIRequestFactory()
+        response = middleware(factory.get('/', HTTP_X_REQUEST_ID='proxy-id.1'))
+        self.assertEqual(response['X-Request-ID'], 'proxy-id.1')
+        response = middleware(factory.get('/', HTTP_X_REQUEST_ID='bad id\n'))
+        self.assertNotEqual(response['X-Request-ID'], 'bad id\n')
+        self.assertEqual(seen, ['proxy-id.1', response['X-Request-ID']])
+
+
+class RendererTestCase(SimpleTestCase):
+    def test_orjson_renderer(self):
+        value = uuid.uuid4()
+        data = {
+            'created': datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            'uuid': value,
+            'price': decimal.Decimal('1.50'),
+            'label': gettext_lazy('Hello'),
+            1: 'non string key',
+        }
+        rendered = json.loads(ORJSONRenderer().render(data))
+        self.assertEqual(rendered['created'], '2024-01-02T03:04:05+00:00')
+        self.assertEqual(rendered['uuid'], str(value))
+        # Same as DRF's JSONEncoder, DecimalField already renders strings
+        self.assertEqual(rendered['price'], 1.5)
+        self.assertEqual(rendered['label'], 'Hello')
+        self.assertEqual(rendered['1'], 'non string key')
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        indented = ORJSONRenderer().render({'a': 1}, 'application/json; indent=4')
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+
+    def test_orjson_parser(self):
+        parser = ORJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO(b'{"a": [1, 2]}')), {'a': [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"a": '))
+
+    def test_compact(self):
+        data = {
+            'count': 2,
+            'results': [
+                {'id': 1, 'profile': 'alice', 'tags': ['sun', 'sea'], 'images': []},
+                {'id': 2, 'profile': 'bob', 'tags': ['sea'], 'images': [{'id': 7, 'image': 'a.jpg'}]},
+                {'id': 3, 'profile': 'alice', 'tags': [], 'images': None},
+            ],
+            'empty': [],
+        }
+        self.assertEqual(
+            compact(data),
+            {
+                'count': 2,
+                'results': {
+                    'fields': ['id', 'profile', 'tags', 'images'],
+                    'nested': {'images': ['id', 'image']},
+                    'rows': [
+                        [1, 0, [0, 1], []],
+                        [2, 1, [1], [[7, 'a.jpg']]],
+                        [3, 0, [], None],
+                    ],
+                },
+                'empty': [],
+                'lookups': {'profiles': ['alice', 'bob'], 'tags': ['sun', 'sea']},
+            },
+        )
+        self.assertEqual(compact({'detail': 'Not found.'}), {'detail': 'Not found.'})
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_renderer(self):
+        data = {'a': [1, 'b'], 'when': datetime.date(2024, 1, 2)}
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)), {'a': [1, 'b'], 'when': '2024-01-02'}
+        )
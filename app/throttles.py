@@ -1,7 +1,85 @@
 from rest_framework.throttling import UserRateThrottle
 
-class BurstRateThrottle(UserRateThrottle):
+from metrics.instruments import THROTTLE_REJECTIONS
+
+
+class SlidingWindowRateThrottle(UserRateThrottle):
+    """
+    Sliding window counter: a request is allowed when the count of the
+    current fixed window, plus the previous window's count weighted by how
+    much of it still overlaps the sliding window, stays within the rate.
+
+    Each client costs two integer counters in the cache whatever the rate,
+    updated with atomic `incr`, so concurrent workers cannot lose requests.
+
+    Requests are charged the cost the view declares for its action in a
+    `throttle_costs` dict, 1 by default. Views without actions are looked up
+    by the lowercased HTTP method.
+    """
+
+    default_cost = 1
+
+    def _window_key(self, window: int) -> str:
+        return f"{self.key}:{window}"
+
+    def get_cost(self, request, view) -> int:
+        costs = getattr(view, "throttle_costs", {})
+        action = getattr(view, "action", None) or request.method.lower()
+        # A request costing more than the whole rate could never pass
+        return min(costs.get(action, self.default_cost), self.num_requests)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.cost = self.get_cost(request, view)
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        window = int(window)
+        current_key = self._window_key(window)
+
+        # Counters outlive their window by one window, as the previous one
+        self.cache.add(current_key, 0, 2 * self.duration)
+        try:
+            self.current_count = self.cache.incr(current_key, self.cost)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.add(current_key, self.cost, 2 * self.duration)
+            self.current_count = self.cost
+        self.previous_count = self.cache.get(self._window_key(window - 1), 0)
+        self.overlap = 1 - offset / self.duration
+
+        if self.previous_count * self.overlap + self.current_count > self.num_requests:
+            # Rejected requests are not counted
+            self.cache.decr(current_key, self.cost)
+            self.current_count -= self.cost
+            THROTTLE_REJECTIONS.inc(scope=self.scope, view=type(view).__name__)
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        remaining = self.overlap * self.duration
+        if self.current_count + self.cost > self.num_requests:
+            # The current window becomes the previous one, whose weight has
+            # to leave room for this request
+            allowed_overlap = (self.num_requests - self.cost) / self.current_count
+            return remaining + (1 - allowed_overlap) * self.duration
+        allowed_overlap = (self.num_requests - self.current_count - self.cost) / self.previous_count
+        return max(0.0, remaining - allowed_overlap * self.duration)
+
+
+class BurstRateThrottle(SlidingWindowRateThrottle):
     scope = 'burst'
 
-class SustainedRateThrottle(UserRateThrottle):
-    scope = 'sustained'
\ No newline at end of file
+class SustainedRateThrottle(SlidingWindowRateThrottle):
+    scope = 'sustained'
+
+class AutocompleteRateThrottle(SlidingWindowRateThrottle):
+    scope = 'autocomplete'
@@ -10,9 +10,11 @@ from tags import views as tags_views
 from comments import views as comments_views
 import feed.urls as feed
 import search.urls as search
+import profiling.urls as profiling
+import metrics.urls as metrics
 from decouple import config
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
-from app.schema import SpectacularElementsView, SpectacularRapiDocView
+from drf_spectacular.views import SpectacularSwaggerView, SpectacularRedocView
+from app.schema import CachedSpectacularAPIView, SpectacularElementsView, SpectacularRapiDocView
 
 router = routers.DefaultRouter()
 router.register(r'users',
@@ -39,8 +41,10 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/feed/', include(feed)),
     path('api/search/', include(search)),
+    path('api/profiling/', include(profiling)),
+    path('metrics/', include(metrics)),
     path('api/token/', include('auth.urls')),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('api/schema/elements/', SpectacularElementsView.as_view(url_name='schema'), name='elements'),
@@ -0,0 +1,51 @@
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from app.routers import set_replica_user
+
+
+class ProfileTokenUser(TokenUser):
+    """
+    User backed by the claims of a validated access token. The profile is
+    only loaded when a view actually uses it.
+    """
+
+    @cached_property
+    def profile_id(self):
+        return self.token.get("profile_id")
+
+    @cached_property
+    def profile(self):
+        from profiles.models import Profile
+
+        try:
+            # Tokens issued before the profile_id claim only carry the user id
+            if self.profile_id is None:
+                return Profile.objects.get(user_id=self.id)
+            return Profile.objects.get(pk=self.profile_id)
+        except Profile.DoesNotExist:
+            # The user was deleted after the token was issued
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates from the access token claims alone, without loading `User`.
+
+    Deleting or deactivating a user therefore does not revoke their access
+    tokens: they are accepted until they expire, i.e. for up to
+    `SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]`, and their refresh tokens must be
+    blacklisted to stop new ones. Views loading the profile of a deleted user
+    answer 401.
+    """
+
+    def get_user(self, validated_token):
+        # Validates the user id claim
+        super().get_user(validated_token)
+        user = ProfileTokenUser(validated_token)
+        # Lets the replica router apply the user's primary pin
+        set_replica_user(user)
+        return user
@@ -0,0 +1,154 @@
+"""
+Bloom filter over the JTIs of blacklisted tokens.
+
+simplejwt looks every refreshed or verified token up in `BlacklistedToken`.
+The filter answers "certainly not blacklisted" from memory, so the database is
+only queried on a probable hit.
+
+Each process builds its filter from the unexpired blacklisted tokens. A version
+stamp in the shared cache is bumped after every blacklisting. Processes rebuild
+when the stamp changes, and at least every
+`TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL` seconds. Cross process revocation
+therefore needs a cache shared by all workers: with a process local cache,
+e.g. the default `LocMemCache`, the filter is disabled and every lookup goes
+to the database.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_KEY = "auth:blacklist:version"
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        # Double hashing: two 64 bit halves of one digest give every position
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class BlacklistFilter:
+    def __init__(self, jtis: Iterable[str], capacity: int, version: Optional[int]):
+        self.bloom = BloomFilter(
+            capacity, getattr(settings, "TOKEN_BLACKLIST_BLOOM_ERROR_RATE", 0.001)
+        )
+        for jti in jtis:
+            self.bloom.add(jti)
+        self.version = version
+        self.built_at = time.monotonic()
+
+
+def get_cache():
+    return caches[getattr(settings, "TOKEN_BLACKLIST_CACHE_ALIAS", "default")]
+
+
+def is_enabled() -> bool:
+    # Other workers would not see the version bumps of a local cache and
+    # accept revoked tokens until their next rebuild
+    return getattr(settings, "TOKEN_BLACKLIST_BLOOM_ENABLED", True) and not isinstance(
+        get_cache(), (LocMemCache, DummyCache)
+    )
+
+
+def build_filter() -> BlacklistFilter:
+    # Read the version first, blacklistings after this point bump it again
+    version = get_cache().get(VERSION_KEY)
+    tokens = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+    count = tokens.count()
+    # Leave room for the tokens blacklisted until the next rebuild
+    capacity = max(2 * count, getattr(settings, "TOKEN_BLACKLIST_BLOOM_CAPACITY", 10000))
+    jtis = tokens.values_list("token__jti", flat=True).iterator(chunk_size=5000)
+    return BlacklistFilter(jtis, capacity, version)
+
+
+_filter: Optional[BlacklistFilter] = None
+_filter_lock = threading.Lock()
+
+
+def get_filter() -> BlacklistFilter:
+    global _filter
+    current = _filter
+    interval = getattr(settings, "TOKEN_BLACKLIST_BLOOM_REBUILD_INTERVAL", 300)
+    if (
+        current is None
+        or time.monotonic() - current.built_at >= interval
+        or get_cache().get(VERSION_KEY) != current.version
+    ):
+        with _filter_lock:
+            # Another thread may have rebuilt it meanwhile
+            if _filter is current:
+                _filter = build_filter()
+            current = _filter
+    return current
+
+
+def reset_filter() -> None:
+    global _filter
+    with _filter_lock:
+        _filter = None
+
+
+def is_blacklisted(jti: str) -> bool:
+    if is_enabled() and jti not in get_filter().bloom:
+        return False
+    return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def invalidate_blacklist_filters(sender, instance, created, **kwargs):
+    if not created:
+        return
+    jti = instance.token.jti
+
+    def publish():
+        current = _filter
+        if current is not None:
+            current.bloom.add(jti)
+        get_cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+    transaction.on_commit(publish)
+
+
+class BloomRefreshToken(RefreshToken):
+    """
+    Refresh token checking the blacklist through the Bloom filter.
+    """
+
+    def check_blacklist(self) -> None:
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError("Token is blacklisted")
@@ -1,7 +1,16 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 from rest_framework import serializers
+from .blacklist import BloomRefreshToken, is_blacklisted
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = BloomRefreshToken
+
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
@@ -9,6 +18,9 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         # Add custom claims
         token['username'] = user.username
         token['email'] = user.email
+        # Read by StatelessJWTAuthentication instead of loading the user
+        token['profile_id'] = user.profile.id
+        token['is_staff'] = user.is_staff
         return token
     
 class MyTokenQuerySerializer(serializers.Serializer):
@@ -23,4 +35,20 @@ class MyTokenRefreshSerializer(serializers.Serializer):
     
 class MyTokenResponseSerializer(serializers.Serializer):
     refresh = serializers.CharField(required=True)
-    access = serializers.CharField(required=True)
\ No newline at end of file
+    access = serializers.CharField(required=True)
+
+
+class BloomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = BloomRefreshToken
+
+
+class BloomTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs["token"])
+
+        if api_settings.BLACKLIST_AFTER_ROTATION:
+            jti = token.get(api_settings.JTI_CLAIM)
+            if jti and is_blacklisted(jti):
+                raise serializers.ValidationError("Token is blacklisted")
+
+        return {}
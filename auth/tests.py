@@ -1,3 +1,101 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+import tempfile
+from django.test import override_settings
+from app.testing import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .blacklist import BloomFilter, BloomRefreshToken, is_enabled, reset_filter
 
-# Create your tests here.
+
+class StatelessJWTAuthenticationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='rootroot', is_staff=True)
+
+    def test_token_claims(self):
+        response = self.client.post('/api/token/', {'username': 'alice', 'password': 'rootroot'})
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data['access'])
+        self.assertEqual(token['profile_id'], self.user.profile.id)
+        self.assertTrue(token['is_staff'])
+
+    def test_authenticated_request_skips_user_query(self):
+        access = self.client.post(
+            '/api/token/', {'username': 'alice', 'password': 'rootroot'}
+        ).data['access']
+        headers = {'Authorization': f'Bearer {access}'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/profiles/alice/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # Ownership is decided from the token's user id
+        self.assertIn('favorite_posts', response.data)
+        self.assertFalse(
+            [query for query in queries.captured_queries if 'FROM "auth_user"' in query['sql']]
+        )
+
+    def test_deleted_user_is_unauthenticated(self):
+        access = self.client.post(
+            '/api/token/', {'username': 'alice', 'password': 'rootroot'}
+        ).data['access']
+        User.objects.create_user(username='bob', password='rootroot')
+        self.user.delete()
+        response = self.client.post(
+            '/api/profiles/bob/follow/', headers={'Authorization': f'Bearer {access}'}
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class BlacklistBloomFilterTestCase(TestCase):
+    def setUp(self):
+        # The filter needs a cache shared between processes
+        settings = override_settings(
+            CACHES={
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': tempfile.mkdtemp(),
+                }
+            }
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(reset_filter)
+        reset_filter()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='rootroot')
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=100)
+        values = [f'jti-{i}' for i in range(100)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        self.assertLess(sum(f'other-{i}' in bloom for i in range(1000)), 20)
+
+    def test_refresh_skips_blacklist_query_and_honours_revocation(self):
+        refresh = BloomRefreshToken.for_user(self.user)
+        self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh.blacklist()
+        response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/token/verify/', {'token': str(refresh)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_disabled_with_a_local_cache(self):
+        refresh = BloomRefreshToken.for_user(self.user)
+        with override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        ):
+            self.assertFalse(is_enabled())
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/token/refresh/', {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('token_blacklist' in query['sql'] for query in queries))
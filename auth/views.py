@@ -1,6 +1,11 @@
 from django.shortcuts import render
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
-from .serializers import MyTokenObtainPairSerializer, MyTokenResponseSerializer
+from .serializers import (
+    BloomTokenRefreshSerializer,
+    BloomTokenVerifySerializer,
+    MyTokenObtainPairSerializer,
+    MyTokenResponseSerializer,
+)
 from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from .serializers import MyTokenQuerySerializer
@@ -61,7 +66,7 @@ class MyTokenObtainPairView(TokenObtainPairView):
     description='Refresh your access JSON web token.',
 )
 class MyTokenRefreshView(TokenRefreshView):
-    pass
+    serializer_class = BloomTokenRefreshSerializer
 
 
 @extend_schema(
@@ -96,4 +101,4 @@ class MyTokenRefreshView(TokenRefreshView):
     },
 )
 class MyTokenVerifyView(TokenVerifyView):
-    pass
\ No newline at end of file
+    serializer_class = BloomTokenVerifySerializer
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+Synthetic data with the skew of a real social network.
+
+Who gets followed, which tags are used and which posts get liked follow Zipf
+distributions, so a few celebrities, hot tags and viral posts dominate.
+Comments form threads. Everything derives from one seeded `random.Random`, so
+a given configuration always produces the same graph.
+
+Rows are written with `bulk_create`, which sends no signals. In particular
+`create_related_profile` does not run, profiles are inserted directly, and the
+denormalized counters, tag counts and search index are computed once at the
+end.
+"""
+
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import accumulate, islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.test.utils import setup_databases, teardown_databases
+
+from comments.models import Comment
+from core.models import subquery_count
+from posts.models import Post, PostImage
+from profiles.counters import counter_expressions
+from profiles.models import Profile
+from search.backends import get_search_backend
+from tags.models import Tag
+
+PASSWORD = "benchmark"
+PLACEHOLDER_IMAGE = "placeholders/post.gif"
+# 1x1 transparent GIF
+PLACEHOLDER_BYTES = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00"
+    b"\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+WORDS = (
+    "sunset beach coffee city night travel food friends music art summer mountain "
+    "street portrait dog cat garden winter rain book ocean forest bike run yoga "
+    "pizza vintage design family wedding sky"
+).split()
+
+
+@dataclass
+class GeneratorConfig:
+    users: int = 10000
+    posts_per_user: float = 5
+    follows_per_user: float = 50
+    tags: int = 2000
+    tags_per_post: int = 3
+    likes_per_post: float = 10
+    favorites_per_user: float = 5
+    comments_per_post: float = 4
+    # Chance that a comment answers an earlier comment of the thread
+    reply_ratio: float = 0.4
+    thread_depth: int = 3
+    images_per_post: int = 1
+    private_ratio: float = 0.05
+    zipf_exponent: float = 1.1
+    prefix: str = "user"
+    seed: int = 42
+    batch_size: int = 10000
+
+
+class Zipf:
+    """
+    Draws items of `population` with probabilities proportional to
+    1 / rank ** exponent, ranks being assigned in a random order.
+    """
+
+    def __init__(self, population: Sequence, exponent: float, rng: random.Random):
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(
+            accumulate(1 / rank**exponent for rank in range(1, len(self.population) + 1))
+        )
+        self.rng = rng
+
+    def sample(self, k: int) -> List:
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+    def sample_unique(self, k: int) -> set:
+        # Popular items are drawn several times, draw a few more than needed
+        return set(self.sample(k + k // 2))
+
+
+def _count(rng: random.Random, mean: float) -> int:
+    # Geometric counts: most rows get a few children, some get many
+    if mean <= 0:
+        return 0
+    return int(rng.expovariate(1 / mean))
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Generator:
+    def __init__(self, config: GeneratorConfig, log: Optional[Callable[[str], None]] = None):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.log = log or (lambda message: None)
+        self.counts: Dict[str, int] = {}
+
+    def insert(self, model, rows: Iterable, name: str) -> List[int]:
+        """
+        Bulk inserts `rows` and returns the new primary keys in insertion
+        order. They are read back since not every database returns them.
+        """
+        before = model.objects.aggregate(last=Max("pk"))["last"] or 0
+        for batch in _batches(rows, self.config.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.config.batch_size)
+        ids = list(
+            model.objects.filter(pk__gt=before).order_by("pk").values_list("pk", flat=True)
+        )
+        self.counts[name] = self.counts.get(name, 0) + len(ids)
+        self.log(f"{name}: {len(ids)}")
+        return ids
+
+    def insert_links(self, through, columns: Sequence[str], rows: Iterable[tuple], name: str) -> None:
+        """
+        Inserts (`columns`) tuples into a many to many table. Building a model
+        instance per link would cost more than the insert itself.
+        """
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(through._meta.db_table),
+            ", ".join(quote(through._meta.get_field(column).column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+        count = 0
+        with connection.cursor() as cursor:
+            for batch in _batches(rows, self.config.batch_size):
+                cursor.executemany(sql, batch)
+                count += len(batch)
+        self.counts[name] = count
+        self.log(f"{name}: {count}")
+
+    def run(self, rebuild_search_index: bool = True) -> Dict[str, int]:
+        with transaction.atomic():
+            self.generate()
+        if rebuild_search_index:
+            self.log(f"search index: {get_search_backend().rebuild()}")
+        return self.counts
+
+    def generate(self) -> None:
+        config, rng = self.config, self.rng
+
+        password = make_password(PASSWORD)
+        user_ids = self.insert(
+            User,
+            (
+                User(username=f"{config.prefix}{i}", password=password)
+                for i in range(config.users)
+            ),
+            "users",
+        )
+        profile_ids = self.insert(
+            Profile,
+            (
+                Profile(
+                    user_id=user_id,
+                    username=f"{config.prefix}{i}",
+                    full_name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                )
+                for i, user_id in enumerate(user_ids)
+            ),
+            "profiles",
+        )
+        celebrities = Zipf(profile_ids, config.zipf_exponent, rng)
+        self.follows(profile_ids, celebrities)
+
+        tag_ids = self.insert(
+            Tag,
+            (
+                Tag(name=name, slug=name)
+                for name in (f"{rng.choice(WORDS)}{i}" for i in range(config.tags))
+            ),
+            "tags",
+        )
+        post_ids = self.posts(profile_ids, celebrities)
+        self.post_relations(post_ids, profile_ids, tag_ids)
+        self.comments(post_ids, profile_ids)
+        self.update_counters()
+
+    def follows(self, profile_ids: List[int], celebrities: Zipf) -> None:
+        Follow = Profile.follows.through
+
+        def rows():
+            for profile_id in profile_ids:
+                followed = celebrities.sample_unique(_count(self.rng, self.config.follows_per_user))
+                followed.discard(profile_id)
+                for followed_id in sorted(followed):
+                    yield profile_id, followed_id
+
+        self.insert_links(Follow, ("from_profile", "to_profile"), rows(), "follows")
+
+    def posts(self, profile_ids: List[int], celebrities: Zipf) -> List[int]:
+        config, rng = self.config, self.rng
+        # Popular profiles also post more
+        authors = celebrities.sample(int(len(profile_ids) * config.posts_per_user))
+        post_ids = self.insert(
+            Post,
+            (
+                Post(
+                    profile_id=profile_id,
+                    title=" ".join(rng.choices(WORDS, k=rng.randint(2, 6))),
+                    body=" ".join(rng.choices(WORDS, k=rng.randint(5, 60))),
+                    slug=f"{config.prefix}-post-{i}",
+                    is_private=rng.random() < config.private_ratio,
+                    view_count=_count(rng, 100),
+                )
+                for i, profile_id in enumerate(authors)
+            ),
+            "posts",
+        )
+
+        if config.images_per_post:
+            if not default_storage.exists(PLACEHOLDER_IMAGE):
+                default_storage.save(PLACEHOLDER_IMAGE, ContentFile(PLACEHOLDER_BYTES))
+            self.insert(
+                PostImage,
+                (
+                    PostImage(post_id=post_id, image=PLACEHOLDER_IMAGE, thumbnail=PLACEHOLDER_IMAGE)
+                    for post_id in post_ids
+                    for _ in range(config.images_per_post)
+                ),
+                "images",
+            )
+        return post_ids
+
+    def post_relations(self, post_ids: List[int], profile_ids: List[int], tag_ids: List[int]) -> None:
+        config, rng = self.config, self.rng
+        hot_tags = Zipf(tag_ids, config.zipf_exponent, rng)
+        viral_posts = Zipf(post_ids, config.zipf_exponent, rng)
+
+        self.insert_links(
+            Post.tags.through,
+            ("post", "tag"),
+            (
+                (post_id, tag_id)
+                for post_id in post_ids
+                for tag_id in sorted(hot_tags.sample_unique(rng.randint(0, config.tags_per_post)))
+            ),
+            "post tags",
+        )
+
+        # Likes go to viral posts, each profile likes a post at most once
+        def likes():
+            for profile_id in profile_ids:
+                count = _count(rng, config.likes_per_post * len(post_ids) / len(profile_ids))
+                for post_id in sorted(viral_posts.sample_unique(count)):
+                    yield post_id, profile_id
+
+        self.insert_links(Post.likes.through, ("post", "profile"), likes(), "likes")
+
+        self.insert_links(
+            Profile.favorite_posts.through,
+            ("profile", "post"),
+            (
+                (profile_id, post_id)
+                for profile_id in profile_ids
+                for post_id in sorted(
+                    viral_posts.sample_unique(_count(rng, config.favorites_per_user))
+                )
+            ),
+            "favorites",
+        )
+
+    def comments(self, post_ids: List[int], profile_ids: List[int]) -> None:
+        """
+        Inserts threads one depth at a time, replies need their parent's id.
+        """
+        config, rng = self.config, self.rng
+        commenters = Zipf(profile_ids, config.zipf_exponent, rng)
+        parents = [
+            (post_id, None)
+            for post_id in post_ids
+            for _ in range(_count(rng, config.comments_per_post * (1 - config.reply_ratio)))
+        ]
+        for depth in range(config.thread_depth):
+            if not parents:
+                break
+            authors = commenters.sample(len(parents))
+            comments = [
+                Comment(
+                    post_id=post_id,
+                    parent_id=parent_id,
+                    profile_id=profile_id,
+                    body=" ".join(rng.choices(WORDS, k=rng.randint(1, 20))),
+                )
+                for (post_id, parent_id), profile_id in zip(parents, authors)
+            ]
+            ids = self.insert(Comment, comments, "comments")
+            parents = [
+                (comment.post_id, comment_id)
+                for comment, comment_id in zip(comments, ids)
+                for _ in range(_count(rng, config.reply_ratio * 2))
+            ]
+
+    def update_counters(self) -> None:
+        Tag.objects.update(post_count=subquery_count(Post.tags.through.objects.all(), "tag_id"))
+        Profile.objects.update(**counter_expressions(Profile, Post))
+        self.log("counters updated")
+
+
+def generate(config: GeneratorConfig, log=None, rebuild_search_index: bool = True) -> Dict[str, int]:
+    return Generator(config, log).run(rebuild_search_index)
+
+
+@contextmanager
+def generated_database(config: GeneratorConfig):
+    """
+    Runs the block against throwaway test databases filled by the generator.
+    """
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+    try:
+        generate(config)
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
@@ -0,0 +1,191 @@
+"""
+End-to-end API benchmark.
+
+Every endpoint is driven by `concurrency` workers, either in process through
+DRF's test client or over HTTP against a running server. Query counts are read
+from the `Server-Timing` header set by `QueryBudgetMiddleware`, so they are
+measured the same way in both modes.
+
+In process runs share the test database: SQLite's in-memory test database
+locks whole tables between connections, so they are limited to one worker
+there, other requests would measure lock contention. A failed warm-up request
+aborts the run.
+"""
+
+import json
+import math
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db import connection
+
+SERVER_TIMING_QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+class LoadTestError(Exception):
+    pass
+
+
+@dataclass
+class Endpoint:
+    name: str
+    path: str
+
+
+def default_endpoints() -> List[Endpoint]:
+    """
+    Returns the benchmarked endpoints, pointed at the most followed profile,
+    the most commented post and the most used tag.
+    """
+    from posts.models import Post
+    from profiles.models import Profile
+    from tags.models import Tag
+
+    profile = Profile.objects.order_by("-followers_count", "id").first()
+    post = (
+        Post.objects.filter(is_private=False)
+        .with_list_data()
+        .order_by("-comment_count", "id")
+        .first()
+    )
+    tag = Tag.objects.order_by("-post_count", "id").first()
+    query = tag.name if tag else "a"
+    return [
+        Endpoint("feed", "/api/feed/"),
+        Endpoint("search", f"/api/search/?query={query}"),
+        Endpoint("search-posts", f"/api/search/?type=post&query={query}"),
+        Endpoint("posts-list", "/api/posts/"),
+        Endpoint("posts-detail", f"/api/posts/{post.slug}/"),
+        Endpoint("profiles-detail", f"/api/profiles/{profile.username}/"),
+        Endpoint("profiles-followers", f"/api/profiles/{profile.username}/followers/"),
+        Endpoint("comments-list", f"/api/comments/?post_id={post.id}"),
+    ]
+
+
+# A client sends a GET and returns (status code, queries or None)
+Client = Callable[[str], Tuple[int, Optional[int]]]
+
+
+def _queries(server_timing: Optional[str]) -> Optional[int]:
+    match = SERVER_TIMING_QUERIES_RE.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+def in_process_client(user) -> Client:
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(user)
+
+    def get(path: str) -> Tuple[int, Optional[int]]:
+        response = client.get(path)
+        return response.status_code, _queries(response.get("Server-Timing"))
+
+    return get
+
+
+def http_client(base_url: str, access_token: str) -> Client:
+    def get(path: str) -> Tuple[int, Optional[int]]:
+        request = urllib.request.Request(
+            base_url.rstrip("/") + path,
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, _queries(response.headers.get("Server-Timing"))
+        except urllib.error.HTTPError as error:
+            return error.code, _queries(error.headers.get("Server-Timing"))
+
+    return get
+
+
+def obtain_token(base_url: str, username: str, password: str) -> str:
+    request = urllib.request.Request(
+        base_url.rstrip("/") + "/api/token/",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)["access"]
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    # Nearest rank
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], queries: List[int], errors: int, wall: float) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p95": round(percentile(ordered, 95) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "mean": round(statistics.fmean(ordered) * 1000, 2),
+        },
+        "queries_per_request": {
+            "mean": round(statistics.fmean(queries), 2) if queries else None,
+            "max": max(queries) if queries else None,
+        },
+    }
+
+
+def run_endpoint(
+    endpoint: Endpoint, make_client: Callable[[], Client], requests: int, concurrency: int
+) -> Dict:
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        nonlocal errors
+        client = make_client()
+        try:
+            # Warm up caches and connections outside of the measurements
+            status, _ = client(endpoint.path)
+            if status >= 400:
+                raise LoadTestError(f"{endpoint.name}: warm-up request returned {status}")
+            for _ in range(count):
+                start = time.perf_counter()
+                status, query_count = client(endpoint.path)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if query_count is not None:
+                        queries.append(query_count)
+                    if status >= 400:
+                        errors += 1
+        finally:
+            connection.close()
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker, share) for share in shares if share]:
+            future.result()
+    return summarize(latencies, queries, errors, time.perf_counter() - start)
+
+
+def run(
+    endpoints: List[Endpoint],
+    make_client: Callable[[], Client],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Dict]:
+    return {
+        endpoint.name: run_endpoint(endpoint, make_client, requests, concurrency)
+        for endpoint in endpoints
+    }
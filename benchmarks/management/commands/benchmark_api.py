@@ -0,0 +1,108 @@
+import json
+from dataclasses import asdict
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from benchmarks import loadtest
+from benchmarks.generator import PASSWORD, GeneratorConfig, generated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the main API endpoints and prints latency percentiles, queries "
+        "per request and requests per second per endpoint as JSON. By default a "
+        "throwaway test database is seeded and requests run in process; with --url "
+        "they are sent to a running server using the data already in its database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument(
+            "--concurrency", type=int, help="Workers per endpoint, 4 by default, 1 on SQLite in process."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--profiles", type=int, default=200)
+        parser.add_argument("--posts-per-profile", type=float, default=5)
+        parser.add_argument("--follows-per-profile", type=float, default=20)
+        parser.add_argument("--comments-per-post", type=float, default=3)
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://localhost:8000.")
+        parser.add_argument("--username", default="bench0", help="Account used with --url.")
+        parser.add_argument("--password", default=PASSWORD, help="Password used with --url.")
+        parser.add_argument("--output", help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] is None:
+            options["concurrency"] = 1 if not options["url"] and connection.vendor == "sqlite" else 4
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+
+        try:
+            if options["url"]:
+                report = self.run_against_server(options)
+            else:
+                report = self.run_in_process(options)
+        except loadtest.LoadTestError as error:
+            raise CommandError(str(error))
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as report_file:
+                report_file.write(output)
+        self.stdout.write(output)
+
+    def run_against_server(self, options):
+        url = options["url"]
+        token = loadtest.obtain_token(url, options["username"], options["password"])
+        results = loadtest.run(
+            loadtest.default_endpoints(),
+            lambda: loadtest.http_client(url, token),
+            options["requests"],
+            options["concurrency"],
+        )
+        return self.report("server", options, results)
+
+    def run_in_process(self, options):
+        if connection.vendor == "sqlite" and options["concurrency"] > 1:
+            # The in-memory test database locks tables between connections
+            raise CommandError(
+                "SQLite only supports --concurrency 1 in process, use --url or PostgreSQL."
+            )
+        config = GeneratorConfig(
+            users=options["profiles"],
+            posts_per_user=options["posts_per_profile"],
+            follows_per_user=options["follows_per_profile"],
+            comments_per_post=options["comments_per_post"],
+            likes_per_post=5,
+            tags=50,
+            prefix="bench",
+            seed=options["seed"],
+        )
+        with generated_database(config):
+            user = User.objects.get(username="bench0")
+            # Throttling would reject most requests, the query counts come
+            # from the Server-Timing header of QueryBudgetMiddleware
+            with override_settings(
+                QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=False, ALLOWED_HOSTS=["*"]
+            ), mock.patch("rest_framework.views.APIView.check_throttles"):
+                results = loadtest.run(
+                    loadtest.default_endpoints(),
+                    lambda: loadtest.in_process_client(user),
+                    options["requests"],
+                    options["concurrency"],
+                )
+        report = self.report("in_process", options, results)
+        report["data"] = asdict(config)
+        return report
+
+    def report(self, mode, options, results):
+        return {
+            "mode": mode,
+            "seed": options["seed"],
+            "requests_per_endpoint": options["requests"],
+            "concurrency": options["concurrency"],
+            "endpoints": results,
+        }
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import micro
+from benchmarks.generator import GeneratorConfig, generated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the hot serializers and querysets on a generated throwaway database, "
+        "appends the results to a history file and fails when a benchmark got "
+        "slower or runs more queries than in its history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--history",
+            default=str(settings.BASE_DIR / "benchmarks" / "history.jsonl"),
+            help="JSON lines file the results are compared with and appended to.",
+        )
+        parser.add_argument(
+            "--time-threshold",
+            type=float,
+            default=0.25,
+            help="Tolerated slowdown over the median of the recent runs, 0.25 is 25%%.",
+        )
+        parser.add_argument(
+            "--min-slowdown-us",
+            type=float,
+            default=100,
+            help="Slowdowns under this many microseconds are ignored as noise.",
+        )
+        parser.add_argument(
+            "--query-threshold", type=int, default=0, help="Tolerated extra queries."
+        )
+        parser.add_argument("--window", type=int, default=5, help="Recent runs in the median.")
+        parser.add_argument("--number", type=int, default=20, help="Calls per timing.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timings per benchmark.")
+        parser.add_argument("--filter", default="", help="Only run benchmarks containing this.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument(
+            "--no-record",
+            action="store_true",
+            help="Compare without appending the results to the history.",
+        )
+
+    def handle(self, *args, **options):
+        config = GeneratorConfig(
+            users=options["users"], tags=200, prefix="bench", seed=options["seed"]
+        )
+        with generated_database(config):
+            user = User.objects.get(username="bench0")
+            measurements = [
+                micro.measure(benchmark, options["number"], options["repeat"])
+                for benchmark in micro.default_benchmarks(user)
+                if options["filter"] in benchmark.name
+            ]
+
+        for measurement in measurements:
+            self.stdout.write(
+                f"{measurement.name:<40} {measurement.seconds * 1e6:>10.0f}us "
+                f"{measurement.queries:>4} queries"
+            )
+
+        context = micro.run_context(seed=options["seed"], users=options["users"])
+        regressions = micro.find_regressions(
+            measurements,
+            micro.load_history(options["history"]),
+            time_threshold=options["time_threshold"],
+            query_threshold=options["query_threshold"],
+            window=options["window"],
+            context=context,
+            min_slowdown=options["min_slowdown_us"] / 1e6,
+        )
+        if regressions:
+            # Regressed results are not recorded, they would become the baseline
+            raise CommandError(
+                "Regressions:\n"
+                + "\n".join(
+                    f"  {regression.name}: {regression.reason}" for regression in regressions
+                )
+            )
+
+        if not options["no_record"]:
+            micro.append_history(options["history"], measurements, context)
+        self.stdout.write(self.style.SUCCESS(f"No regression in {len(measurements)} benchmarks"))
@@ -0,0 +1,43 @@
+import time
+from dataclasses import fields
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.generator import GeneratorConfig, generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with a synthetic social network: users, profiles, a "
+        "power law follow graph, posts with tags and placeholder images, likes, "
+        "favorites and threaded comments. The same --seed always generates the "
+        "same data."
+    )
+
+    def add_arguments(self, parser):
+        for field in fields(GeneratorConfig):
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}", type=field.type, default=field.default
+            )
+        parser.add_argument(
+            "--skip-search-index",
+            action="store_true",
+            help="Do not rebuild the search index afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        config = GeneratorConfig(**{field.name: options[field.name] for field in fields(GeneratorConfig)})
+        if config.users < 1 or config.batch_size < 1:
+            raise CommandError("--users and --batch-size must be positive.")
+        if User.objects.filter(username=f"{config.prefix}0").exists():
+            raise CommandError(f"Users prefixed {config.prefix!r} already exist, pass another --prefix.")
+
+        start = time.perf_counter()
+        counts = generate(
+            config, log=self.stdout.write, rebuild_search_index=not options["skip_search_index"]
+        )
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated {sum(counts.values())} rows in {elapsed:.1f}s")
+        )
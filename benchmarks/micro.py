@@ -0,0 +1,254 @@
+"""
+Microbenchmarks of the serializers and querysets on the hot request paths.
+
+Each benchmark times one call with `timeit`, keeping the best of several
+repeats to filter out noise, and counts the queries of one call. Results are
+appended to a JSON lines history; a run regresses when a benchmark is slower
+than the median of its recent history by more than a threshold, or runs more
+queries than last time. Timings only compare within one machine and one data
+set, so only the history entries run with the same host, seed and size count.
+"""
+
+import json
+import os
+import platform
+import statistics
+import time
+import timeit
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+@dataclass
+class Microbenchmark:
+    name: str
+    # Loads the inputs and returns the function to time
+    setup: Callable[[], Callable[[], Any]]
+
+
+@dataclass
+class Measurement:
+    name: str
+    seconds: float
+    queries: int
+
+
+@dataclass
+class Regression:
+    name: str
+    reason: str
+
+
+def measure(benchmark: Microbenchmark, number: int = 20, repeat: int = 5) -> Measurement:
+    function = benchmark.setup()
+    # Warm up lazily built serializer fields and query compilation
+    function()
+    with CaptureQueriesContext(connection) as queries:
+        function()
+    best = min(timeit.repeat(function, number=number, repeat=repeat))
+    return Measurement(benchmark.name, best / number, len(queries))
+
+
+def api_request(user, path: str = "/") -> Request:
+    request = Request(APIRequestFactory().get(path))
+    request.user = user
+    return request
+
+
+def default_benchmarks(user, page_size: int = 9) -> List[Microbenchmark]:
+    """
+    Returns the benchmarks, run as `user` on the pages a client would get.
+    Serializer benchmarks load their instances up front, so they time
+    serialization alone; queryset benchmarks include the queries.
+    """
+    import orjson
+
+    from app.renderers import CompactJSONRenderer, ORJSONRenderer
+    from comments.models import Comment
+    from comments.serializers import CommentSerializer
+    from feed.views import FeedView
+    from posts.models import Post
+    from posts.serializers import PostDetailSerializer, PostsListSerializer, TagListField
+    from profiles.models import Profile
+    from profiles.serializers import PublicProfileSerializer
+    from search.backends import get_search_backend
+    from search.views import SearchView
+    from tags.models import Tag
+
+    request = api_request(user)
+    context = {"request": request}
+    public_posts = Post.objects.filter(is_private=False)
+    post = public_posts.with_list_data().order_by("-comment_count", "id").first()
+    query = Tag.objects.order_by("-post_count", "id").values_list("name", flat=True).first()
+
+    def posts_list():
+        posts = list(public_posts.with_list_data().order_by("-id")[:page_size])
+        return lambda: PostsListSerializer(posts, many=True, context=context).data
+
+    def post_detail():
+        detail = Post.objects.select_related("profile").get(pk=post.pk)
+        return lambda: PostDetailSerializer(detail, context=context).data
+
+    def public_profiles():
+        profiles = list(
+            Profile.objects.with_is_following(user).order_by("-followers_count", "id")[:page_size]
+        )
+        return lambda: PublicProfileSerializer(profiles, many=True, context=context).data
+
+    def comments():
+        page = list(
+            Comment.objects.filter(post=post, parent__isnull=True)
+            .with_list_data(user)
+            .select_related("profile")
+            .order_by("-created")[:page_size]
+        )
+        return lambda: CommentSerializer(page, many=True, context=context).data
+
+    def tags_representation():
+        field = TagListField(child=serializers.CharField())
+        posts = list(public_posts.prefetch_related("tags").order_by("-id")[:page_size])
+        return lambda: [field.to_representation(item.tags) for item in posts]
+
+    def tags_internal_value():
+        field = TagListField(child=serializers.CharField())
+        # Existing tags only, so every call does the same work
+        names = list(Tag.objects.order_by("-post_count", "id").values_list("name", flat=True)[:5])
+        return lambda: field.to_internal_value(names)
+
+    def feed_page_data():
+        posts = list(public_posts.with_list_data().order_by("-id")[:50])
+        return PostsListSerializer(posts, many=True, context=context).data
+
+    def render_json():
+        data = feed_page_data()
+        return lambda: JSONRenderer().render(data)
+
+    def render_orjson():
+        data = feed_page_data()
+        return lambda: ORJSONRenderer().render(data)
+
+    def render_compact():
+        data = feed_page_data()
+        return lambda: CompactJSONRenderer().render(data)
+
+    # What a client pays to decode each format
+    def parse_json():
+        content = ORJSONRenderer().render(feed_page_data())
+        return lambda: orjson.loads(content)
+
+    def parse_compact():
+        content = CompactJSONRenderer().render(feed_page_data())
+        return lambda: orjson.loads(content)
+
+    def feed_queryset():
+        view = FeedView(request=request, format_kwarg=None)
+        return lambda: list(view.get_queryset()[:page_size])
+
+    def search_posts():
+        view = SearchView(request=request, format_kwarg=None)
+        return lambda: view.hydrate_posts(
+            list(get_search_backend().search_post_ids(query))[:page_size]
+        )
+
+    def search_profiles():
+        view = SearchView(request=request, format_kwarg=None)
+        # Bypasses the search cache, as a cold query would
+        return lambda: view.hydrate_profiles(
+            list(
+                Profile.objects.filter(username__icontains=user.username[:3])
+                .order_by("username")
+                .values_list("id", flat=True)[:page_size]
+            )
+        )
+
+    return [
+        Microbenchmark("serializer.posts_list", posts_list),
+        Microbenchmark("serializer.post_detail", post_detail),
+        Microbenchmark("serializer.public_profiles", public_profiles),
+        Microbenchmark("serializer.comments", comments),
+        Microbenchmark("serializer.tag_list_representation", tags_representation),
+        Microbenchmark("serializer.tag_list_internal_value", tags_internal_value),
+        Microbenchmark("renderer.feed_json", render_json),
+        Microbenchmark("renderer.feed_orjson", render_orjson),
+        Microbenchmark("renderer.feed_compact", render_compact),
+        Microbenchmark("parser.feed_json", parse_json),
+        Microbenchmark("parser.feed_compact", parse_compact),
+        Microbenchmark("queryset.feed", feed_queryset),
+        Microbenchmark("queryset.search_posts", search_posts),
+        Microbenchmark("queryset.search_profiles", search_profiles),
+    ]
+
+
+def load_history(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+
+def run_context(**extra) -> Dict:
+    return {"host": platform.node(), **extra}
+
+
+def append_history(path: str, measurements: List[Measurement], context: Dict) -> Dict:
+    entry = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        **context,
+        "results": {measurement.name: asdict(measurement) for measurement in measurements},
+    }
+    with open(path, "a") as history_file:
+        history_file.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def find_regressions(
+    measurements: List[Measurement],
+    history: List[Dict],
+    time_threshold: float = 0.25,
+    query_threshold: int = 0,
+    window: int = 5,
+    context: Optional[Dict] = None,
+    min_slowdown: float = 0.0001,
+) -> List[Regression]:
+    """
+    Compares each measurement with the median time of its last `window` runs
+    in the same `context`, and with the query count of its last run. Slowdowns
+    under `min_slowdown` seconds are noise on the fastest benchmarks.
+    """
+    context = context if context is not None else run_context()
+    previous = [
+        entry["results"]
+        for entry in history
+        if all(entry.get(key) == value for key, value in context.items())
+    ]
+    regressions = []
+    for measurement in measurements:
+        runs = [results[measurement.name] for results in previous if measurement.name in results]
+        if not runs:
+            continue
+        baseline = statistics.median(run["seconds"] for run in runs[-window:])
+        slowdown = measurement.seconds - baseline
+        if slowdown > baseline * time_threshold and slowdown > min_slowdown:
+            regressions.append(
+                Regression(
+                    measurement.name,
+                    f"{measurement.seconds * 1e6:.0f}us per call, "
+                    f"{measurement.seconds / baseline - 1:.0%} slower than {baseline * 1e6:.0f}us",
+                )
+            )
+        if measurement.queries > runs[-1]["queries"] + query_threshold:
+            regressions.append(
+                Regression(
+                    measurement.name,
+                    f"{measurement.queries} queries instead of {runs[-1]['queries']}",
+                )
+            )
+    return regressions
@@ -0,0 +1,106 @@
+from django.contrib.auth.models import User
+import tempfile
+from unittest import skipUnless
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from app.testing import TestCase
+from comments.models import Comment
+from posts.models import Post
+from profiles.models import Profile
+from tags.models import Tag
+from .loadtest import Endpoint, LoadTestError, default_endpoints, percentile, run_endpoint, summarize
+from .generator import GeneratorConfig, generate
+from .micro import Measurement, default_benchmarks, find_regressions, measure
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class LoadTestTestCase(TestCase):
+    def test_percentiles(self):
+        ordered = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(ordered, 50), 0.05)
+        self.assertEqual(percentile(ordered, 99), 0.099)
+        summary = summarize(ordered, [2, 4], errors=1, wall=2.0)
+        self.assertEqual(summary['requests_per_second'], 50.0)
+        self.assertEqual(summary['latency_ms']['p95'], 95.0)
+        self.assertEqual(summary['queries_per_request'], {'mean': 3.0, 'max': 4})
+
+    def test_failed_warm_up_aborts(self):
+        responses = iter([(500, None), (200, 1)])
+        with self.assertRaises(LoadTestError):
+            run_endpoint(Endpoint('feed', '/api/feed/'), lambda: lambda path: next(responses), 1, 1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite only')
+    def test_concurrent_in_process_run_refused_on_sqlite(self):
+        with self.assertRaisesMessage(CommandError, '--concurrency 1'):
+            call_command('benchmark_api', concurrency=2, requests=1)
+
+    def generate(self, **kwargs):
+        config = GeneratorConfig(
+            users=30, posts_per_user=3, follows_per_user=5, tags=10, batch_size=50, **kwargs
+        )
+        return generate(config)
+
+    def test_generate(self):
+        counts = self.generate()
+        self.assertEqual(counts['users'], 30)
+        self.assertEqual(counts['posts'], 90)
+        self.assertEqual(counts['images'], 90)
+        profile = Profile.objects.order_by('-followers_count').first()
+        self.assertEqual(profile.followers_count, profile.followed_by.count())
+        self.assertEqual(
+            profile.posts_count, profile.posts.filter(is_private=False).count()
+        )
+        self.assertEqual(
+            sum(Tag.objects.values_list('post_count', flat=True)), counts['post tags']
+        )
+        self.assertTrue(Comment.objects.filter(parent__isnull=False).exists())
+        names = [endpoint.name for endpoint in default_endpoints()]
+        self.assertIn('feed', names)
+
+    def test_generate_is_deterministic(self):
+        def snapshot():
+            return sorted(
+                Post.objects.values_list('slug', 'profile__username', 'title', 'is_private')
+            )
+
+        first_counts = self.generate()
+        first = snapshot()
+        User.objects.all().delete()
+        Tag.objects.all().delete()
+        self.assertEqual(self.generate(), first_counts)
+        self.assertEqual(snapshot(), first)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MicrobenchmarkTestCase(TestCase):
+    def test_find_regressions(self):
+        context = {'host': 'ci', 'users': 10}
+        history = [
+            {'host': 'ci', 'users': 10, 'results': {'a': {'seconds': seconds, 'queries': 2}}}
+            for seconds in (0.010, 0.012, 0.011)
+        ]
+        # Other hosts and data sets are not comparable
+        history.append({'host': 'laptop', 'users': 10, 'results': {'a': {'seconds': 0.001, 'queries': 1}}})
+
+        def regressions(seconds, queries):
+            return find_regressions(
+                [Measurement('a', seconds, queries)], history, time_threshold=0.25, context=context
+            )
+
+        self.assertEqual(regressions(0.013, 2), [])
+        self.assertEqual([r.name for r in regressions(0.014, 2)], ['a'])
+        self.assertIn('3 queries instead of 2', regressions(0.011, 3)[0].reason)
+        self.assertEqual(find_regressions([Measurement('b', 1, 9)], history, context=context), [])
+
+    def test_default_benchmarks(self):
+        generate(GeneratorConfig(users=20, posts_per_user=3, follows_per_user=5, tags=10, prefix='bench'))
+        user = User.objects.get(username='bench0')
+        measurements = {
+            benchmark.name: measure(benchmark, number=1, repeat=1)
+            for benchmark in default_benchmarks(user)
+        }
+        self.assertIn('queryset.feed', measurements)
+        # Serializers get preloaded instances
+        self.assertEqual(measurements['serializer.posts_list'].queries, 0)
+        self.assertEqual(measurements['serializer.public_profiles'].queries, 0)
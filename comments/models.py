@@ -1,10 +1,28 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
+from core.models import subquery_count
 from profiles.models import Profile
 from posts.models import Post
 
 # Create your models here.
 
 
+class CommentQuerySet(models.QuerySet):
+    def with_list_data(self, user):
+        """
+        Loads everything `CommentSerializer` shows for `user`, in a constant
+        number of queries whatever the number of comments.
+        """
+        likes = Comment.likes.through.objects.all()
+        return self.select_related("profile").annotate(
+            like_count=subquery_count(likes, "comment_id"),
+            replies_count=subquery_count(Comment.objects.all(), "parent_id"),
+            is_liked=Exists(
+                likes.filter(comment_id=OuterRef("pk"), profile__user_id=user.id)
+            ),
+        )
+
+
 class Comment(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     post = models.ForeignKey(
@@ -21,3 +39,5 @@ class Comment(models.Model):
         blank=True,
         related_name="replies",
     )
+
+    objects = CommentQuerySet.as_manager()
@@ -1,6 +1,5 @@
 from rest_framework import serializers
 from .models import Comment
-from rich import print as rprint
 
 
 class RepliesSerializer(serializers.ModelSerializer):
@@ -18,15 +17,22 @@ class CommentSerializer(serializers.ModelSerializer):
         many=False, view_name='comments-detail', lookup_field='id')
 
     def get_is_liked(self, obj: Comment) -> bool:
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.profile.id).exists()
+            return obj.likes.filter(user_id=request.user.id).exists()
         return False
 
+    # Lists annotate the counts, see CommentQuerySet.with_list_data
     def get_like_count(self, obj: Comment) -> int:
+        if hasattr(obj, 'like_count'):
+            return obj.like_count
         return obj.likes.count()
     
     def get_replies_count(self, obj: Comment) -> int:
+        if hasattr(obj, 'replies_count'):
+            return obj.replies_count
         return obj.replies.count()
 
     class Meta:
@@ -5,6 +5,7 @@ from profiles.serializers import PublicProfileSerializer
 from .serializers import CommentSerializer
 from .models import Comment
 from profiles.models import Profile
+from app.mixins import MemoizedObjectMixin
 from app.permissions import IsAccountOwnerOrAdmin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
@@ -13,18 +14,25 @@ from rest_framework.response import Response
 from rest_framework import status
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
 from drf_spectacular.types import OpenApiTypes
-from rich import print as rprint
 from .custom_schemas import comments_schema
 
 # Create your views here.
 
 
 @extend_schema_view(**comments_schema)
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(MemoizedObjectMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
+    object_select_related = ("profile",)
     serializer_class = CommentSerializer
     lookup_field = "id"
 
+    # Queries allowed per action, checked by QueryBudgetMiddleware
+    query_budgets = {
+        "list": 3,
+        "retrieve": 6,
+        "likes": 4,
+    }
+
     permission_classes = {
         "list": {
             "classes": [IsAuthenticated],
@@ -116,7 +124,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             return Response(
                 {"message": "post_id is required"}, status=status.HTTP_400_BAD_REQUEST
             )
-        queryset = self.queryset.filter(post__id=post_id)
+        queryset = self.queryset.filter(post__id=post_id).with_list_data(request.user)
         serializer = self.get_serializer(queryset, many=True)
         return Response(
             serializer.data,
@@ -171,7 +179,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     def like(self, request, id: int = None):
         comment: Comment = self.get_object()
         profile: Profile = request.user.profile
-        liked: bool = comment.likes.filter(user=request.user).exists()
+        liked: bool = comment.likes.filter(user_id=request.user.id).exists()
 
         if liked:
             comment.likes.remove(profile)
@@ -194,6 +202,6 @@ class CommentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def likes(self, request, id: int = None):
         comment: Comment = self.get_object()
-        likes = comment.likes.all()
+        likes = comment.likes.with_is_following(request.user)
         serializer = self.get_serializer(likes, many=True)
         return self.get_paginated_response(self.paginate_queryset(serializer.data))
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 # Create your models here.
 class TimestampedModel(models.Model):
@@ -8,4 +10,21 @@ class TimestampedModel(models.Model):
     class Meta:
         abstract = True
 
-        ordering = ['-created_at', '-updated_at']
\ No newline at end of file
+        ordering = ['-created_at', '-updated_at']
+
+def subquery_count(queryset, group_field: str):
+    """
+    Counts the rows of `queryset` whose `group_field` points at the outer row,
+    as a correlated subquery usable in `annotate()` or `update()`.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{group_field: OuterRef("pk")})
+            .order_by()
+            .values(group_field)
+            .annotate(count=Count("*"))
+            .values("count"),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )
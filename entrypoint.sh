@@ -20,4 +20,23 @@ python manage.py makemigrations
 python manage.py migrate
 python manage.py collectstatic --noinput
 
+# Generate the OpenAPI schema once instead of in every worker
+if [ -n "$SCHEMA_FILE" ]
+then
+    python manage.py spectacular --file "$SCHEMA_FILE"
+fi
+
+# Build the autocomplete snapshot the workers load at startup
+if [ "$AUTOCOMPLETE_ENGINE" = "memory" ]
+then
+    python manage.py rebuild_autocomplete
+fi
+
+# Drop the metrics of the workers of the previous run
+if [ -n "$METRICS_DIRECTORY" ]
+then
+    mkdir -p "$METRICS_DIRECTORY"
+    find "$METRICS_DIRECTORY" -mindepth 1 -delete
+fi
+
 exec "$@"
\ No newline at end of file
@@ -1,3 +1,58 @@
-from django.test import TestCase
+import json
+from django.contrib.auth.models import User
+from app.testing import TestCase
+from rest_framework.test import APIClient
+from posts.models import Post
+from tags.models import Tag
 
-# Create your tests here.
+
+class FeedViewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="rootroot")
+        self.authors = [
+            User.objects.create_user(username=name, password="rootroot").profile
+            for name in ("alice", "bob")
+        ]
+        self.user.profile.follows.add(*self.authors)
+        tags = [Tag.objects.create(name=name) for name in ("sun", "sea")]
+        for i in range(4):
+            post = Post.objects.create(
+                profile=self.authors[i % 2], title=f"Post {i}", body="Body"
+            )
+            post.tags.set(tags[: i % 2 + 1])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_compact_format(self):
+        expected = self.client.get("/api/feed/").json()
+        response = self.client.get(
+            "/api/feed/", HTTP_ACCEPT="application/vnd.instagram-clone.compact+json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "application/vnd.instagram-clone.compact+json"
+        )
+        data = json.loads(response.content)
+        self.assertEqual(data["count"], 4)
+
+        # Rebuild the regular results from the columns and lookup tables
+        table = data["results"]
+        profiles, tags = data["lookups"]["profiles"], data["lookups"]["tags"]
+        self.assertCountEqual(profiles, ["alice", "bob"])
+        self.assertCountEqual(tags, ["sun", "sea"])
+        results = []
+        for row in table["rows"]:
+            post = dict(zip(table["fields"], row))
+            post["profile"] = profiles[post["profile"]]
+            post["tags"] = [tags[index] for index in post["tags"]]
+            results.append(post)
+        self.assertEqual(results, expected["results"])
+
+        self.assertLess(len(response.content), len(json.dumps(expected)))
+
+        # Also selected with the format query parameter, which links keep
+        response = self.client.get("/api/feed/", {"format": "compact"})
+        data = json.loads(response.content)
+        self.assertEqual(data["results"]["fields"], table["fields"])
+        url = data["results"]["rows"][0][table["fields"].index("url")]
+        self.assertEqual(self.client.get(url).status_code, 200)
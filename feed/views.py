@@ -9,7 +9,8 @@ from drf_spectacular.utils import extend_schema
 
 @extend_schema(
     summary="Retrieve feed",
-    description="Retrieve a paginated list of posts from followed profiles order by created date.",
+    description="Retrieve a paginated list of posts from followed profiles order by created date. "
+    "Send `?format=compact` for the columnar compact format.",
     responses=PostsListSerializer(many=True),
     tags=["Feed"],
 )
@@ -19,15 +20,19 @@ class FeedView(generics.ListAPIView):
 
     def get_queryset(self):
         # Retrieve the user's profile
-        user_profile: Profile = self.request.user.profile
-
         # Retrieve the profiles that the user follows
-        followed_profiles: List[Profile] = user_profile.follows.all()
+        followed_profiles: List[Profile] = Profile.objects.filter(
+            followed_by__user_id=self.request.user.id
+        )
 
         # Retrieve all the posts from the followed profiles
-        posts: List[Post] = Post.objects.filter(
-            profile__in=followed_profiles,
-            is_private=False,
-        ).order_by("-created")
+        posts: List[Post] = (
+            Post.objects.filter(
+                profile__in=followed_profiles,
+                is_private=False,
+            )
+            .with_list_data()
+            .order_by("-created")
+        )
 
         return posts
@@ -0,0 +1,32 @@
+from .registry import Counter, Histogram
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Duration of the requests by view and action.",
+    ["view", "action", "method", "status"],
+)
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "Database queries run by the requests of each view and action.",
+    ["view", "action"],
+)
+DB_QUERY_DURATION = Counter(
+    "db_query_duration_seconds_total",
+    "Time spent in database queries by the requests of each view and action.",
+    ["view", "action"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Lookups of the application caches by result, hit or miss.",
+    ["cache", "result"],
+)
+THROTTLE_REJECTIONS = Counter(
+    "throttle_rejections_total",
+    "Requests rejected by the rate throttles.",
+    ["scope", "view"],
+)
+STORAGE_DURATION = Histogram(
+    "storage_operation_duration_seconds",
+    "Duration of the media storage operations.",
+    ["operation"],
+)
@@ -0,0 +1,83 @@
+import time
+from contextlib import ExitStack
+from typing import Tuple
+
+from django.conf import settings
+from django.db import connections
+
+from .instruments import DB_QUERIES, DB_QUERY_DURATION, REQUEST_DURATION
+from .registry import registry
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting and timing queries, without the SQL
+    fingerprinting of `app.middleware.QueryStats`.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+    def fork(self) -> "QueryTimer":
+        return type(self)()
+
+    def merge(self, other: "QueryTimer") -> None:
+        self.count += other.count
+        self.duration += other.duration
+
+
+def view_labels(request, response) -> Tuple[str, str]:
+    """
+    Returns the (view, action) labels of a request: the DRF view class and
+    its action, or the lowercased method for views without actions.
+    """
+    view = getattr(response, "renderer_context", {}).get("view")
+    if view is not None:
+        return type(view).__name__, getattr(view, "action", None) or request.method.lower()
+    match = request.resolver_match
+    # Unresolved paths would make one series per URL
+    return (match.view_name if match else "unmatched"), request.method.lower()
+
+
+class MetricsMiddleware:
+    """
+    Records the duration, status and database usage of every request in the
+    Prometheus metrics served by `metrics.views.metrics`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view, action = view_labels(request, response)
+        REQUEST_DURATION.observe(
+            duration,
+            view=view,
+            action=action,
+            method=request.method,
+            status=f"{response.status_code // 100}xx",
+        )
+        DB_QUERIES.inc(timer.count, view=view, action=action)
+        DB_QUERY_DURATION.inc(timer.duration, view=view, action=action)
+        registry.flush()
+        return response
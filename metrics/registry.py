@@ -0,0 +1,284 @@
+"""
+Counters and histograms exposed in the Prometheus text format.
+
+Updates only touch a dict of this process under a lock. With several worker
+processes, each one periodically writes its values to its own file in
+`METRICS_DIRECTORY`, and the metrics endpoint sums the files of all the
+processes, the same way prometheus_client's multiprocess mode does. When collecting, the
+files of the workers that exited are merged into an archive file, so recycled
+workers never make counters or histograms go down. There are no gauges, whose
+values would be dropped instead. entrypoint.sh empties the directory on
+startup, a server restart being a genuine reset.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (sample name, ((label, value), ...))
+SampleKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Values of the exited processes
+ARCHIVE_FILE = "archived.json"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, "Metric"] = {}
+        self.values: Dict[SampleKey, float] = defaultdict(float)
+        self.lock = threading.Lock()
+        # Unique per process lifetime, a reused pid must not overwrite the
+        # file of a dead process
+        self.process_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.flushed_at = 0.0
+
+    def register(self, metric: "Metric") -> None:
+        self.metrics[metric.name] = metric
+
+    def add(self, samples: Iterable[Tuple[SampleKey, float]]) -> None:
+        with self.lock:
+            for key, amount in samples:
+                self.values[key] += amount
+
+    def snapshot(self) -> Dict[SampleKey, float]:
+        with self.lock:
+            return dict(self.values)
+
+    def get_directory(self) -> Optional[str]:
+        return getattr(settings, "METRICS_DIRECTORY", None)
+
+    def flush(self, force: bool = False) -> None:
+        """
+        Writes the values of this process for the other processes, at most
+        every `METRICS_FLUSH_INTERVAL` seconds unless forced.
+        """
+        directory = self.get_directory()
+        now = time.monotonic()
+        if not directory or (
+            not force and now - self.flushed_at < getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+        ):
+            return
+        self.flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        write_samples(os.path.join(directory, f"{self.process_id}.json"), self.snapshot())
+
+    @contextmanager
+    def directory_lock(self, directory: str, exclusive: bool):
+        """
+        Cross-process lock on the files of exited processes: shared for
+        reading them, exclusive for archiving them.
+        """
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # Closing releases the lock
+            os.close(fd)
+
+    def archive(self, directory: str, names: List[str]) -> None:
+        """
+        Adds the values of exited processes to the archive and deletes their
+        files, which would otherwise be summed forever.
+        """
+        with self.directory_lock(directory, exclusive=True):
+            archive_path = os.path.join(directory, ARCHIVE_FILE)
+            archived = defaultdict(float, read_samples(archive_path) or {})
+            paths = []
+            for name in names:
+                path = os.path.join(directory, name)
+                # Another process may have archived it first
+                samples = read_samples(path)
+                if samples is None:
+                    continue
+                for key, value in samples.items():
+                    archived[key] += value
+                paths.append(path)
+            if not paths:
+                return
+            write_samples(archive_path, archived)
+            for path in paths:
+                os.remove(path)
+
+    def collect(self) -> Dict[SampleKey, float]:
+        """
+        Returns the values summed over every process.
+        """
+        values = defaultdict(float, self.snapshot())
+        directory = self.get_directory()
+        if not directory or not os.path.isdir(directory):
+            return values
+        own_file = f"{self.process_id}.json"
+        names = [
+            name for name in os.listdir(directory) if name.endswith(".json") and name != own_file
+        ]
+        exited = [
+            name
+            for name in names
+            if name != ARCHIVE_FILE and not process_alive(name.split("-", 1)[0])
+        ]
+        if exited:
+            self.archive(directory, exited)
+            names = [name for name in names if name not in exited]
+            if ARCHIVE_FILE not in names:
+                names.append(ARCHIVE_FILE)
+        with self.directory_lock(directory, exclusive=False):
+            for name in names:
+                for key, value in (read_samples(os.path.join(directory, name)) or {}).items():
+                    values[key] += value
+        return values
+
+    def exposition(self) -> str:
+        values = self.collect()
+        by_metric = defaultdict(list)
+        for (sample_name, labels), value in values.items():
+            by_metric[self.metric_of(sample_name)].append((sample_name, labels, value))
+
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for sample_name, labels, value in sorted(by_metric.get(name, []), key=metric.sort_key):
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def metric_of(self, sample_name: str) -> str:
+        for suffix in ("_bucket", "_sum", "_count"):
+            if sample_name.endswith(suffix) and sample_name[: -len(suffix)] in self.metrics:
+                return sample_name[: -len(suffix)]
+        return sample_name
+
+
+def read_samples(path: str) -> Optional[Dict[SampleKey, float]]:
+    try:
+        with open(path) as values_file:
+            samples = json.load(values_file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return {
+        (sample_name, tuple(tuple(label) for label in labels)): value
+        for sample_name, labels, value in samples
+    }
+
+
+def write_samples(path: str, values: Dict[SampleKey, float]) -> None:
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as values_file:
+        json.dump(
+            [[name, list(labels), value] for (name, labels), value in values.items()],
+            values_file,
+        )
+    # Atomic, readers never see a partial file
+    os.replace(temporary_path, path)
+
+
+def process_alive(pid: str) -> bool:
+    """
+    Whether the process with this id still runs on this host.
+    """
+    try:
+        os.kill(int(pid), 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+registry = Registry()
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def label_pairs(self, labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def sort_key(self, sample) -> tuple:
+        sample_name, labels, _ = sample
+        return labels, sample_name
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        registry.add([((self.name, self.label_pairs(labels)), amount)])
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = [
+            (bound, ("le", format_value(bound))) for bound in sorted(buckets) + [float("inf")]
+        ]
+
+    def observe(self, value: float, **labels) -> None:
+        pairs = self.label_pairs(labels)
+        # Buckets are cumulative, a value counts in every bucket above it.
+        # The others get 0 so every bucket is exposed.
+        samples: List[Tuple[SampleKey, float]] = [
+            ((f"{self.name}_bucket", pairs + (le,)), int(value <= bound))
+            for bound, le in self.buckets
+        ]
+        samples.append(((f"{self.name}_sum", pairs), value))
+        samples.append(((f"{self.name}_count", pairs), 1))
+        registry.add(samples)
+
+    def sort_key(self, sample) -> tuple:
+        sample_name, labels, _ = sample
+        # Group each label set, with its buckets in ascending order
+        base = tuple(label for label in labels if label[0] != "le")
+        bound = dict(labels).get("le")
+        order = float("inf") if bound in (None, "+Inf") else float(bound)
+        return base, sample_name != f"{self.name}_bucket", order, sample_name
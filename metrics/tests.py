@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from django.contrib.auth.models import User
+from django.test import override_settings
+from app.testing import TestCase
+from rest_framework.test import APIClient
+from .registry import Counter, Histogram, registry
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='', METRICS_ALLOWED_IPS=['127.0.0.1'])
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='rootroot')
+        self.client.force_authenticate(self.user)
+
+    def scrape(self, **kwargs):
+        response = self.client.get('/metrics/', **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, line_start):
+        values = [line.rsplit(' ', 1)[1] for line in text.splitlines() if line.startswith(line_start)]
+        return float(values[0]) if values else 0.0
+
+    def test_histogram_exposition(self):
+        histogram = Histogram('test_duration_seconds', 'Test.', ['kind'], buckets=[0.1, 1])
+        histogram.observe(0.5, kind='a')
+        histogram.observe(2, kind='a')
+        text = registry.exposition()
+        self.assertIn('# TYPE test_duration_seconds histogram', text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="0.1"} 0', text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="1"} 1', text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="+Inf"} 2', text)
+        self.assertIn('test_duration_seconds_sum{kind="a"} 2.5', text)
+        self.assertIn('test_duration_seconds_count{kind="a"} 2', text)
+
+    def test_requests_are_recorded(self):
+        series = 'http_request_duration_seconds_count{view="ProfileModelViewSet",action="retrieve",method="GET",status="2xx"}'
+        before = self.sample(self.scrape(), series)
+        self.client.get('/api/profiles/alice/')
+        text = self.scrape()
+        self.assertEqual(self.sample(text, series), before + 1)
+        self.assertGreater(
+            self.sample(text, 'db_queries_total{view="ProfileModelViewSet",action="retrieve"}'), 0
+        )
+
+    def test_processes_are_summed(self):
+        counter = Counter('test_jobs_total', 'Test.')
+        counter.inc(2)
+        directory = tempfile.mkdtemp()
+        with open(os.path.join(directory, '1-other.json'), 'w') as other_process:
+            json.dump([['test_jobs_total', [], 3]], other_process)
+        with self.settings(METRICS_DIRECTORY=directory):
+            text = self.scrape()
+        self.assertIn('\ntest_jobs_total 5\n', text)
+        # The scrape published this process' values for the others
+        self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.json')]), 2)
+
+    def test_exited_processes_are_archived(self):
+        counter = Counter('test_exited_total', 'Test.')
+        counter.inc(2)
+        directory = tempfile.mkdtemp()
+        # Above the largest pid Linux allows
+        dead_file = os.path.join(directory, '4194305-other.json')
+        with open(dead_file, 'w') as other_process:
+            json.dump([['test_exited_total', [], 3]], other_process)
+        with self.settings(METRICS_DIRECTORY=directory):
+            self.assertIn('\ntest_exited_total 5\n', self.scrape())
+            self.assertFalse(os.path.exists(dead_file))
+            # Counters never go down, and archived values are only added once
+            self.assertIn('\ntest_exited_total 5\n', self.scrape())
+
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 403)
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/').status_code, 403)
+            self.scrape(HTTP_AUTHORIZATION='Bearer secret')
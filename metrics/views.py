@@ -0,0 +1,32 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .registry import registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def is_allowed(request) -> bool:
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        return hmac.compare_digest(
+            request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+        )
+    return request.META.get("REMOTE_ADDR") in getattr(
+        settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"]
+    )
+
+
+def metrics(request):
+    """
+    Serves the metrics of every worker process in the Prometheus text format,
+    to the scrapers sending `METRICS_TOKEN`, or without a token configured to
+    the `METRICS_ALLOWED_IPS`.
+    """
+    if not is_allowed(request):
+        return HttpResponseForbidden()
+    # Let the other processes see our values at the next scrape
+    registry.flush(force=True)
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
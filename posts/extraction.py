@@ -0,0 +1,54 @@
+import re
+from typing import Iterable, List, Set
+
+from django.utils.text import slugify
+
+from profiles.models import Profile
+from tags.models import Tag
+
+HASHTAG_RE = re.compile(r"(?<![\w#&])#(\w+)", re.UNICODE)
+MENTION_RE = re.compile(r"(?<![\w@])@([-\w]+)", re.UNICODE)
+
+
+def extract_hashtags(*texts: str) -> List[str]:
+    """
+    Returns the distinct `#hashtags` found in the texts, in order of appearance.
+    """
+    return list(dict.fromkeys(tag for text in texts for tag in HASHTAG_RE.findall(text or "")))
+
+
+def extract_mentions(*texts: str) -> List[str]:
+    """
+    Returns the distinct `@usernames` found in the texts, in order of appearance.
+    """
+    return list(
+        dict.fromkeys(username for text in texts for username in MENTION_RE.findall(text or ""))
+    )
+
+
+def resolve_tags(names: Iterable[str]) -> Set[Tag]:
+    """
+    Returns the tags with the given names, matched by slug. Missing tags are
+    created in one query, then every tag is fetched in another.
+    """
+    names_by_slug = {}
+    for name in names:
+        slug = slugify(name)
+        if slug:
+            names_by_slug.setdefault(slug, name)
+    if not names_by_slug:
+        return set()
+
+    # Tags created concurrently, or existing ones, are skipped
+    Tag.objects.bulk_create(
+        [Tag(name=name, slug=slug) for slug, name in names_by_slug.items()],
+        ignore_conflicts=True,
+    )
+    return set(Tag.objects.filter(slug__in=names_by_slug))
+
+
+def resolve_mentions(usernames: Iterable[str]) -> List[Profile]:
+    usernames = list(usernames)
+    if not usernames:
+        return []
+    return list(Profile.objects.filter(username__in=usernames))
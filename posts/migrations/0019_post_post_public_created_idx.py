@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_auto_20240429_0927'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_private', False)), fields=['-created', '-id'], name='post_public_created_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.4 on 2026-10-19 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_post_public_created_idx'),
+        ('profiles', '0008_profile_username'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='mentions',
+            field=models.ManyToManyField(blank=True, related_name='mentioned_in', to='profiles.profile'),
+        ),
+    ]
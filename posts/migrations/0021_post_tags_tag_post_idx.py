@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_mentions'),
+    ]
+
+    # The auto-created through table only has the (post_id, tag_id) unique
+    # index, tag searches look posts up by tag_id first
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS posts_post_tags_tag_post_idx ON posts_post_tags (tag_id, post_id)',
+            reverse_sql='DROP INDEX IF EXISTS posts_post_tags_tag_post_idx',
+        ),
+    ]
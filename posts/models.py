@@ -1,9 +1,12 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from tags.models import Tag
 from django.utils.text import slugify
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models import F
+from core.models import subquery_count
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django_advance_thumbnail import AdvanceThumbnailField
 import uuid
 import os
@@ -35,6 +38,23 @@ class PostImage(models.Model):
         size=(720, 720)
     )
 
+class PostQuerySet(models.QuerySet):
+    def with_list_data(self):
+        """
+        Loads everything the post list serializers show, in a constant number
+        of queries whatever the number of posts.
+        """
+        Comment = apps.get_model("comments", "Comment")
+        return (
+            self.select_related("profile")
+            .prefetch_related("tags", "images")
+            .annotate(
+                like_count=subquery_count(Post.likes.through.objects.all(), "post_id"),
+                comment_count=subquery_count(Comment.objects.all(), "post_id"),
+            )
+        )
+
+
 class Post(models.Model):
     profile = models.ForeignKey(
         'profiles.Profile', on_delete=models.CASCADE, related_name='posts')
@@ -47,15 +67,41 @@ class Post(models.Model):
         'profiles.Profile', blank=True, related_name='post_likes')
     view_count = models.IntegerField(default=0, editable=False)
     tags = models.ManyToManyField(Tag, blank=True)
+    mentions = models.ManyToManyField(
+        'profiles.Profile', blank=True, related_name='mentioned_in')
     is_featured = models.BooleanField(default=False)
     is_private = models.BooleanField(default=False)
 
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the newest-first listings of public posts, e.g. tag pages
+            models.Index(
+                fields=["-created", "-id"],
+                name="post_public_created_idx",
+                condition=models.Q(is_private=False),
+            ),
+        ]
+
     # slugify
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored visibility to tell publishes apart from other saves
+        instance._stored_is_private = instance.__dict__.get("is_private")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        return super(Post, self).save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if not self._state.adding and update_fields is not None and "is_private" not in update_fields:
+            return super(Post, self).save(*args, **kwargs)
+        # post_save updates Profile.posts_count, commit both together
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            return super(Post, self).save(*args, **kwargs)
     
     def increment_view_count(self):
         self.view_count += 1
@@ -69,4 +115,32 @@ class Post(models.Model):
 def delete_image_file(sender, instance, **kwargs):
     for post_image in instance.images.all():
         post_image.image.delete(save=False)
-        post_image.thumbnail.delete(save=False)
\ No newline at end of file
+        post_image.thumbnail.delete(save=False)
+
+
+def _update_posts_count(profile_id, delta):
+    from profiles.models import Profile
+
+    Profile.objects.filter(pk=profile_id).update(posts_count=F("posts_count") + delta)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keeps the public `Profile.posts_count` in step on create and publish.
+    """
+    if created:
+        if not instance.is_private:
+            _update_posts_count(instance.profile_id, 1)
+    elif update_fields is None or "is_private" in update_fields:
+        stored_is_private = getattr(instance, "_stored_is_private", None)
+        if stored_is_private is not None and stored_is_private != instance.is_private:
+            _update_posts_count(instance.profile_id, -1 if instance.is_private else 1)
+    instance._stored_is_private = instance.is_private
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    # Deletions send post_delete inside their own transaction
+    if not getattr(instance, "_stored_is_private", instance.is_private):
+        _update_posts_count(instance.profile_id, -1)
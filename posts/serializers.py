@@ -1,3 +1,4 @@
+import logging
 from django.forms import ValidationError
 from rest_framework import serializers
 from .models import Post, PostImage
@@ -10,6 +11,9 @@ from django.db.models import F
 from django.db import transaction
 from profiles.serializers import PublicProfileSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
+from .extraction import extract_hashtags, extract_mentions, resolve_mentions, resolve_tags
+
+logger = logging.getLogger(__name__)
 
 
 class TagListField(serializers.ListField):
@@ -23,15 +27,8 @@ class TagListField(serializers.ListField):
         Returns:
             Set[Tag]: The set of internal tags corresponding to the external value.
         """
-        # Create tags that do not exist
-        tags = set()
-        for tag_name in data:
-            try:
-                tag = Tag.objects.get(slug=slugify(tag_name))
-            except Tag.DoesNotExist:
-                tag = Tag.objects.create(name=tag_name)
-            tags.add(tag)
-        return tags
+        # Fetch existing tags in one query and create the missing ones
+        return resolve_tags(data)
 
     def to_representation(self, data):
         return [
@@ -58,10 +55,15 @@ class PostsListSerializer(serializers.ModelSerializer):
         many=False, view_name="posts-detail", lookup_field="slug"
     )
 
+    # Lists annotate the counts, see PostQuerySet.with_list_data
     def get_like_count(self, obj) -> int:
+        if hasattr(obj, "like_count"):
+            return obj.like_count
         return obj.likes.count()
 
     def get_comment_count(self, obj) -> int:
+        if hasattr(obj, "comment_count"):
+            return obj.comment_count
         return obj.comments.count()
 
     class Meta:
@@ -89,6 +91,9 @@ class PostDetailSerializer(serializers.ModelSerializer):
     # likes = PublicProfileSerializer(many=True, read_only=True)
     slug = serializers.SlugField(read_only=True)
     tags = TagListField(child=serializers.CharField(), required=False)
+    mentions = serializers.SlugRelatedField(
+        many=True, slug_field="username", read_only=True
+    )
     profile = serializers.StringRelatedField(read_only=True)
     like_count = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
@@ -106,7 +111,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
     def get_is_liked(self, obj: Post) -> bool:
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.profile.id).exists()
+            return obj.likes.filter(user_id=request.user.id).exists()
         return False
 
     def get_like_count(self, obj: Post) -> int:
@@ -115,7 +120,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
     def get_is_favorited(self, obj: Post) -> bool:
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            return obj.favorited_by.filter(id=request.user.profile.id).exists()
+            return obj.favorited_by.filter(user_id=request.user.id).exists()
         return False
 
     def get_comment_count(self, obj: Post) -> int:
@@ -132,6 +137,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
             "body",
             "slug",
             "tags",
+            "mentions",
             "created",
             "updated",
             # 'likes',
@@ -157,11 +163,27 @@ class PostDetailSerializer(serializers.ModelSerializer):
                 raise ValidationError("A post cannot have more than 10 images.")
         return data
 
+    def extract_tags(self, title: str, body: str):
+        """
+        Resolves the `#hashtags` typed in the title and body into tags.
+        """
+        return resolve_tags(extract_hashtags(title, body))
+
+    def save_mentions(self, post: Post) -> None:
+        """
+        Links the profiles `@mentioned` in the title and body to the post.
+        """
+        post.mentions.set(resolve_mentions(extract_mentions(post.title, post.body)))
+
     def create(self, validated_data):
         uploaded_images = validated_data.pop("uploaded_images", None)
-        tags = validated_data.pop("tags", [])
 
         with transaction.atomic():
+            # Inside the transaction, a failed creation leaves no orphan tags
+            tags = set(validated_data.pop("tags", [])) | self.extract_tags(
+                validated_data.get("title", ""), validated_data.get("body", "")
+            )
+
             # Create brand new slug for the post
             slug = slugify(validated_data["title"])
             if slug and Post.objects.filter(slug=slug).exists():
@@ -182,16 +204,21 @@ class PostDetailSerializer(serializers.ModelSerializer):
                     # Increment the post_count for the related tag
                     Tag.objects.filter(id=tag.id).update(post_count=F("post_count") + 1)
 
+                self.save_mentions(post)
+
             except Exception as e:
                 raise e
 
         return post
 
     def update(self, instance, validated_data):
-        print("update called")
+        logger.debug("Updating post %s", instance.pk)
         uploaded_images = validated_data.pop("uploaded_images", None)
-        # Get the new set of tags
-        new_tags = set(validated_data.pop("tags", []))
+        # Get the new set of tags, including the hashtags of the new title and body
+        new_tags = set(validated_data.pop("tags", [])) | self.extract_tags(
+            validated_data.get("title", instance.title),
+            validated_data.get("body", instance.body),
+        )
 
         # Get the old set of tags
         old_tags = set(instance.tags.all())
@@ -222,6 +249,8 @@ class PostDetailSerializer(serializers.ModelSerializer):
 
         Tag.objects.filter(post_count=0).delete()
 
+        self.save_mentions(instance)
+
         if uploaded_images:
             for image_data in uploaded_images:
                 PostImage.objects.create(post=instance, image=image_data)
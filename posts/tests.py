@@ -1,7 +1,13 @@
-from django.test import TestCase
+from unittest import mock
+from app.testing import TestCase
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
+from rest_framework.test import APIRequestFactory
+from .models import Post
+from .extraction import extract_hashtags, extract_mentions, resolve_tags
+from .serializers import PostDetailSerializer
+from tags.models import Tag
 
 
 class PostViewSetTestCase(TestCase):
@@ -97,3 +103,76 @@ class PostViewSetTestCase(TestCase):
         update_response = self.client.delete(
             f'/api/posts/{post_id}/', headers=update_headers)
         self.assertEqual(update_response.status_code, 401)
+
+
+class FeaturePostTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Demo', password='rootroot')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.posts = [
+            Post.objects.create(profile=self.user.profile, title=f'Post {i}', body='Body')
+            for i in range(4)
+        ]
+
+    def test_feature_limit_and_unfeature(self):
+        for post in self.posts[:3]:
+            response = self.client.post(f'/api/posts/{post.slug}/feature/')
+            self.assertEqual(response.data['status'], 200)
+        response = self.client.post(f'/api/posts/{self.posts[3].slug}/feature/')
+        self.assertEqual(response.data['status'], 400)
+        self.assertFalse(Post.objects.get(pk=self.posts[3].pk).is_featured)
+
+        response = self.client.post(f'/api/posts/{self.posts[0].slug}/feature/')
+        self.assertEqual(response.data['message'], 'Post unfeatured successfully.')
+        self.assertEqual(Post.objects.filter(is_featured=True).count(), 2)
+
+
+class PostExtractionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='Demo', password='rootroot')
+        self.friend = User.objects.create_user(
+            username='friend', password='rootroot')
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        self.context = {'request': request}
+
+    def test_extract_hashtags_and_mentions(self):
+        text = "#Sunset with @friend and @friend at the bay#not, mail a@b.c &#35 ##double"
+        self.assertEqual(extract_hashtags(text, "#beach #Sunset"), ['Sunset', 'beach'])
+        self.assertEqual(extract_mentions(text), ['friend'])
+
+    def test_update_links_hashtags_and_mentions(self):
+        Tag.objects.create(name='beach', post_count=1)
+        post = Post.objects.create(
+            profile=self.user.profile, title='Holidays', body='')
+
+        serializer = PostDetailSerializer(
+            post,
+            data={'body': 'Day at the #beach with @friend and @nobody #Sunset'},
+            partial=True,
+            context=self.context,
+        )
+        serializer.is_valid(raise_exception=True)
+        post = serializer.save()
+
+        self.assertEqual(
+            sorted(post.tags.values_list('slug', flat=True)), ['beach', 'sunset'])
+        self.assertEqual(list(post.mentions.all()), [self.friend.profile])
+        self.assertEqual(Tag.objects.get(slug='beach').post_count, 2)
+
+    def test_resolve_tags_creates_missing_tags_in_bulk(self):
+        Tag.objects.create(name='beach')
+        with self.assertNumQueries(2):
+            tags = resolve_tags(['Beach', 'Sunset', 'sea', 'SEA'])
+        self.assertEqual(sorted(tag.slug for tag in tags), ['beach', 'sea', 'sunset'])
+
+    def test_failed_create_leaves_no_tags(self):
+        serializer = PostDetailSerializer(context=self.context)
+        with mock.patch.object(PostDetailSerializer, 'save_mentions', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                serializer.create(
+                    {'title': 'Holidays', 'body': 'Day at the #beach', 'profile': self.user.profile}
+                )
+        self.assertFalse(Tag.objects.filter(slug='beach').exists())
@@ -1,3 +1,4 @@
+import logging
 import os
 import tempfile
 import zipfile
@@ -5,7 +6,7 @@ import zipfile
 from django.shortcuts import get_object_or_404
 import requests
 from django.http import FileResponse
-from django.db.models import Q, Count
+from django.db.models import Q
 from rest_framework import viewsets
 
 from django.conf import settings
@@ -21,7 +22,8 @@ from tags.models import Tag
 from tags.serializers import TagSerializer
 from profiles.serializers import PublicProfileSerializer
 from comments.serializers import CommentSerializer
-from app.permissions import IsAccountOwnerOrAdmin
+from app.mixins import MemoizedObjectMixin
+from app.permissions import IsAccountOwnerOrAdmin, is_owner
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
@@ -34,15 +36,17 @@ from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiPara
 from drf_spectacular.types import OpenApiTypes
 from .custom_schemas import posts_schema
 from decouple import config
-from rich import print as rprint
+
+logger = logging.getLogger(__name__)
 
 
 @extend_schema_view(**posts_schema)
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(MemoizedObjectMixin, viewsets.ModelViewSet):
     http_method_names = ["get", "post", "delete", "head", "options", "put"]
     lookup_field = "slug"
     serializer_class = PostsListSerializer
     queryset = Post.objects.all()
+    object_select_related = ("profile",)
     throttle_classes = [BurstRateThrottle, SustainedRateThrottle]
     parser_classes = [MultiPartParser, FormParser]
 
@@ -93,6 +97,23 @@ class PostViewSet(viewsets.ModelViewSet):
         },
     }
 
+    # Throttle cost of the expensive actions, the others cost 1
+    throttle_costs = {
+        "create": 10,
+        "update": 10,
+        "partial_update": 10,
+        "download": 20,
+    }
+
+    # Queries allowed per action, checked by QueryBudgetMiddleware
+    query_budgets = {
+        "list": 6,
+        "favorited": 6,
+        "retrieve": 12,
+        "comments": 4,
+        "likes": 4,
+    }
+
     def get_permissions(self):
         """
         Returns the list of permission instances that the current user has for the given action.
@@ -143,7 +164,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 "like",
             ]:
                 # Check if the authenticated user is the owner of the post
-                if self.get_object().profile.user == self.request.user:
+                if is_owner(self.get_object(), self.request.user):
                     return PersonalPostDetailSerializer
                 else:
                     return PostDetailSerializer
@@ -156,10 +177,12 @@ class PostViewSet(viewsets.ModelViewSet):
         # Filter the queryset to only include posts by the requesting profile
         if self.request and self.request.user.is_authenticated and self.action:
             if self.action in ["list", "delete_all_posts"]:
-                queryset = queryset.filter(profile=self.request.user.profile)
+                queryset = queryset.filter(profile__user_id=self.request.user.id)
+            if self.action in ["list", "favorited"]:
+                queryset = queryset.with_list_data()
             elif self.action == "retrieve":
                 queryset = queryset.filter(
-                    Q(is_private=False) | Q(profile=self.request.user.profile)
+                    Q(is_private=False) | Q(profile__user_id=self.request.user.id)
                 )
         return queryset
 
@@ -271,7 +294,7 @@ class PostViewSet(viewsets.ModelViewSet):
         queryset = (
             self.get_queryset()
             .filter(is_private=False)
-            .filter(favorited_by__id=request.user.profile.id)
+            .filter(favorited_by__user_id=request.user.id)
         )
         serializer = self.get_serializer(
             queryset,
@@ -320,9 +343,8 @@ class PostViewSet(viewsets.ModelViewSet):
             Response: The response object containing the status and message.
         """
         post: Post = self.get_object()
-        user_profile: Profile = post.profile
 
-        if user_profile != request.user.profile:
+        if not is_owner(post, request.user):
             return Response(
                 {
                     "message": "You are not allowed to feature this post.",
@@ -344,7 +366,7 @@ class PostViewSet(viewsets.ModelViewSet):
 
         # Check if the user has more than 3 featured posts
         featured_posts_count: int = Post.objects.filter(
-            profile=user_profile, is_featured=True
+            profile_id=post.profile_id, is_featured=True
         ).count()
         if featured_posts_count >= 3:
             return Response(
@@ -369,7 +391,7 @@ class PostViewSet(viewsets.ModelViewSet):
     def favorite(self, request, slug: str = None) -> Response:
         post: Post = self.get_object()
         profile = Profile.objects.prefetch_related("favorite_posts").get(
-            user=request.user
+            user_id=request.user.id
         )
 
         if post in profile.favorite_posts.all():
@@ -379,7 +401,6 @@ class PostViewSet(viewsets.ModelViewSet):
             profile.favorite_posts.add(post)
             message = "Post added to favorites successfully"
 
-        profile.save()
         return Response(
             {
                 "message": message,
@@ -391,7 +412,7 @@ class PostViewSet(viewsets.ModelViewSet):
     def like(self, request, slug: str = None) -> Response:
         post: Post = self.get_object()
         profile: Profile = request.user.profile
-        liked: bool = post.likes.filter(user=request.user).exists()
+        liked: bool = post.likes.filter(user_id=request.user.id).exists()
 
         if liked:
             post.likes.remove(profile)
@@ -414,7 +435,7 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"], serializer_class=PublicProfileSerializer)
     def likes(self, request, slug: str = None) -> Response:
         post: Post = self.get_object()
-        likes = post.likes.all()
+        likes = post.likes.with_is_following(request.user)
         serializer = self.get_serializer(
             likes,
             many=True,
@@ -480,8 +501,8 @@ class PostViewSet(viewsets.ModelViewSet):
             response["Content-Disposition"] = f'attachment; filename="{zip_filename}"'
 
             return response
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception("Could not zip the images of post %s", post.slug)
             return Response(
                 "An error occurred while downloading the images.",
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -496,7 +517,7 @@ class PostViewSet(viewsets.ModelViewSet):
             post: Post = self.get_object()
             comments = (
                 post.comments.filter(parent=None)
-                .annotate(like_count=Count("likes"))
+                .with_list_data(request.user)
                 .order_by("-like_count", "-created")
             )
             serializer = self.get_serializer(comments, many=True)
@@ -514,7 +535,7 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         post: Post = self.get_object()
         comment = post.comments.get(id=comment_id)
-        subcomments = comment.replies.all()
+        subcomments = comment.replies.with_list_data(request.user)
         serializer = self.get_serializer(
             subcomments,
             many=True,
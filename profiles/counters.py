@@ -0,0 +1,58 @@
+"""
+Recounting of the denormalized `Profile` counters.
+
+The counters are maintained by signals (see `profiles.models` and
+`posts.models`); these helpers recompute them from the source tables, for the
+initial backfill and for the `reconcile_profile_counters` command.
+"""
+
+from core.models import subquery_count
+
+COUNTER_FIELDS = ("followers_count", "following_count", "posts_count")
+
+
+def counter_expressions(profile_model, post_model):
+    """
+    Returns the expressions computing each counter, usable in `annotate()` or
+    `update()`. Models are passed in so migrations can use historical ones.
+    """
+    follows = profile_model.follows.through.objects.all()
+    return {
+        "followers_count": subquery_count(follows, "to_profile_id"),
+        "following_count": subquery_count(follows, "from_profile_id"),
+        "posts_count": subquery_count(post_model.objects.filter(is_private=False), "profile_id"),
+    }
+
+
+def reconcile_counters(profile_model, post_model, chunk_size: int = 1000, fix: bool = True):
+    """
+    Compares the stored counters with recounted values, one chunk of profiles
+    at a time, and rewrites the profiles that drifted. Yields every
+    (profile id, {field: (stored, actual)}) mismatch found.
+    """
+    expressions = counter_expressions(profile_model, post_model)
+    last_id = 0
+    while True:
+        chunk = list(
+            profile_model.objects.filter(pk__gt=last_id)
+            .order_by("pk")
+            .annotate(**{f"actual_{field}": expression for field, expression in expressions.items()})
+            .values("pk", *COUNTER_FIELDS, *(f"actual_{field}" for field in COUNTER_FIELDS))[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1]["pk"]
+
+        for row in chunk:
+            mismatches = {
+                field: (row[field], row[f"actual_{field}"])
+                for field in COUNTER_FIELDS
+                if row[field] != row[f"actual_{field}"]
+            }
+            if not mismatches:
+                continue
+            if fix:
+                profile_model.objects.filter(pk=row["pk"]).update(
+                    **{field: actual for field, (_, actual) in mismatches.items()}
+                )
+            yield row["pk"], mismatches
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from profiles.counters import reconcile_counters
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Recounts the denormalized profile counters and fixes the ones that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the mismatches, without updating the profiles.",
+        )
+
+    def handle(self, *args, **options):
+        fix = not options["dry_run"]
+        drifted = 0
+        for profile_id, mismatches in reconcile_counters(
+            Profile, Post, chunk_size=options["chunk_size"], fix=fix
+        ):
+            drifted += 1
+            details = ", ".join(
+                f"{field} {stored} -> {actual}"
+                for field, (stored, actual) in mismatches.items()
+            )
+            self.stdout.write(f"Profile {profile_id}: {details}")
+
+        verb = "Fixed" if fix else "Found"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {drifted} drifted profiles"))
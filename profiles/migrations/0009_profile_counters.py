@@ -0,0 +1,39 @@
+# Generated by Django 5.0.4 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    from profiles.counters import reconcile_counters
+
+    Profile = apps.get_model('profiles', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    for _ in reconcile_counters(Profile, Post):
+        pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0008_profile_username'),
+        ('posts', '0018_auto_20240429_0927'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db import models
+from django.db.models import Exists, F, OuterRef
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
 from core.models import TimestampedModel
+from .counters import COUNTER_FIELDS
 import os
 
 
@@ -22,6 +25,21 @@ def generate_subfolder(instance):
     return f"{username}"
 
 
+class ProfileQuerySet(models.QuerySet):
+    def with_is_following(self, user):
+        """
+        Annotates whether `user` follows each profile, for
+        `PublicProfileSerializer.is_following`.
+        """
+        return self.annotate(
+            is_following=Exists(
+                Profile.follows.through.objects.filter(
+                    to_profile_id=OuterRef("pk"), from_profile__user_id=user.id
+                )
+            )
+        )
+
+
 class Profile(TimestampedModel):
     user = models.OneToOneField(
         User,
@@ -57,5 +75,75 @@ class Profile(TimestampedModel):
     # saved_posts = models.ManyToManyField(
     #     'posts.Post', blank=True, related_name='saved_by')
 
+    # Denormalized counters, kept up to date by signals and checked by the
+    # `reconcile_profile_counters` command
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    posts_count = models.IntegerField(default=0)
+
+    objects = ProfileQuerySet.as_manager()
+
     def __str__(self):
-        return self.user.username
+        # Same as the user's, which cannot be changed
+        return self.username
+
+    def save(self, *args, **kwargs):
+        # The counters are only written by F() updates. Saving a loaded
+        # profile would write back stale values over concurrent follows and
+        # posts, so leave them out unless asked for.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTER_FIELDS
+            ]
+        return super().save(*args, **kwargs)
+
+
+@receiver(m2m_changed, sender=Profile.follows.through)
+def update_follow_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps `followers_count` and `following_count` in step with `follows`.
+    The manager sends these signals inside its own transaction, so counters
+    and relations are committed together.
+    """
+    related = instance.followed_by if reverse else instance.follows
+    if action == "pre_clear":
+        # The cleared profiles are not passed to post_clear, remember them
+        instance._removed_follow_ids = set(related.values_list("id", flat=True))
+        return
+    if action == "pre_remove":
+        # pk_set also holds ids that were never related, keep the actual ones
+        instance._removed_follow_ids = set(
+            related.filter(pk__in=pk_set).values_list("id", flat=True)
+        )
+        return
+    if action in ("post_remove", "post_clear"):
+        pk_set = instance._removed_follow_ids
+    elif action != "post_add":
+        return
+    if not pk_set:
+        return
+
+    delta = len(pk_set) if action == "post_add" else -len(pk_set)
+    step = 1 if action == "post_add" else -1
+    # Forward: `instance` follows `pk_set`. Reverse: `pk_set` follow `instance`.
+    own_counter, others_counter = (
+        ("followers_count", "following_count")
+        if reverse
+        else ("following_count", "followers_count")
+    )
+    with transaction.atomic(savepoint=False):
+        Profile.objects.filter(pk=instance.pk).update(**{own_counter: F(own_counter) + delta})
+        Profile.objects.filter(pk__in=pk_set).update(**{others_counter: F(others_counter) + step})
+
+
+@receiver(pre_delete, sender=Profile)
+def release_follow_counters(sender, instance, **kwargs):
+    """
+    The `follows` rows of a deleted profile are removed by the cascade,
+    which sends no m2m_changed, so update the other profiles' counters here.
+    """
+    with transaction.atomic(savepoint=False):
+        Profile.objects.filter(followed_by=instance).update(followers_count=F("followers_count") - 1)
+        Profile.objects.filter(follows=instance).update(following_count=F("following_count") - 1)
@@ -15,28 +15,22 @@ class FollowResponseSerializer(serializers.Serializer):
 class PublicProfileSerializer(serializers.ModelSerializer):
     username = serializers.SerializerMethodField()
     is_following = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-    followers_count = serializers.SerializerMethodField()
-    posts_count = serializers.SerializerMethodField()
+    following_count = serializers.IntegerField(read_only=True)
+    followers_count = serializers.IntegerField(read_only=True)
+    posts_count = serializers.IntegerField(read_only=True)
 
     def get_username(self, obj: Profile) -> str:
         return obj.username
 
     def get_is_following(self, obj: Profile) -> bool:
+        # Lists annotate it, see ProfileQuerySet.with_is_following
+        if hasattr(obj, "is_following"):
+            return obj.is_following
         request = self.context.get("request")
         if request and request.user.is_authenticated:
-            return obj.followed_by.filter(id=request.user.profile.id).exists()
+            return obj.followed_by.filter(user_id=request.user.id).exists()
         return False
 
-    def get_following_count(self, obj: Profile) -> int:
-        return obj.follows.count()
-
-    def get_followers_count(self, obj: Profile) -> int:
-        return obj.followed_by.count()
-
-    def get_posts_count(self, obj: Profile) -> int:
-        return obj.posts.filter(is_private=False).count()
-
     class Meta:
         model = Profile
         fields = (
@@ -1,3 +1,100 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from unittest import mock
+from django.db import DatabaseError, connection
+from app.testing import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from posts.models import Post
+from .counters import reconcile_counters
+from .models import Profile
 
-# Create your tests here.
+
+class ProfileCountersTestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='rootroot').profile
+        self.bob = User.objects.create_user(username='bob', password='rootroot').profile
+        self.carol = User.objects.create_user(username='carol', password='rootroot').profile
+
+    def counters(self, profile):
+        profile.refresh_from_db()
+        return (profile.followers_count, profile.following_count, profile.posts_count)
+
+    def test_follow_counters(self):
+        self.alice.follows.add(self.bob, self.carol)
+        self.carol.followed_by.add(self.bob)
+        self.assertEqual(self.counters(self.alice), (0, 2, 0))
+        self.assertEqual(self.counters(self.carol), (2, 0, 0))
+
+        # Removing a profile that is not followed changes nothing
+        self.bob.follows.remove(self.carol, self.alice)
+        self.assertEqual(self.counters(self.bob), (1, 0, 0))
+        self.assertEqual(self.counters(self.alice), (0, 2, 0))
+
+        self.alice.follows.clear()
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_posts_count(self):
+        post = Post.objects.create(title='Draft', body='body', profile=self.alice, is_private=True)
+        self.assertEqual(self.counters(self.alice)[2], 0)
+
+        post = Post.objects.get(pk=post.pk)
+        post.is_private = False
+        post.save()
+        post.save()
+        self.assertEqual(self.counters(self.alice)[2], 1)
+
+        Post.objects.get(pk=post.pk).delete()
+        self.assertEqual(self.counters(self.alice)[2], 0)
+
+    def test_saving_a_loaded_profile_keeps_counters(self):
+        stale = Profile.objects.get(pk=self.bob.pk)
+        self.alice.follows.add(self.bob)
+        Post.objects.create(title='Post', body='body', profile=self.bob)
+        stale.bio = 'Hello'
+        stale.save()
+        self.assertEqual(self.counters(self.bob), (1, 0, 1))
+        self.assertEqual(self.bob.bio, 'Hello')
+
+    def test_deleting_a_profile_updates_counters(self):
+        self.alice.follows.add(self.bob, self.carol)
+        self.carol.follows.add(self.alice)
+        self.alice.user.delete()
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_reconcile_counters(self):
+        self.alice.follows.add(self.bob)
+        Profile.objects.filter(pk=self.bob.pk).update(followers_count=5)
+        mismatches = dict(reconcile_counters(Profile, Post, chunk_size=1))
+        self.assertEqual(mismatches, {self.bob.pk: {'followers_count': (5, 1)}})
+        self.assertEqual(self.counters(self.bob)[0], 1)
+        self.assertEqual(list(reconcile_counters(Profile, Post)), [])
+
+
+class ProfileCountersTransactionTestCase(TransactionTestCase):
+    def test_failed_counter_update_rolls_back_the_post(self):
+        alice = User.objects.create_user(username='alice', password='rootroot').profile
+        with mock.patch('posts.models._update_posts_count', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                Post.objects.create(title='Post', body='body', profile=alice)
+        self.assertFalse(Post.objects.exists())
+
+
+class ProfileObjectMemoizationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='rootroot')
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_looks_up_profile_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/profiles/alice/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('favorite_posts', response.data)
+        lookups = [
+            query for query in queries.captured_queries
+            if 'FROM "profiles_profile"' in query['sql'] and '"username" = ' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
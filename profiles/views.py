@@ -18,7 +18,8 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import status, serializers
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from app.permissions import IsAccountOwnerOrAdmin
+from app.mixins import MemoizedObjectMixin
+from app.permissions import IsAccountOwnerOrAdmin, is_owner
 from typing import List
 from drf_spectacular.utils import extend_schema_view
 from auth.custom_schemas import invalid_token_response
@@ -26,7 +27,7 @@ from .custom_schemas import profiles_schema
 
 
 @extend_schema_view(**profiles_schema)
-class ProfileModelViewSet(viewsets.ModelViewSet):
+class ProfileModelViewSet(MemoizedObjectMixin, viewsets.ModelViewSet):
     http_method_names = [
         "get",
         "post",
@@ -83,6 +84,20 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
         },
     }
 
+    # Throttle cost of the expensive actions, the others cost 1
+    throttle_costs = {
+        "update": 10,
+    }
+
+    # Queries allowed per action, checked by QueryBudgetMiddleware
+    query_budgets = {
+        "list": 5,
+        "retrieve": 5,
+        "posts": 6,
+        "followers": 4,
+        "following": 4,
+    }
+
     def get_permissions(self):
         """
         Instantiates and returns the list of permissions that this view requires.
@@ -98,6 +113,13 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
         )
         raise PermissionDenied(error_message)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # ProfileListSerializer lists the followed profile ids
+            queryset = queryset.prefetch_related("follows")
+        return queryset
+
     def get_serializer_class(self):
         """
         Returns the serializer class based on the current action.
@@ -108,7 +130,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
         user: User = self.request.user
         # Check if the authenticated user is the owner of the profile, if so, return ProfileDetailSerializer
         if self.action in ["retrieve", "delete_profile_pic"]:
-            if self.get_object().user == user:
+            if is_owner(self.get_object(), user):
                 return ProfileDetailSerializer
             else:
                 return PublicProfileSerializer
@@ -148,7 +170,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
 
         instance: Profile = self.get_object()
         # Check if the authenticated user is the owner of the profile
-        if instance.user != request.user:
+        if not is_owner(instance, request.user):
             raise PermissionDenied("You are not allowed to edit this profile.")
 
         serializer = self.get_serializer(
@@ -175,7 +197,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
             PermissionDenied: If the authenticated user is not the owner of the profile.
         """
         profile: Profile = self.get_object()
-        if profile.user != request.user:
+        if not is_owner(profile, request.user):
             self.permission_denied(request)
         profile.profile_pic.delete()
         profile.save()
@@ -193,7 +215,9 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
             Response: The serialized data of the retrieved posts.
         """
         profile: Profile = self.get_object()
-        posts: Post = profile.posts.filter(is_private=False).order_by("-created")
+        posts: Post = (
+            profile.posts.filter(is_private=False).with_list_data().order_by("-created")
+        )
         serializer = self.get_serializer(
             posts,
             many=True,
@@ -244,7 +268,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
         """
 
         profile: Profile = self.get_object()
-        following: List[Profile] = profile.follows.all()
+        following: List[Profile] = profile.follows.with_is_following(request.user)
         serializer = self.get_serializer(
             following,
             many=True,
@@ -262,7 +286,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
             Response: The serialized data of the followers.
         """
         profile: Profile = self.get_object()
-        followers: List[Profile] = profile.followed_by.all()
+        followers: List[Profile] = profile.followed_by.with_is_following(request.user)
         serializer = self.get_serializer(
             followers,
             many=True,
@@ -283,7 +307,7 @@ class ProfileModelViewSet(viewsets.ModelViewSet):
         profile: Profile = self.get_object()
         user = request.user
 
-        is_following = profile.followed_by.filter(id=user.id).exists()
+        is_following = profile.followed_by.filter(user_id=user.id).exists()
         return Response(
             {
                 "is_following": is_following,
@@ -0,0 +1,87 @@
+import cProfile
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from app.middleware import QueryStats
+from auth.authentication import StatelessJWTAuthentication
+
+from . import store
+
+logger = logging.getLogger(__name__)
+
+
+def is_staff(request) -> bool:
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    # API clients authenticate with tokens, which DRF only reads in the view
+    try:
+        result = StatelessJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def should_profile(request) -> bool:
+    header = "HTTP_" + getattr(settings, "PROFILING_HEADER", "X-Profile").upper().replace("-", "_")
+    if header in request.META and is_staff(request):
+        return True
+    sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+class ProfilingMiddleware:
+    """
+    Runs requests under cProfile, when a staff user sends `PROFILING_HEADER`
+    or for a `PROFILING_SAMPLE_RATE` share of all requests, and stores the
+    profile with the SQL timings of the request. Profiled responses carry the
+    profile id in an `X-Profile-Id` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "PROFILING_ENABLED", False) or not should_profile(request):
+            return self.get_response(request)
+
+        stats = QueryStats()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        user = getattr(request, "user", None)
+        try:
+            profile_id = store.save(
+                profiler,
+                {
+                    "method": request.method,
+                    "path": request.get_full_path(),
+                    "status": response.status_code,
+                    "user_id": user.id if user is not None and user.is_authenticated else None,
+                    "duration_ms": round(duration * 1000, 2),
+                    "queries": stats.count,
+                    "db_ms": round(stats.duration * 1000, 2),
+                    "slowest_queries": stats.slowest(20),
+                },
+            )
+        except OSError:
+            # A full disk must not fail the request
+            logger.exception("Could not store the profile of %s", request.path)
+            return response
+        response["X-Profile-Id"] = profile_id
+        return response
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+
+
+class SlowQuerySerializer(serializers.Serializer):
+    sql = serializers.CharField()
+    count = serializers.IntegerField()
+    duration_ms = serializers.FloatField()
+
+
+class RequestProfileSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    created = serializers.FloatField()
+    method = serializers.CharField()
+    path = serializers.CharField()
+    status = serializers.IntegerField()
+    user_id = serializers.IntegerField(allow_null=True)
+    duration_ms = serializers.FloatField()
+    queries = serializers.IntegerField()
+    db_ms = serializers.FloatField()
+
+
+class RequestProfileDetailSerializer(RequestProfileSerializer):
+    slowest_queries = SlowQuerySerializer(many=True)
+    stats = serializers.CharField()
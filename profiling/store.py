@@ -0,0 +1,93 @@
+"""
+Storage of request profiles in `PROFILING_DIRECTORY`.
+
+Each profile is a cProfile dump, `<id>.prof`, next to a `<id>.json` file
+describing the request and its SQL. Only the `PROFILING_MAX_FILES` most recent
+profiles are kept.
+"""
+
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+PROFILE_ID_RE = re.compile(r"^\d{8}T\d{6}-[0-9a-f]{8}$")
+
+
+def get_directory() -> str:
+    directory = getattr(settings, "PROFILING_DIRECTORY", "request_profiles")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def get_path(profile_id: str, extension: str) -> Optional[str]:
+    # Ids come from URLs, never build paths from anything else
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(get_directory(), f"{profile_id}.{extension}")
+    return path if os.path.exists(path) else None
+
+
+def save(profiler, metadata: Dict) -> str:
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    directory = get_directory()
+    profiler.dump_stats(os.path.join(directory, f"{profile_id}.prof"))
+    # Written last, listing only shows profiles whose dump is complete
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as metadata_file:
+        json.dump({"id": profile_id, "created": time.time(), **metadata}, metadata_file)
+    prune(getattr(settings, "PROFILING_MAX_FILES", 200))
+    return profile_id
+
+
+def prune(max_files: int) -> None:
+    directory = get_directory()
+    profile_ids = sorted(
+        name[: -len(".json")] for name in os.listdir(directory) if name.endswith(".json")
+    )
+    for profile_id in profile_ids[: max(len(profile_ids) - max_files, 0)]:
+        for extension in ("json", "prof"):
+            try:
+                os.remove(os.path.join(directory, f"{profile_id}.{extension}"))
+            except FileNotFoundError:
+                # Already pruned by another worker
+                pass
+
+
+def list_profiles() -> List[Dict]:
+    directory = get_directory()
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as metadata_file:
+                profiles.append(json.load(metadata_file))
+        except (FileNotFoundError, ValueError):
+            continue
+    return profiles
+
+
+def load_profile(profile_id: str) -> Optional[Dict]:
+    path = get_path(profile_id, "json")
+    if path is None:
+        return None
+    with open(path) as metadata_file:
+        return json.load(metadata_file)
+
+
+def summarize(profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+    """
+    Returns the pstats report of the `limit` costliest functions.
+    """
+    path = get_path(profile_id, "prof")
+    if path is None:
+        return None
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+from django.contrib.auth.models import User
+from django.test import override_settings
+from app.testing import TestCase
+from rest_framework.test import APIClient
+from auth.serializers import MyTokenObtainPairSerializer
+from . import store
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(
+            PROFILING_ENABLED=True,
+            PROFILING_DIRECTORY=self.directory,
+            PROFILING_SAMPLE_RATE=0.0,
+            PROFILING_MAX_FILES=2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='rootroot', is_staff=True)
+        self.user = User.objects.create_user(username='alice', password='rootroot')
+
+    def headers(self, user, **extra):
+        access = MyTokenObtainPairSerializer.get_token(user).access_token
+        return {'Authorization': f'Bearer {access}', **extra}
+
+    def test_staff_header_profiles_request(self):
+        response = self.client.get('/api/profiles/alice/', headers=self.headers(self.admin, **{'X-Profile': '1'}))
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        profile = store.load_profile(profile_id)
+        self.assertEqual(profile['path'], '/api/profiles/alice/')
+        self.assertEqual(profile['status'], 200)
+        self.assertGreater(profile['queries'], 0)
+        self.assertTrue(profile['slowest_queries'])
+
+        detail = self.client.get(f'/api/profiling/{profile_id}/', headers=self.headers(self.admin))
+        self.assertIn('cumulative', detail.data['stats'])
+        download = self.client.get(f'/api/profiling/{profile_id}/download/', headers=self.headers(self.admin))
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+
+    def test_header_ignored_for_other_users(self):
+        response = self.client.get('/api/profiles/alice/', headers=self.headers(self.user, **{'X-Profile': '1'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sampling_and_pruning(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0):
+            for _ in range(3):
+                self.client.get('/api/profiles/alice/', headers=self.headers(self.user))
+        profiles = self.client.get('/api/profiling/', headers=self.headers(self.admin)).data
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_endpoints_are_admin_only(self):
+        response = self.client.get('/api/profiling/', headers=self.headers(self.user))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/api/profiling/secret/download/', headers=self.headers(self.admin))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import RequestProfileDetailView, RequestProfileDownloadView, RequestProfileListView
+
+urlpatterns = [
+    path('', RequestProfileListView.as_view()),
+    path('<str:profile_id>/', RequestProfileDetailView.as_view()),
+    path('<str:profile_id>/download/', RequestProfileDownloadView.as_view()),
+]
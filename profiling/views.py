@@ -0,0 +1,72 @@
+from django.http import FileResponse, Http404
+from rest_framework import generics
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from . import store
+from .serializers import RequestProfileDetailSerializer, RequestProfileSerializer
+
+SORT_KEYS = {"cumulative", "tottime", "calls"}
+
+
+@extend_schema(
+    summary="List request profiles",
+    description="List the stored request profiles, most recent first.",
+    responses=RequestProfileSerializer(many=True),
+    tags=["Profiling"],
+)
+class RequestProfileListView(generics.GenericAPIView):
+    pagination_class = None
+    permission_classes = [IsAdminUser]
+    serializer_class = RequestProfileSerializer
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(store.list_profiles(), many=True)
+        return Response(serializer.data)
+
+
+@extend_schema(
+    summary="Retrieve a request profile",
+    description="Retrieve a request profile with its slowest queries and the pstats report of its costliest functions.",
+    parameters=[
+        OpenApiParameter(name="sort", type=OpenApiTypes.STR, enum=sorted(SORT_KEYS)),
+    ],
+    responses=RequestProfileDetailSerializer,
+    tags=["Profiling"],
+)
+class RequestProfileDetailView(generics.GenericAPIView):
+    pagination_class = None
+    permission_classes = [IsAdminUser]
+    serializer_class = RequestProfileDetailSerializer
+
+    def get(self, request, profile_id: str, *args, **kwargs):
+        profile = store.load_profile(profile_id)
+        if profile is None:
+            raise Http404
+        sort = request.query_params.get("sort", "cumulative")
+        if sort not in SORT_KEYS:
+            sort = "cumulative"
+        serializer = self.get_serializer(
+            {**profile, "stats": store.summarize(profile_id, sort) or ""}
+        )
+        return Response(serializer.data)
+
+
+@extend_schema(
+    summary="Download a request profile",
+    description="Download the cProfile dump of a request, readable with pstats or snakeviz.",
+    responses={(200, "application/octet-stream"): OpenApiTypes.BINARY},
+    tags=["Profiling"],
+)
+class RequestProfileDownloadView(generics.GenericAPIView):
+    pagination_class = None
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id: str, *args, **kwargs):
+        path = store.get_path(profile_id, "prof")
+        if path is None:
+            raise Http404
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, filename=f"{profile_id}.prof"
+        )
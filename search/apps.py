@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class SearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'search'
+
+    def ready(self):
+        from . import autocomplete
+
+        # Load the typeahead snapshot at worker start rather than on first request
+        if autocomplete.is_enabled():
+            autocomplete.preload_index()
@@ -0,0 +1,383 @@
+"""
+In-process typeahead over profile usernames and full names, and tag names.
+
+Each section is a sorted array of lowercased keys searched with `bisect`, so a
+prefix lookup is two binary searches plus a scan of the matching slice. Wide
+slices (short prefixes) are answered from a per-prefix cache of the best
+entries, which is dropped for every prefix of a key when that key changes.
+
+The index is loaded at worker start from a JSON snapshot written by the
+`rebuild_autocomplete` management command, which entrypoint.sh runs before the
+server starts. Without a snapshot it is built from the database on a thread,
+and the autocomplete endpoint answers from the database until it is ready. It
+is kept current through model signals. Those updates only
+reach the index of the process handling the write: other workers see them once
+the snapshot is rebuilt and they reload it, every
+`AUTOCOMPLETE_RELOAD_INTERVAL` seconds. Run `rebuild_autocomplete`
+periodically to bound that staleness.
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Slices longer than this are served from the top entries cache
+SCAN_LIMIT = 512
+
+# (id, label, extra, weight): extra is the full name for profiles, the slug for tags
+Entry = Tuple[int, str, str, int]
+
+
+def _sort_key(text: str, entry_id: int, field: int = 0) -> str:
+    # The id and field suffix keep keys unique when texts only differ by
+    # case, or a full name equals the username
+    return f"{text.lower()}\x00{entry_id}\x00{field}"
+
+
+class PrefixIndex:
+    """
+    Entries matched by the prefix of their label, and of their extra text too
+    with `match_extra`, e.g. the full name of profiles.
+    """
+
+    def __init__(
+        self, entries: Iterable[Entry] = (), max_limit: int = 25, match_extra: bool = False
+    ):
+        self.max_limit = max_limit
+        self.match_extra = match_extra
+        keyed = sorted(
+            ((key, entry) for entry in entries for key in self._entry_keys(entry)),
+            key=lambda pair: pair[0],
+        )
+        self._keys: List[str] = [key for key, _ in keyed]
+        self._entries: List[Entry] = [entry for _, entry in keyed]
+        self._keys_by_id: Dict[int, List[str]] = {}
+        for key, entry in keyed:
+            self._keys_by_id.setdefault(entry[0], []).append(key)
+        self._top: Dict[str, List[Entry]] = {}
+
+    def _entry_keys(self, entry: Entry) -> List[str]:
+        keys = [_sort_key(entry[1], entry[0])]
+        if self.match_extra and entry[2]:
+            keys.append(_sort_key(entry[2], entry[0], 1))
+        return keys
+
+    def __len__(self) -> int:
+        return len(self._keys_by_id)
+
+    def entries(self) -> List[Entry]:
+        return list({entry[0]: entry for entry in self._entries}.values())
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff", lo)
+        return lo, hi
+
+    def _best(self, lo: int, hi: int, limit: int) -> List[Entry]:
+        candidates = self._entries[lo:hi]
+        if self.match_extra:
+            # An entry may match by both its label and its extra text
+            candidates = {entry[0]: entry for entry in candidates}.values()
+        return heapq.nlargest(
+            limit, candidates, key=lambda entry: (entry[3], -len(entry[1]))
+        )
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Entry]:
+        prefix = prefix.lower()
+        limit = min(limit, self.max_limit)
+        lo, hi = self._range(prefix)
+        if hi - lo <= SCAN_LIMIT:
+            return self._best(lo, hi, limit)
+
+        top = self._top.get(prefix)
+        if top is None:
+            top = self._top[prefix] = self._best(lo, hi, self.max_limit)
+        return top[:limit]
+
+    def _invalidate(self, key: str) -> None:
+        text = key.split("\x00", 1)[0]
+        for end in range(len(text) + 1):
+            self._top.pop(text[:end], None)
+
+    def upsert(self, entry: Entry) -> None:
+        self.remove(entry[0])
+        keys = self._keys_by_id[entry[0]] = self._entry_keys(entry)
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._entries.insert(position, entry)
+            self._invalidate(key)
+
+    def remove(self, entry_id: int) -> None:
+        for key in self._keys_by_id.pop(entry_id, []):
+            position = bisect_left(self._keys, key)
+            del self._keys[position]
+            del self._entries[position]
+            self._invalidate(key)
+
+
+class AutocompleteIndex:
+    def __init__(
+        self,
+        profiles: Iterable[Entry] = (),
+        tags: Iterable[Entry] = (),
+        max_limit: int = 25,
+    ):
+        self.profiles = PrefixIndex(profiles, max_limit, match_extra=True)
+        self.tags = PrefixIndex(tags, max_limit)
+        self.lock = threading.Lock()
+        self.snapshot_mtime: Optional[float] = None
+        self.checked_at = time.monotonic()
+
+    def lookup(self, prefix: str, limit: int = 10) -> Dict[str, List[Entry]]:
+        with self.lock:
+            return {
+                "profiles": self.profiles.lookup(prefix, limit),
+                "tags": self.tags.lookup(prefix, limit),
+            }
+
+    def upsert_profile(self, entry: Entry) -> None:
+        with self.lock:
+            self.profiles.upsert(entry)
+
+    def remove_profile(self, profile_id: int) -> None:
+        with self.lock:
+            self.profiles.remove(profile_id)
+
+    def upsert_tag(self, entry: Entry) -> None:
+        with self.lock:
+            self.tags.upsert(entry)
+
+    def remove_tag(self, tag_id: int) -> None:
+        with self.lock:
+            self.tags.remove(tag_id)
+
+    def to_snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "version": SNAPSHOT_VERSION,
+                "profiles": self.profiles.entries(),
+                "tags": self.tags.entries(),
+            }
+
+
+def get_snapshot_path() -> str:
+    return str(
+        getattr(
+            settings,
+            "AUTOCOMPLETE_SNAPSHOT_PATH",
+            os.path.join(settings.BASE_DIR, "search_autocomplete.json"),
+        )
+    )
+
+
+def profile_entry(profile, followers_count: int) -> Entry:
+    return (profile.id, profile.username, profile.full_name, followers_count)
+
+
+def tag_entry(tag) -> Entry:
+    return (tag.id, tag.name, tag.slug, tag.post_count)
+
+
+def build_index_from_database(chunk_size: int = 2000) -> AutocompleteIndex:
+    from profiles.models import Profile
+    from tags.models import Tag
+
+    profiles = (
+        Profile.objects.values_list("id", "username", "full_name", "followers_count")
+        .order_by("id")
+        .iterator(chunk_size=chunk_size)
+    )
+    tags = (
+        Tag.objects.values_list("id", "name", "slug", "post_count")
+        .order_by("id")
+        .iterator(chunk_size=chunk_size)
+    )
+    return AutocompleteIndex(
+        profiles=[tuple(row) for row in profiles],
+        tags=[tuple(row) for row in tags],
+        max_limit=getattr(settings, "AUTOCOMPLETE_MAX_LIMIT", 25),
+    )
+
+
+def refresh_profiles(profile_ids: Iterable[int]) -> None:
+    """
+    Reloads the entries of profiles whose weight changed through queryset
+    updates, e.g. follower counts.
+    """
+    from profiles.models import Profile
+
+    index = get_loaded_index()
+    if index is None:
+        return
+    for row in Profile.objects.filter(pk__in=list(profile_ids)).values_list(
+        "id", "username", "full_name", "followers_count"
+    ):
+        index.upsert_profile(tuple(row))
+
+
+def refresh_tags(tag_ids: Iterable[int]) -> None:
+    """
+    Reloads the entries of tags whose post count changed through queryset
+    updates. Deleted tags are removed by their own signal.
+    """
+    from tags.models import Tag
+
+    index = get_loaded_index()
+    if index is None:
+        return
+    for row in Tag.objects.filter(pk__in=list(tag_ids)).values_list(
+        "id", "name", "slug", "post_count"
+    ):
+        index.upsert_tag(tuple(row))
+
+
+def write_snapshot(index: AutocompleteIndex, path: Optional[str] = None) -> str:
+    path = path or get_snapshot_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as snapshot:
+        json.dump(index.to_snapshot(), snapshot, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_snapshot(path: Optional[str] = None) -> Optional[AutocompleteIndex]:
+    path = path or get_snapshot_path()
+    try:
+        with open(path) as snapshot:
+            data = json.load(snapshot)
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+    if data.get("version") != SNAPSHOT_VERSION:
+        logger.warning("Ignoring autocomplete snapshot %s with unknown version", path)
+        return None
+
+    index = AutocompleteIndex(
+        profiles=[tuple(entry) for entry in data["profiles"]],
+        tags=[tuple(entry) for entry in data["tags"]],
+        max_limit=getattr(settings, "AUTOCOMPLETE_MAX_LIMIT", 25),
+    )
+    index.snapshot_mtime = mtime
+    return index
+
+
+_index: Optional[AutocompleteIndex] = None
+_index_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "AUTOCOMPLETE_ENGINE", "database") == "memory"
+
+
+def load_index() -> AutocompleteIndex:
+    """
+    Loads the index from the snapshot file, or from the database when there is
+    no snapshot yet.
+    """
+    global _index
+    with _index_lock:
+        index = read_snapshot()
+        if index is None:
+            logger.info("No autocomplete snapshot found, building from the database")
+            index = build_index_from_database()
+        _index = index
+        return index
+
+
+def preload_index() -> None:
+    """
+    Loads the snapshot at worker start, if there is one.
+    """
+    global _index
+    index = read_snapshot()
+    if index is not None:
+        with _index_lock:
+            _index = index
+
+
+_building = False
+
+
+def _build() -> None:
+    global _index, _building
+    try:
+        index = build_index_from_database()
+        with _index_lock:
+            # A snapshot loaded meanwhile is as recent
+            if _index is None:
+                _index = index
+    except Exception:
+        logger.exception("Building the autocomplete index failed")
+    finally:
+        _building = False
+        connections.close_all()
+
+
+def build_in_background() -> None:
+    """
+    Builds the index from the database on a thread, once per process.
+    """
+    global _building
+    with _index_lock:
+        if _building or _index is not None:
+            return
+        _building = True
+    logger.info("No autocomplete snapshot found, building from the database")
+    threading.Thread(target=_build, name="autocomplete-build", daemon=True).start()
+
+
+def _snapshot_changed(index: AutocompleteIndex) -> bool:
+    interval = getattr(settings, "AUTOCOMPLETE_RELOAD_INTERVAL", 60)
+    now = time.monotonic()
+    if now - index.checked_at < interval:
+        return False
+    index.checked_at = now
+    try:
+        mtime = os.path.getmtime(get_snapshot_path())
+    except OSError:
+        return False
+    return mtime != index.snapshot_mtime
+
+
+def get_index() -> Optional[AutocompleteIndex]:
+    """
+    Returns the process wide index, picking up snapshots rebuilt by other
+    processes every `AUTOCOMPLETE_RELOAD_INTERVAL` seconds. Without a snapshot
+    the index is built in the background and None is returned until it is
+    ready, so no request waits for it.
+    """
+    global _index
+    index = _index
+    if index is None:
+        preload_index()
+        index = _index
+        if index is None:
+            build_in_background()
+    elif _snapshot_changed(index):
+        reloaded = read_snapshot()
+        if reloaded is not None:
+            with _index_lock:
+                _index = index = reloaded
+    return index
+
+
+def get_loaded_index() -> Optional[AutocompleteIndex]:
+    """
+    Returns the index only if this process already loaded it, signals use it
+    to avoid loading the index just to apply an update.
+    """
+    return _index
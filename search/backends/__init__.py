@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .base import BaseSearchBackend
+
+DEFAULT_SEARCH_BACKEND = "search.backends.database.DatabaseSearchBackend"
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path: str) -> BaseSearchBackend:
+    return import_string(path)()
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Returns the process wide instance of the backend named by `SEARCH_BACKEND`.
+    """
+    return _load_backend(getattr(settings, "SEARCH_BACKEND", DEFAULT_SEARCH_BACKEND))
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    if setting.startswith("SEARCH_"):
+        _load_backend.cache_clear()
@@ -0,0 +1,57 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, List
+
+from django.conf import settings
+
+
+class BaseSearchBackend(ABC):
+    """
+    A post search backend returns ranked post ids, `SearchView` then hydrates
+    the requested page from the database.
+    """
+
+    def get_max_results(self) -> int:
+        # Searches stop there, responses then report `truncated`
+        return getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+
+    def normalize_query(self, query: str) -> str:
+        """
+        Returns the cache key of `query`: queries with the same key must have
+        the same results.
+        """
+        return query.strip()
+
+    def search_post_ids(self, query: str, limit: int = None) -> List[int]:
+        """
+        Returns the ids of the public posts matching `query`, best match first.
+        An empty query returns the most recent public posts.
+        """
+        from posts.models import Post
+
+        limit = limit or self.get_max_results()
+        query = query.strip()
+        if not query:
+            return list(
+                Post.objects.filter(is_private=False)
+                .order_by("-created", "-id")
+                .values_list("id", flat=True)[:limit]
+            )
+        return self.search(query, limit)
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> List[int]:
+        ...
+
+    @abstractmethod
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        ...
+
+    @abstractmethod
+    def remove_posts(self, post_ids: Iterable[int]) -> None:
+        ...
+
+    @abstractmethod
+    def rebuild(self, chunk_size: int = 2000) -> int:
+        """
+        Rebuilds the whole index and returns the number of indexed posts.
+        """
@@ -0,0 +1,39 @@
+from typing import Iterable, List
+
+from django.db import connection
+
+from search import fulltext
+from .base import BaseSearchBackend
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Searches the database full-text index, see `search.fulltext`.
+    """
+
+    def search(self, query: str, limit: int) -> List[int]:
+        return list(fulltext.search_posts(query).values_list("id", flat=True)[:limit])
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        fulltext.index_posts(post_ids)
+
+    def remove_posts(self, post_ids: Iterable[int]) -> None:
+        fulltext.remove_posts(post_ids)
+
+    def rebuild(self, chunk_size: int = 2000) -> int:
+        from posts.models import Post
+
+        if not fulltext.supports_fulltext():
+            return 0
+
+        count = 0
+        batch = []
+        posts = Post.objects.prefetch_related("tags").order_by("id")
+        for post in posts.iterator(chunk_size=chunk_size):
+            batch.append(post)
+            if len(batch) == chunk_size:
+                fulltext.write_documents(connection, fulltext.build_documents(batch))
+                count += len(batch)
+                batch = []
+        fulltext.write_documents(connection, fulltext.build_documents(batch))
+        return count + len(batch)
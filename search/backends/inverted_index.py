@@ -0,0 +1,498 @@
+"""
+Pure-Python inverted index with BM25 ranking, for deployments whose database
+has no full-text search (SQLite builds without FTS5, MySQL).
+
+The index is an immutable segment file, memory-mapped for reading, plus an
+append-only journal of JSON lines holding the changes made since the segment
+was built. Every process replays the journal tail before searching, so updates
+made by one worker are visible to the others. Appends hold a shared `flock` on
+a lock file next to the journal and compaction an exclusive one, so no append
+is lost while the journal is rewritten.
+
+Segment layout (little endian):
+
+    header    magic, version, doc count, term count, total length, section offsets
+    documents (post id, length) per document, sorted by post id
+    terms     (string offset, string length, df, postings offset, postings length)
+              per term, sorted by the UTF-8 bytes of the term
+    strings   UTF-8 bytes of every term
+    postings  per term, varint (document number delta, term frequency) pairs
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, where only a single process may write the index
+    fcntl = None
+
+from .base import BaseSearchBackend
+
+MAGIC = b"IGSX"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQQQQ")
+DOCUMENT = struct.Struct("<qI")
+TERM = struct.Struct("<QHIQI")
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_TERM_LENGTH = 64
+
+# Title and tag terms count as much as this many body terms
+FIELD_WEIGHTS = {"title": 2, "body": 1, "tags": 2}
+
+K1 = 1.2
+B = 0.75
+
+# (post id, term frequencies, document length)
+IndexDocument = Tuple[int, Dict[str, int], int]
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def analyze(post_id: int, title: str, body: str, tags: Iterable[str]) -> IndexDocument:
+    frequencies = Counter()
+    for field, text in (("title", title), ("body", body), ("tags", " ".join(tags))):
+        weight = FIELD_WEIGHTS[field]
+        for token in tokenize(text):
+            frequencies[token] += weight
+    return post_id, dict(frequencies), sum(frequencies.values())
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(data: bytes) -> Iterator[int]:
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = 0
+            shift = 0
+
+
+def write_segment(path: str, documents: Iterable[IndexDocument]) -> int:
+    """
+    Writes a segment from documents sorted by post id and returns the number of
+    documents written. The file is replaced atomically.
+    """
+    document_table = bytearray()
+    postings: Dict[str, bytearray] = defaultdict(bytearray)
+    last_docno: Dict[str, int] = {}
+    document_frequencies: Counter = Counter()
+    total_length = 0
+    doc_count = 0
+
+    for docno, (post_id, frequencies, length) in enumerate(documents):
+        document_table += DOCUMENT.pack(post_id, length)
+        total_length += length
+        doc_count += 1
+        for term, frequency in frequencies.items():
+            encode_varint(docno - last_docno.get(term, 0), postings[term])
+            encode_varint(frequency, postings[term])
+            last_docno[term] = docno
+            document_frequencies[term] += 1
+
+    terms = sorted(postings, key=lambda term: term.encode())
+    term_table = bytearray()
+    strings = bytearray()
+    postings_blob = bytearray()
+    for term in terms:
+        encoded = term.encode()
+        term_table += TERM.pack(
+            len(strings),
+            len(encoded),
+            document_frequencies[term],
+            len(postings_blob),
+            len(postings[term]),
+        )
+        strings += encoded
+        postings_blob += postings[term]
+
+    docs_offset = HEADER.size
+    terms_offset = docs_offset + len(document_table)
+    strings_offset = terms_offset + len(term_table)
+    postings_offset = strings_offset + len(strings)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        doc_count,
+        len(terms),
+        total_length,
+        docs_offset,
+        terms_offset,
+        strings_offset,
+        postings_offset,
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as segment:
+        for section in (header, document_table, term_table, strings, postings_blob):
+            segment.write(section)
+    os.replace(tmp_path, path)
+    return doc_count
+
+
+class Segment:
+    """
+    Read-only view of a segment file.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.doc_count = 0
+        self.term_count = 0
+        self.total_length = 0
+        self._file = None
+        self._map = None
+        if path is None:
+            return
+
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            self.doc_count,
+            self.term_count,
+            self.total_length,
+            self._docs_offset,
+            self._terms_offset,
+            self._strings_offset,
+            self._postings_offset,
+        ) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} search segment")
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def document(self, docno: int) -> Tuple[int, int]:
+        return DOCUMENT.unpack_from(self._map, self._docs_offset + docno * DOCUMENT.size)
+
+    def find_document(self, post_id: int) -> Optional[int]:
+        """
+        Returns the length of the document of `post_id`, if it is in the segment.
+        """
+        lo, hi = 0, self.doc_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_post_id, length = self.document(mid)
+            if mid_post_id == post_id:
+                return length
+            if mid_post_id < post_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _find_term(self, term: str) -> Optional[Tuple[int, int]]:
+        encoded = term.encode()
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            string_offset, string_length, _, postings_offset, postings_length = (
+                TERM.unpack_from(self._map, self._terms_offset + mid * TERM.size)
+            )
+            start = self._strings_offset + string_offset
+            candidate = self._map[start : start + string_length]
+            if candidate == encoded:
+                return postings_offset, postings_length
+            if candidate < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def postings(self, term: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields (post id, term frequency, document length) for every document
+        containing `term`.
+        """
+        if self._map is None:
+            return
+        found = self._find_term(term)
+        if found is None:
+            return
+        postings_offset, postings_length = found
+        start = self._postings_offset + postings_offset
+        values = decode_varints(self._map[start : start + postings_length])
+        docno = 0
+        for delta, frequency in zip(values, values):
+            docno += delta
+            post_id, length = self.document(docno)
+            yield post_id, frequency, length
+
+
+class InvertedIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self.journal_path = f"{path}.log"
+        self.lock_path = f"{path}.lock"
+        self.lock = threading.RLock()
+        self._segment = Segment()
+        self._segment_stat = None
+        self._journal_stat = None
+        self._reset_overlay()
+
+    def _reset_overlay(self) -> None:
+        self._journal_offset = 0
+        # Post ids whose segment document is deleted or superseded
+        self._removed: Set[int] = set()
+        self._removed_length = 0
+        self._documents: Dict[int, Tuple[Dict[str, int], int]] = {}
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> None:
+        """
+        Reopens the segment if it was rebuilt and applies new journal entries.
+        """
+        with self.lock:
+            segment_stat = self._stat(self.path)
+            journal_stat = self._stat(self.journal_path)
+            journal_replaced = (
+                self._journal_stat is not None
+                and journal_stat is not None
+                and journal_stat[0] != self._journal_stat[0]
+            )
+            if segment_stat != self._segment_stat or journal_replaced:
+                self._segment.close()
+                self._segment = Segment(self.path if segment_stat else None)
+                self._segment_stat = segment_stat
+                self._reset_overlay()
+            self._journal_stat = journal_stat
+
+            if journal_stat is None or journal_stat[2] <= self._journal_offset:
+                return
+            with open(self.journal_path, "rb") as journal:
+                journal.seek(self._journal_offset)
+                for line in journal:
+                    if not line.endswith(b"\n"):
+                        # A concurrent append in progress, pick it up next time
+                        break
+                    self._apply(json.loads(line))
+                    self._journal_offset += len(line)
+
+    def _discard(self, post_id: int) -> None:
+        previous = self._documents.pop(post_id, None)
+        if previous is not None:
+            for term in previous[0]:
+                self._postings[term].pop(post_id, None)
+        if post_id not in self._removed:
+            length = self._segment.find_document(post_id)
+            if length is not None:
+                self._removed.add(post_id)
+                self._removed_length += length
+
+    def _apply(self, entry: dict) -> None:
+        post_id = entry["id"]
+        self._discard(post_id)
+        if entry["op"] == "upsert":
+            frequencies = entry["terms"]
+            self._documents[post_id] = (frequencies, entry["length"])
+            for term, frequency in frequencies.items():
+                self._postings[term][post_id] = frequency
+
+    @contextmanager
+    def journal_lock(self, exclusive: bool):
+        """
+        Cross-process lock on the journal: shared for appends, exclusive for
+        replacing it.
+        """
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # Closing releases the lock
+            os.close(fd)
+
+    def append(self, entries: List[dict]) -> None:
+        if not entries:
+            return
+        lines = b"".join(
+            json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+            for entry in entries
+        )
+        # O_APPEND keeps concurrent single writes from different processes whole
+        with self.journal_lock(exclusive=False):
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, lines)
+            finally:
+                os.close(fd)
+
+    def journal_size(self) -> int:
+        stat = self._stat(self.journal_path)
+        return stat[2] if stat else 0
+
+    def compact_journal(self, offset: int) -> None:
+        """
+        Drops the journal entries before `offset`, which a rebuild folded into
+        the new segment.
+        """
+        # Appends wait until the tail is copied and the journal replaced
+        with self.journal_lock(exclusive=True):
+            try:
+                with open(self.journal_path, "rb") as journal:
+                    journal.seek(offset)
+                    tail = journal.read()
+            except FileNotFoundError:
+                return
+            tmp_path = f"{self.journal_path}.tmp"
+            with open(tmp_path, "wb") as journal:
+                journal.write(tail)
+            os.replace(tmp_path, self.journal_path)
+
+    def search(self, query: str, limit: int) -> List[int]:
+        self.refresh()
+        with self.lock:
+            doc_count = (
+                self._segment.doc_count - len(self._removed) + len(self._documents)
+            )
+            if doc_count <= 0:
+                return []
+            total_length = (
+                self._segment.total_length
+                - self._removed_length
+                + sum(length for _, length in self._documents.values())
+            )
+            average_length = max(total_length / doc_count, 1)
+
+            scores: Dict[int, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                matches = [
+                    match
+                    for match in self._segment.postings(term)
+                    if match[0] not in self._removed
+                ]
+                matches.extend(
+                    (post_id, frequency, self._documents[post_id][1])
+                    for post_id, frequency in self._postings.get(term, {}).items()
+                )
+                if not matches:
+                    continue
+                idf = math.log(
+                    1 + (doc_count - len(matches) + 0.5) / (len(matches) + 0.5)
+                )
+                for post_id, frequency, length in matches:
+                    scores[post_id] += idf * (
+                        frequency
+                        * (K1 + 1)
+                        / (frequency + K1 * (1 - B + B * length / average_length))
+                    )
+
+        # Newer posts have higher ids, so ties go to the most recent one
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [post_id for post_id, _ in best]
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Searches the on-disk index at `SEARCH_INDEX_PATH`. Build it with
+    `manage.py rebuild_search_index`, post changes are then journaled by the
+    search signals.
+    """
+
+    def __init__(self):
+        self.index = InvertedIndex(
+            str(
+                getattr(
+                    settings,
+                    "SEARCH_INDEX_PATH",
+                    os.path.join(settings.BASE_DIR, "search_index.bin"),
+                )
+            )
+        )
+
+    @staticmethod
+    def analyze_post(post) -> IndexDocument:
+        return analyze(post.id, post.title, post.body, (tag.name for tag in post.tags.all()))
+
+    def normalize_query(self, query: str) -> str:
+        # The index only sees the terms, but an empty query lists recent posts
+        query = query.strip()
+        return f"terms:{' '.join(tokenize(query))}" if query else ""
+
+    def search(self, query: str, limit: int) -> List[int]:
+        return self.index.search(query, limit)
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        from posts.models import Post
+
+        post_ids = set(post_ids)
+        if not post_ids:
+            return
+
+        posts = {
+            post.id: post
+            for post in Post.objects.filter(id__in=post_ids).prefetch_related("tags")
+        }
+        entries = []
+        for post_id in sorted(post_ids):
+            post = posts.get(post_id)
+            if post is None or post.is_private:
+                entries.append({"op": "delete", "id": post_id})
+                continue
+            _, frequencies, length = self.analyze_post(post)
+            entries.append(
+                {"op": "upsert", "id": post_id, "terms": frequencies, "length": length}
+            )
+        self.index.append(entries)
+
+    def remove_posts(self, post_ids: Iterable[int]) -> None:
+        self.index.append([{"op": "delete", "id": post_id} for post_id in post_ids])
+
+    def rebuild(self, chunk_size: int = 2000) -> int:
+        from posts.models import Post
+
+        journal_offset = self.index.journal_size()
+        posts = (
+            Post.objects.filter(is_private=False)
+            .prefetch_related("tags")
+            .order_by("id")
+            .iterator(chunk_size=chunk_size)
+        )
+        count = write_segment(self.index.path, (self.analyze_post(post) for post in posts))
+        self.index.compact_journal(journal_offset)
+        return count
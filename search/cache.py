@@ -0,0 +1,124 @@
+"""
+Cache of search results as ordered id lists.
+
+Results are stored in page sized chunks under keys built from the search scope,
+the query key, the chunk (page) number and the generation of the scope. The
+query key is exactly the string the scope's search uses, e.g. the backend's
+`normalize_query` for posts, so two queries only share results when they
+search the same thing.
+
+Invalidation is global per scope: any write that may change a result, e.g. a
+post save or a tag change (see `search.models`), bumps the generation of the
+whole scope and moves every query to new keys, stale entries simply expire.
+On a write heavy site the cache therefore mostly serves bursts of repeated
+queries between writes.
+"""
+
+import hashlib
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+
+from metrics.instruments import CACHE_REQUESTS
+
+
+def get_cache():
+    return caches[getattr(settings, "SEARCH_CACHE_ALIAS", "default")]
+
+
+def get_timeout() -> int:
+    return getattr(settings, "SEARCH_CACHE_TIMEOUT", 300)
+
+
+def _generation_key(scope: str) -> str:
+    return f"search:generation:{scope}"
+
+
+def bump_generation(*scopes: str) -> None:
+    """
+    Invalidates the cached results of every query of `scopes`.
+    """
+    stamp = time.time_ns()
+    get_cache().set_many({_generation_key(scope): stamp for scope in scopes}, timeout=None)
+
+
+def _namespace(scope: str, query_key: str) -> str:
+    generation = get_cache().get(_generation_key(scope), 0)
+    fingerprint = f"{query_key}|{generation}"
+    return f"search:results:{scope}:{hashlib.sha1(fingerprint.encode()).hexdigest()}"
+
+
+class CachedResults(Sequence):
+    """
+    Lazy, cached list of result ids which a Django paginator can slice. Only
+    the chunks covering the requested page are read from the cache, and the
+    search only runs when one of them is missing.
+    """
+
+    def __init__(self, namespace: str, compute: Callable[[], List[int]], chunk_size: int):
+        self.namespace = namespace
+        self.compute = compute
+        self.chunk_size = chunk_size
+        self.hit: Optional[bool] = None
+        self._count: Optional[int] = None
+        self._ids: Optional[List[int]] = None
+
+    def _chunk_key(self, chunk: int) -> str:
+        return f"{self.namespace}:{chunk}"
+
+    def _fill(self) -> List[int]:
+        self.hit = False
+        CACHE_REQUESTS.inc(cache="search", result="miss")
+        ids = self._ids = list(self.compute())
+        self._count = len(ids)
+        entries: Dict[str, object] = {f"{self.namespace}:count": len(ids)}
+        for chunk, start in enumerate(range(0, len(ids), self.chunk_size)):
+            entries[self._chunk_key(chunk)] = ids[start : start + self.chunk_size]
+        get_cache().set_many(entries, timeout=get_timeout())
+        return ids
+
+    def __len__(self) -> int:
+        if self._count is None:
+            self._count = get_cache().get(f"{self.namespace}:count")
+            if self._count is None:
+                self._fill()
+        return self._count
+
+    def __getitem__(self, index):
+        if self._ids is not None:
+            return self._ids[index]
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+
+        start, stop, step = index.indices(len(self))
+        if self._ids is not None:
+            return self._ids[index]
+        if start >= stop:
+            return []
+
+        first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+        keys = [self._chunk_key(chunk) for chunk in range(first, last + 1)]
+        chunks = get_cache().get_many(keys)
+        if len(chunks) < len(keys):
+            return self._fill()[index]
+
+        self.hit = True
+        CACHE_REQUESTS.inc(cache="search", result="hit")
+        ids = [post_id for key in keys for post_id in chunks[key]]
+        offset = first * self.chunk_size
+        return ids[start - offset : stop - offset : step]
+
+
+def cached_results(
+    scope: str, query_key: str, compute: Callable[[], List[int]], chunk_size: int
+) -> Sequence[int]:
+    """
+    Returns the ids of a `scope` search as a lazily cached sequence.
+    `query_key` must be the exact query string `compute` searches with.
+    """
+    if not getattr(settings, "SEARCH_CACHE_ENABLED", True):
+        return compute()
+
+    return CachedResults(_namespace(scope, query_key), compute, chunk_size)
@@ -0,0 +1,193 @@
+"""
+Full-text index over post titles, bodies and tag names.
+
+PostgreSQL keeps a weighted `tsvector` per post in `search_postdocument`, backed
+by a GIN index. SQLite keeps the same documents in an FTS5 virtual table whose
+rowid is the post id. Any other database falls back to `icontains` matching.
+"""
+
+import re
+from typing import Iterable, List, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+DOCUMENT_TABLE = "search_postdocument"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# (post_id, title, body, "tag names separated by spaces")
+Document = Tuple[int, str, str, str]
+
+
+def get_text_search_config() -> str:
+    return getattr(settings, "SEARCH_TEXT_CONFIG", "english")
+
+
+def supports_fulltext(conn=None) -> bool:
+    conn = conn or connection
+    return conn.vendor in ("postgresql", "sqlite")
+
+
+def write_documents(conn, documents: Sequence[Document]) -> None:
+    """
+    Inserts or replaces the index documents of the given posts.
+    """
+    if not documents or not supports_fulltext(conn):
+        return
+
+    with conn.cursor() as cursor:
+        if conn.vendor == "postgresql":
+            config = get_text_search_config()
+            cursor.executemany(
+                f"""
+                INSERT INTO {DOCUMENT_TABLE} (post_id, document)
+                VALUES (
+                    %s,
+                    setweight(to_tsvector(%s::regconfig, %s), 'A')
+                    || setweight(to_tsvector(%s::regconfig, %s), 'B')
+                    || setweight(to_tsvector(%s::regconfig, %s), 'A')
+                )
+                ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+                """,
+                [
+                    (post_id, config, title, config, body, config, tags)
+                    for post_id, title, body, tags in documents
+                ],
+            )
+        else:
+            cursor.executemany(
+                f"DELETE FROM {DOCUMENT_TABLE} WHERE rowid = %s",
+                [(document[0],) for document in documents],
+            )
+            cursor.executemany(
+                f"INSERT INTO {DOCUMENT_TABLE} (rowid, title, body, tags) VALUES (%s, %s, %s, %s)",
+                documents,
+            )
+
+
+def delete_documents(conn, post_ids: Iterable[int]) -> None:
+    post_ids = list(post_ids)
+    if not post_ids or not supports_fulltext(conn):
+        return
+
+    column = "post_id" if conn.vendor == "postgresql" else "rowid"
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {DOCUMENT_TABLE} WHERE {column} = %s",
+            [(post_id,) for post_id in post_ids],
+        )
+
+
+def build_documents(posts) -> List[Document]:
+    """
+    Builds index documents from posts that have their tags prefetched.
+    """
+    return [
+        (post.id, post.title, post.body, " ".join(tag.name for tag in post.tags.all()))
+        for post in posts
+    ]
+
+
+def index_posts(post_ids: Iterable[int]) -> None:
+    """
+    (Re)indexes the given posts. Private posts are indexed too and filtered out
+    at query time, so publishing a post does not require a reindex.
+    """
+    from posts.models import Post
+
+    post_ids = set(post_ids)
+    if not post_ids or not supports_fulltext():
+        return
+
+    posts = Post.objects.filter(id__in=post_ids).prefetch_related("tags")
+    write_documents(connection, build_documents(posts))
+
+
+def remove_posts(post_ids: Iterable[int]) -> None:
+    delete_documents(connection, post_ids)
+
+
+def to_fts5_query(query: str) -> str:
+    """
+    Turns free text into an FTS5 query that ANDs every term, the last one as a
+    prefix so partially typed words still match.
+    """
+    terms = TOKEN_RE.findall(query)
+    if not terms:
+        return ""
+    quoted = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_posts(query: str) -> QuerySet:
+    """
+    Returns the public posts matching `query`, ranked by relevance then recency.
+    """
+    from posts.models import Post
+
+    posts = Post.objects.filter(is_private=False)
+    query = query.strip()
+    if not query:
+        return posts.order_by("-created", "-id")
+
+    post_table = Post._meta.db_table
+
+    if connection.vendor == "postgresql":
+        config = get_text_search_config()
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        matches = RawSQL(
+            f"""
+            EXISTS (
+                SELECT 1 FROM {DOCUMENT_TABLE} d
+                WHERE d.post_id = {post_table}.id AND d.document @@ {tsquery}
+            )
+            """,
+            (config, query),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"""
+            SELECT ts_rank_cd(d.document, {tsquery}) FROM {DOCUMENT_TABLE} d
+            WHERE d.post_id = {post_table}.id
+            """,
+            (config, query),
+            output_field=FloatField(),
+        )
+        return posts.filter(matches).annotate(rank=rank).order_by("-rank", "-created", "-id")
+
+    if connection.vendor == "sqlite":
+        match = to_fts5_query(query)
+        if not match:
+            return posts.none()
+        matching_ids = RawSQL(
+            f"SELECT rowid FROM {DOCUMENT_TABLE} WHERE {DOCUMENT_TABLE} MATCH %s",
+            (match,),
+        )
+        # bm25() is lower for better matches, negate it so higher ranks first
+        rank = RawSQL(
+            f"""
+            SELECT -bm25({DOCUMENT_TABLE}, 2.0, 1.0, 2.0) FROM {DOCUMENT_TABLE}
+            WHERE {DOCUMENT_TABLE} MATCH %s AND rowid = {post_table}.id
+            """,
+            (match,),
+            output_field=FloatField(),
+        )
+        return (
+            posts.filter(id__in=matching_ids)
+            .annotate(rank=rank)
+            .order_by("-rank", "-created", "-id")
+        )
+
+    return (
+        posts.filter(
+            Q(title__icontains=query)
+            | Q(body__icontains=query)
+            | Q(tags__name__icontains=query)
+        )
+        .distinct()
+        .order_by("-created", "-id")
+    )
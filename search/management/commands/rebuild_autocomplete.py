@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from search.autocomplete import build_index_from_database, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the in-memory autocomplete snapshot from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Where to write the snapshot, defaults to AUTOCOMPLETE_SNAPSHOT_PATH.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        index = build_index_from_database(chunk_size=options["chunk_size"])
+        path = write_snapshot(index, options["path"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(index.profiles)} profiles and {len(index.tags)} tags to {path}"
+            )
+        )
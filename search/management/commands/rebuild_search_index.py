@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from search.backends import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the post search index of the configured SEARCH_BACKEND."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {count} posts with {type(backend).__name__}")
+        )
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from search.fulltext import DOCUMENT_TABLE, write_documents
+
+
+def create_document_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"""
+            CREATE TABLE {DOCUMENT_TABLE} (
+                post_id bigint PRIMARY KEY
+                    REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+                document tsvector NOT NULL
+            )
+            """
+        )
+        schema_editor.execute(
+            f"CREATE INDEX {DOCUMENT_TABLE}_document_gin ON {DOCUMENT_TABLE} USING gin (document)"
+        )
+    elif connection.vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {DOCUMENT_TABLE} USING fts5(title, body, tags, tokenize='porter unicode61')"
+        )
+    else:
+        return
+
+    Post = apps.get_model("posts", "Post")
+    posts = Post.objects.using(connection.alias).prefetch_related("tags").order_by("id")
+    batch = []
+    for post in posts.iterator(chunk_size=1000):
+        batch.append((post.id, post.title, post.body, " ".join(tag.name for tag in post.tags.all())))
+        if len(batch) == 1000:
+            write_documents(connection, batch)
+            batch = []
+    write_documents(connection, batch)
+
+
+def drop_document_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ("postgresql", "sqlite"):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {DOCUMENT_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_auto_20240429_0927'),
+        ('tags', '0005_tag_post_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_document_table, drop_document_table),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Expression indexes matching the `UPPER(col::text) LIKE UPPER(...)` SQL that
+# Django emits for `istartswith`/`icontains` lookups on PostgreSQL.
+TRIGRAM_INDEXES = [
+    ("profiles_profile_username_trgm", "profiles_profile", "username"),
+    ("profiles_profile_full_name_trgm", "profiles_profile", "full_name"),
+    ("tags_tag_name_trgm", "tags_tag", "name"),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('profiles', '0008_profile_username'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,3 +1,154 @@
-from django.db import models
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from posts.models import Post
+from profiles.models import Profile
+from tags.models import Tag
+from . import autocomplete
+from .backends import get_search_backend
+from .cache import bump_generation
 
-# Create your models here.
+INDEXED_FIELDS = {"title", "body"}
+# Fields changing whether a post is searched at all
+SEARCHED_FIELDS = INDEXED_FIELDS | {"is_private"}
+
+
+def invalidate_post_searches():
+    # Bump after commit so no request caches results without the change
+    # under the new version
+    transaction.on_commit(lambda: bump_generation("post", "tag"))
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, update_fields=None, **kwargs):
+    # Skip saves that cannot change the results, e.g. view count increments
+    if not created and update_fields and not SEARCHED_FIELDS & set(update_fields):
+        return
+    get_search_backend().index_posts([instance.pk])
+    invalidate_post_searches()
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    get_search_backend().remove_posts([instance.pk])
+    invalidate_post_searches()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # Remember which posts lose the tag, they are gone by post_clear
+        instance._search_cleared_post_ids = list(
+            instance.post_set.values_list("id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        post_ids = [instance.pk]
+    elif action == "post_clear":
+        post_ids = getattr(instance, "_search_cleared_post_ids", [])
+    else:
+        post_ids = pk_set or []
+    get_search_backend().index_posts(post_ids)
+    invalidate_post_searches()
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_posts(instance.post_set.values_list("id", flat=True))
+        invalidate_post_searches()
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_deleted_tag_posts(sender, instance, **kwargs):
+    instance._search_post_ids = list(instance.post_set.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def index_deleted_tag_posts(sender, instance, **kwargs):
+    get_search_backend().index_posts(getattr(instance, "_search_post_ids", []))
+    invalidate_post_searches()
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_search(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_generation("profile"))
+
+
+@receiver(post_save, sender=Profile)
+def autocomplete_saved_profile(sender, instance, **kwargs):
+    index = autocomplete.get_loaded_index()
+    if index is not None:
+        index.upsert_profile(
+            autocomplete.profile_entry(instance, instance.followers_count)
+        )
+
+
+@receiver(post_delete, sender=Profile)
+def autocomplete_deleted_profile(sender, instance, **kwargs):
+    index = autocomplete.get_loaded_index()
+    if index is not None:
+        index.remove_profile(instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def autocomplete_saved_tag(sender, instance, **kwargs):
+    index = autocomplete.get_loaded_index()
+    if index is not None:
+        index.upsert_tag(autocomplete.tag_entry(instance))
+
+
+@receiver(post_delete, sender=Tag)
+def autocomplete_deleted_tag(sender, instance, **kwargs):
+    index = autocomplete.get_loaded_index()
+    if index is not None:
+        index.remove_tag(instance.pk)
+
+
+@receiver(m2m_changed, sender=Profile.follows.through)
+def autocomplete_follows_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Follower counts are updated with queryset updates, see profiles.models
+    if autocomplete.get_loaded_index() is None:
+        return
+    if action == "pre_clear":
+        related = instance.followed_by if reverse else instance.follows
+        instance._autocomplete_cleared_ids = set(related.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_autocomplete_cleared_ids", set())
+    profile_ids = {instance.pk, *(pk_set or ())}
+    transaction.on_commit(lambda: autocomplete.refresh_profiles(profile_ids))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def autocomplete_post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Post counts are updated with queryset updates around the tag changes,
+    # read them once committed
+    if autocomplete.get_loaded_index() is None:
+        return
+    if action == "pre_clear" and not reverse:
+        instance._autocomplete_cleared_tag_ids = set(instance.tags.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        tag_ids = {instance.pk}
+    elif action == "post_clear":
+        tag_ids = getattr(instance, "_autocomplete_cleared_tag_ids", set())
+    else:
+        tag_ids = set(pk_set or ())
+    transaction.on_commit(lambda: autocomplete.refresh_tags(tag_ids))
+
+
+@receiver(pre_delete, sender=Post)
+def autocomplete_deleted_post(sender, instance, **kwargs):
+    # Deleting a post removes its tag links without m2m_changed
+    if autocomplete.get_loaded_index() is None:
+        return
+    tag_ids = list(instance.tags.values_list("id", flat=True))
+    transaction.on_commit(lambda: autocomplete.refresh_tags(tag_ids))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination
+
+
+class CappedPagination(PageNumberPagination):
+    """
+    Searches return at most `SEARCH_MAX_RESULTS` ids, so `count` stops there.
+    `truncated` tells clients when the cap was reached and more results may
+    exist than the pages list.
+    """
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["truncated"] = (
+            self.page.paginator.count >= getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+        )
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["truncated"] = {"type": "boolean", "example": False}
+        return schema
+
+
+class PostSearchPagination(CappedPagination):
+    page_query_param = "posts_page"
+
+
+class ProfileSearchPagination(CappedPagination):
+    page_query_param = "profiles_page"
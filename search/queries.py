@@ -0,0 +1,30 @@
+from typing import List, Optional
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from posts.models import Post
+from tags.models import Tag
+
+
+def tagged_post_ids(tag_slug: str, limit: Optional[int] = None) -> List[int]:
+    """
+    Returns the ids of the public posts tagged `tag_slug`, newest first.
+
+    The tag is resolved once through the unique index on `Tag.slug`, then posts
+    are selected with an `EXISTS` subquery on the tags through table instead of
+    a join plus `DISTINCT`, so the database can walk `post_public_created_idx`
+    in order and stop at `limit`, probing `posts_post_tags_tag_post_idx` on
+    (tag_id, post_id) for each post.
+    """
+    limit = limit or getattr(settings, "SEARCH_MAX_RESULTS", 1000)
+    tag_id = Tag.objects.filter(slug=tag_slug).values_list("id", flat=True).first()
+    if tag_id is None:
+        return []
+
+    tagged = Post.tags.through.objects.filter(tag_id=tag_id, post_id=OuterRef("pk"))
+    return list(
+        Post.objects.filter(Exists(tagged), is_private=False)
+        .order_by("-created", "-id")
+        .values_list("id", flat=True)[:limit]
+    )
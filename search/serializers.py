@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+
+class AutocompleteProfileSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    username = serializers.CharField()
+    full_name = serializers.CharField()
+    followers_count = serializers.IntegerField()
+
+
+class AutocompleteTagSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+    post_count = serializers.IntegerField()
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    profiles = AutocompleteProfileSerializer(many=True)
+    tags = AutocompleteTagSerializer(many=True)
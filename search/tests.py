@@ -1,3 +1,463 @@
-from django.test import TestCase
+from unittest import mock
+import os
+import tempfile
+import threading
+from django.db import connection
+from django.test import override_settings
+from app.testing import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+from posts.models import Post
+from tags.models import Tag
+from . import autocomplete
+from .backends import get_search_backend
+from .backends.inverted_index import decode_varints, encode_varint
+from .cache import cached_results
+from .queries import tagged_post_ids
+from .fulltext import search_posts
 
-# Create your tests here.
+
+class FullTextSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="Demo", password="rootroot")
+        self.profile = self.user.profile
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_post(self, title, body, **kwargs):
+        return Post.objects.create(profile=self.profile, title=title, body=body, **kwargs)
+
+    def test_ranks_title_matches_first(self):
+        body_match = self.create_post("Morning walk", "Saw a sunset on the way back")
+        title_match = self.create_post("Sunset", "Over the bay")
+        self.create_post("Lunch", "Pasta")
+
+        results = list(search_posts("sunset"))
+        self.assertEqual(results, [title_match, body_match])
+
+    def test_excludes_private_posts(self):
+        self.create_post("Sunset", "Over the bay", is_private=True)
+        self.assertFalse(search_posts("sunset").exists())
+
+    def test_tracks_title_and_tag_changes(self):
+        post = self.create_post("Holidays", "Beach day")
+        post.title = "Mountains"
+        post.save()
+        self.assertFalse(search_posts("holidays").exists())
+        self.assertTrue(search_posts("mountains").exists())
+
+        tag = Tag.objects.create(name="alps")
+        post.tags.add(tag)
+        self.assertEqual(list(search_posts("alps")), [post])
+
+        post.tags.remove(tag)
+        self.assertFalse(search_posts("alps").exists())
+
+    def test_deleted_post_is_unindexed(self):
+        post = self.create_post("Sunset", "Over the bay")
+        post.delete()
+        self.assertFalse(search_posts("sunset").exists())
+
+    def test_combined_search_paginates_sections_independently(self):
+        for i in range(10):
+            self.create_post(f"Demo post {i}", "Body")
+
+        response = self.client.get("/api/search/", {"query": "demo", "posts_page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["posts"]["count"], 10)
+        self.assertEqual(len(response.data["posts"]["results"]), 1)
+        self.assertNotIn("posts_page", response.data["posts"]["previous"])
+        self.assertEqual(response.data["profiles"]["count"], 1)
+        self.assertIsNone(response.data["profiles"]["next"])
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_capped_results_are_reported_as_truncated(self):
+        for i in range(3):
+            self.create_post(f"Demo post {i}", "Body")
+        response = self.client.get("/api/search/", {"type": "post", "query": "demo"})
+        self.assertEqual(response.data["count"], 2)
+        self.assertTrue(response.data["truncated"])
+
+        response = self.client.get("/api/search/", {"query": "demo"})
+        self.assertTrue(response.data["posts"]["truncated"])
+        self.assertFalse(response.data["profiles"]["truncated"])
+
+    def test_search_endpoint_returns_ranked_posts(self):
+        self.create_post("Sunset", "Over the bay")
+        response = self.client.get("/api/search/", {"type": "post", "query": "suns"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post["title"] for post in response.data["results"]["posts"]], ["Sunset"]
+        )
+
+    def test_combined_search_compact_format(self):
+        self.create_post("Demo post", "Body")
+        response = self.client.get("/api/search/", {"query": "demo", "format": "compact"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        posts = data["posts"]["results"]
+        post = dict(zip(posts["fields"], posts["rows"][0]))
+        self.assertEqual(post["title"], "Demo post")
+        self.assertEqual(data["lookups"]["profiles"][post["profile"]], "Demo")
+        profiles = data["profiles"]["results"]
+        self.assertEqual(dict(zip(profiles["fields"], profiles["rows"][0]))["username"], "Demo")
+
+
+class ConcurrentSearchTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="Demo", password="rootroot")
+        Post.objects.create(profile=self.user.profile, title="Demo post", body="Body")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=False)
+    def test_combined_search_queries_are_counted(self):
+        threads = []
+
+        def record(execute, sql, params, many, context):
+            threads.append(threading.current_thread().name)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get("/api/search/", {"query": "demo"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["posts"]["count"], 1)
+        self.assertEqual(response.data["profiles"]["count"], 1)
+
+        # Both sections ran on the pool, and the middleware counted them
+        self.assertGreaterEqual(sum(name.startswith("search") for name in threads), 2)
+        self.assertEqual(response.wsgi_request.query_stats.count, len(threads))
+
+
+class AutocompleteTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="viewer", password="rootroot")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_orders_profiles_by_followers_and_tags_by_post_count(self):
+        quiet = User.objects.create_user(username="sunny", password="rootroot").profile
+        popular = User.objects.create_user(username="sunday", password="rootroot").profile
+        self.user.profile.follows.add(popular)
+        Tag.objects.create(name="sunset", post_count=1)
+        Tag.objects.create(name="sunrise", post_count=5)
+
+        response = self.client.get("/api/search/autocomplete/", {"query": "SUN"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [profile["username"] for profile in response.data["profiles"]],
+            [popular.username, quiet.username],
+        )
+        self.assertEqual(
+            [tag["name"] for tag in response.data["tags"]], ["sunrise", "sunset"]
+        )
+
+    def test_caps_results(self):
+        for i in range(3):
+            User.objects.create_user(username=f"sam{i}", password="rootroot")
+        response = self.client.get("/api/search/autocomplete/", {"query": "sam", "limit": 2})
+        self.assertEqual(len(response.data["profiles"]), 2)
+
+
+class PrefixIndexTestCase(TestCase):
+    def test_lookup_orders_by_weight(self):
+        index = autocomplete.PrefixIndex(
+            [(1, "Sunny", "", 1), (2, "sunday", "", 9), (3, "moon", "", 50)]
+        )
+        self.assertEqual([entry[0] for entry in index.lookup("sun")], [2, 1])
+        self.assertEqual(index.lookup("x"), [])
+
+    def test_match_extra(self):
+        index = autocomplete.PrefixIndex(
+            [(1, "sunny", "Sunny Day", 1), (2, "moon", "Sunset Lover", 2)], match_extra=True
+        )
+        self.assertEqual([entry[0] for entry in index.lookup("sun")], [2, 1])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(len(index.entries()), 2)
+        index.upsert((2, "moon", "", 2))
+        self.assertEqual([entry[0] for entry in index.lookup("sun")], [1])
+
+    def test_updates_invalidate_cached_top_entries(self):
+        entries = [(i, f"a{i:04d}", "", i) for i in range(autocomplete.SCAN_LIMIT * 2)]
+        index = autocomplete.PrefixIndex(entries)
+        best = entries[-1]
+        self.assertEqual(index.lookup("a", 1), [best])
+
+        index.upsert((0, "a0000", "", 10**6))
+        self.assertEqual(index.lookup("a", 1)[0][0], 0)
+
+        index.remove(0)
+        self.assertEqual(index.lookup("a", 1), [best])
+        self.assertEqual(len(index), len(entries) - 1)
+
+
+class MemoryAutocompleteTestCase(TestCase):
+    def setUp(self):
+        self.snapshot_path = os.path.join(tempfile.mkdtemp(), "autocomplete.json")
+        settings_override = override_settings(
+            AUTOCOMPLETE_ENGINE="memory", AUTOCOMPLETE_SNAPSHOT_PATH=self.snapshot_path
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(setattr, autocomplete, "_index", None)
+
+        self.user = User.objects.create_user(username="viewer", password="rootroot")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_snapshot_round_trip_and_signal_updates(self):
+        User.objects.create_user(username="sunny", password="rootroot")
+        autocomplete.write_snapshot(autocomplete.build_index_from_database())
+        autocomplete.load_index()
+
+        with self.assertNumQueries(0):
+            matches = autocomplete.get_index().lookup("sun")
+        self.assertEqual([entry[1] for entry in matches["profiles"]], ["sunny"])
+
+        Tag.objects.create(name="sunset")
+        response = self.client.get("/api/search/autocomplete/", {"query": "sun"})
+        self.assertEqual([tag["name"] for tag in response.data["tags"]], ["sunset"])
+
+        User.objects.get(username="sunny").profile.delete()
+        response = self.client.get("/api/search/autocomplete/", {"query": "sun"})
+        self.assertEqual(response.data["profiles"], [])
+
+    def test_database_answers_until_the_index_is_built(self):
+        User.objects.create_user(username="sunny", password="rootroot")
+        with mock.patch.object(autocomplete, "build_in_background") as build:
+            response = self.client.get("/api/search/autocomplete/", {"query": "sun"})
+        build.assert_called_once_with()
+        self.assertEqual([profile["username"] for profile in response.data["profiles"]], ["sunny"])
+
+        # The background build then serves the lookups, here on this thread
+        with mock.patch.object(autocomplete.connections, "close_all"):
+            autocomplete._build()
+        with self.assertNumQueries(0):
+            matches = autocomplete.get_index().lookup("sun")
+        self.assertEqual([entry[1] for entry in matches["profiles"]], ["sunny"])
+
+    def test_full_names_and_weight_updates(self):
+        quiet = User.objects.create_user(username="quiet", password="rootroot").profile
+        quiet.full_name = "Sun Quiet"
+        quiet.save()
+        popular = User.objects.create_user(username="sunday", password="rootroot").profile
+        autocomplete.load_index()
+
+        def profiles():
+            response = self.client.get("/api/search/autocomplete/", {"query": "sun"})
+            return [profile["username"] for profile in response.data["profiles"]]
+
+        # Weights tie, the shorter label wins
+        self.assertEqual(profiles(), ["quiet", "sunday"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.follows.add(popular)
+        self.assertEqual(profiles(), ["sunday", "quiet"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.follows.clear()
+        self.assertEqual(autocomplete.get_index().lookup("sunday")["profiles"][0][3], 0)
+
+        tag = Tag.objects.create(name="sunset")
+        post = Post.objects.create(profile=self.user.profile, title="Post", body="")
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=tag.pk).update(post_count=1)
+            post.tags.add(tag)
+        self.assertEqual(autocomplete.get_index().lookup("sun")["tags"][0][3], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(pk=tag.pk).update(post_count=0)
+            post.delete()
+        self.assertEqual(autocomplete.get_index().lookup("sun")["tags"][0][3], 0)
+
+
+class InvertedIndexBackendTestCase(TestCase):
+    def setUp(self):
+        index_path = os.path.join(tempfile.mkdtemp(), "search_index.bin")
+        settings_override = override_settings(
+            SEARCH_BACKEND="search.backends.inverted_index.InvertedIndexBackend",
+            SEARCH_INDEX_PATH=index_path,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user(username="Demo", password="rootroot")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_post(self, title, body, **kwargs):
+        return Post.objects.create(profile=self.user.profile, title=title, body=body, **kwargs)
+
+    def test_varint_round_trip(self):
+        values = [0, 1, 127, 128, 300, 2**40]
+        encoded = bytearray()
+        for value in values:
+            encode_varint(value, encoded)
+        self.assertEqual(list(decode_varints(bytes(encoded))), values)
+
+    def test_rebuilt_segment_and_journal_updates(self):
+        body_match = self.create_post("Walk", "A sunset walk by the sea")
+        title_match = self.create_post("Sunset", "Over the bay")
+        self.create_post("Lunch", "Pasta", is_private=True)
+        backend = get_search_backend()
+
+        self.assertEqual(backend.rebuild(), 2)
+        self.assertEqual(backend.search_post_ids("sunset"), [title_match.id, body_match.id])
+        self.assertEqual(backend.search_post_ids("pasta"), [])
+
+        # Changes after the rebuild are journaled and visible right away
+        title_match.title = "Dawn"
+        title_match.save()
+        tag = Tag.objects.create(name="sunset")
+        new_post = self.create_post("Evening", "Orange sky")
+        new_post.tags.add(tag)
+        body_match.delete()
+        self.assertEqual(backend.search_post_ids("sunset"), [new_post.id])
+        self.assertEqual(backend.search_post_ids("dawn"), [title_match.id])
+
+        # Rebuilding folds the journal into a new segment
+        backend.rebuild()
+        self.assertEqual(backend.index.journal_size(), 0)
+        self.assertEqual(backend.search_post_ids("sunset"), [new_post.id])
+
+    def test_append_waits_for_journal_compaction(self):
+        index = get_search_backend().index
+        index.append([{"op": "delete", "id": 1}])
+        offset = index.journal_size()
+        appended = threading.Event()
+
+        def append():
+            index.append([{"op": "delete", "id": 2}])
+            appended.set()
+
+        with index.journal_lock(exclusive=True):
+            thread = threading.Thread(target=append)
+            thread.start()
+            self.assertFalse(appended.wait(0.2))
+        thread.join()
+
+        index.compact_journal(offset)
+        with open(index.journal_path) as journal:
+            self.assertEqual(journal.read(), '{"op":"delete","id":2}\n')
+
+    def test_search_endpoint_hydrates_ranked_ids(self):
+        self.create_post("Sunset", "Over the bay")
+        get_search_backend().rebuild()
+        response = self.client.get("/api/search/", {"type": "post", "query": "sunset"})
+        self.assertEqual(
+            [post["title"] for post in response.data["results"]["posts"]], ["Sunset"]
+        )
+
+
+class SearchCacheTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="Demo", password="rootroot")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def search(self):
+        response = self.client.get("/api/search/", {"type": "post", "query": "Sunset!"})
+        return [post["title"] for post in response.data["results"]["posts"]]
+
+    def test_cached_results_are_sliced_by_chunk(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return list(range(10))
+
+        self.assertEqual(list(cached_results("post", "a", compute, 4)[4:8]), [4, 5, 6, 7])
+        results = cached_results("post", "a", compute, 4)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(list(results[8:12]), [8, 9])
+        self.assertTrue(results.hit)
+        self.assertEqual(len(calls), 1)
+
+    def test_repeated_query_skips_search_until_a_post_is_written(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(profile=self.user.profile, title="Sunset", body="Bay")
+        self.assertEqual(self.search(), ["Sunset"])
+
+        with self.assertNumQueries(0):
+            results = cached_results(
+                "post",
+                get_search_backend().normalize_query("Sunset!"),
+                lambda: self.fail("search ran"),
+                9,
+            )
+            self.assertEqual(len(results), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(profile=self.user.profile, title="Lunch", body="Pasta")
+        self.assertEqual(self.search(), ["Sunset"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(profile=self.user.profile, title="Sunset again", body="Bay")
+        self.assertEqual(self.search(), ["Sunset", "Sunset again"])
+
+
+    def test_prefix_query_sees_new_and_deleted_posts(self):
+        def count(query):
+            return self.client.get("/api/search/", {"type": "post", "query": query}).data["count"]
+
+        self.assertEqual(count("suns"), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(profile=self.user.profile, title="Sunset walk", body="Bay")
+        self.assertEqual(count("suns"), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.is_private = True
+            post.save(update_fields=["is_private"])
+        self.assertEqual(count("suns"), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(profile=self.user.profile, title="Sunset bay", body="")
+        self.assertEqual(count("suns"), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+            Post.objects.get(title="Sunset bay").delete()
+        self.assertEqual(count("suns"), 0)
+
+    def test_queries_only_share_results_when_searched_alike(self):
+        User.objects.create_user(username="john-doe", password="rootroot")
+
+        def count(query):
+            return self.client.get("/api/search/", {"type": "profile", "query": query}).data["count"]
+
+        self.assertEqual(count("john doe"), 0)
+        self.assertEqual(count("john-doe"), 1)
+        self.assertEqual(count(" john-doe "), 1)
+
+
+class TagSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="Demo", password="rootroot")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.tag = Tag.objects.create(name="Sun Set")
+
+    def create_tagged_post(self, title, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                profile=self.user.profile, title=title, body="", **kwargs
+            )
+            post.tags.add(self.tag)
+        return post
+
+    def test_tagged_post_ids_newest_first_without_private_posts(self):
+        older = self.create_tagged_post("Older")
+        newer = self.create_tagged_post("Newer")
+        self.create_tagged_post("Hidden", is_private=True)
+        Post.objects.create(profile=self.user.profile, title="Untagged", body="")
+
+        with self.assertNumQueries(2):
+            self.assertEqual(tagged_post_ids("sun-set"), [newer.id, older.id])
+        self.assertEqual(tagged_post_ids("missing"), [])
+
+    def test_tag_search_matches_by_slug_and_sees_new_posts(self):
+        self.create_tagged_post("First")
+        response = self.client.get("/api/search/", {"type": "tag", "query": "sun SET"})
+        self.assertEqual([post["title"] for post in response.data["results"]["posts"]], ["First"])
+
+        self.create_tagged_post("Second")
+        response = self.client.get("/api/search/", {"type": "tag", "query": "Sun Set"})
+        self.assertEqual(
+            [post["title"] for post in response.data["results"]["posts"]], ["Second", "First"]
+        )
@@ -1,6 +1,7 @@
 from django.urls import path, include
-from .views import SearchView
+from .views import AutocompleteView, SearchView
 
 urlpatterns = [
     path('', SearchView.as_view()),
+    path('autocomplete/', AutocompleteView.as_view()),
 ]
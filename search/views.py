@@ -1,15 +1,35 @@
-from typing import List
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, connections
+from django.dispatch import receiver
 from django.db.models import Q
+from django.utils.text import slugify
 from rest_framework import generics
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from app.throttles import BurstRateThrottle, SustainedRateThrottle
+from app.throttles import (
+    AutocompleteRateThrottle,
+    BurstRateThrottle,
+    SustainedRateThrottle,
+)
 from posts.models import Post
 from profiles.models import Profile
+from tags.models import Tag
 from posts.serializers import PostsListSerializer
 from profiles.serializers import PublicProfileSerializer
+from . import autocomplete
+from .backends import get_search_backend
+from .cache import cached_results
+from .pagination import CappedPagination, PostSearchPagination, ProfileSearchPagination
+from .queries import tagged_post_ids
+from .serializers import AutocompleteSerializer
 from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
 
 
 @extend_schema(
@@ -23,20 +43,67 @@ class SearchView(generics.ListAPIView):
 
     The `SearchView` class is a Django REST Framework `ListAPIView` that handles the search functionality. It supports the following search types:
 
-    - `post`: Searches for posts based on the provided query string, which can match the post title, body, or tags.
-    - `tag`: Searches for posts based on the provided tag name.
+    - `post`: Searches for posts based on the provided query string, which can match the post title, body, or tags. Results come from the configured `SEARCH_BACKEND` as ranked post ids, and only the requested page is loaded from the database.
+    - `tag`: Searches for posts based on the provided tag name, matched through its slug, newest first.
     - `profile`: Searches for profiles based on the provided username.
 
-    If no search type is provided, the view will return both matching posts and profiles.
+    If no search type is provided, the view will return both matching posts and profiles. Each section is paginated independently
+    (`posts_page` and `profiles_page`) with its own `count`, `next` and `previous`, and both searches run concurrently.
+
+    `?format=compact` returns the pages in the columnar compact format of `app.renderers.CompactEncoder`.
+
+    Searches stop at `SEARCH_MAX_RESULTS` results: `count` is capped there and `truncated` is true when the cap was reached.
+
+    Result ids are cached per query, type and page (see `search.cache`), so repeated queries skip the search.
 
     The view uses pagination to limit the number of results returned, and applies rate limiting to prevent abuse. It also requires the user to be authenticated to access the search functionality.
     """
 
-    pagination_class = PageNumberPagination
+    pagination_class = CappedPagination
     permission_classes = [IsAuthenticated]
     throttle_classes = [BurstRateThrottle, SustainedRateThrottle]
+    throttle_costs = {"get": 3}
     serializer_class = PublicProfileSerializer
 
+    def get_post_ids(self, search_query: str, page_size: int) -> Sequence[int]:
+        """
+        Returns the ranked ids of the posts matching the query, from the search
+        cache when possible, else from the configured `SEARCH_BACKEND`.
+        """
+        backend = get_search_backend()
+        return cached_results(
+            "post",
+            backend.normalize_query(search_query),
+            lambda: backend.search_post_ids(search_query),
+            page_size,
+        )
+
+    def get_profile_ids(self, search_query: str, page_size: int) -> Sequence[int]:
+        # Profiles match on substrings, so any profile change invalidates them
+        search_query = search_query.strip()
+        return cached_results(
+            "profile",
+            search_query,
+            lambda: list(
+                Profile.objects.filter(username__icontains=search_query)
+                .order_by("username")
+                .values_list("id", flat=True)[: getattr(settings, "SEARCH_MAX_RESULTS", 1000)]
+            ),
+            page_size,
+        )
+
+    def hydrate_posts(self, post_ids: List[int]) -> List[Post]:
+        """
+        Loads the posts of a page of search results, keeping the backend order.
+        Posts deleted or unpublished since they were indexed are skipped.
+        """
+        posts = Post.objects.filter(is_private=False).with_list_data().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def hydrate_profiles(self, profile_ids: List[int]) -> List[Profile]:
+        profiles = Profile.objects.with_is_following(self.request.user).in_bulk(profile_ids)
+        return [profiles[profile_id] for profile_id in profile_ids if profile_id in profiles]
+
     def list(self, request, *args, **kwargs):
         search_query = self.request.query_params.get("query", "")
         search_type = self.request.query_params.get(
@@ -44,22 +111,14 @@ class SearchView(generics.ListAPIView):
         )  # type can be 'post' or 'profile'
 
         context = {"request": request}
+        page_size = self.paginator.get_page_size(request)
 
         if search_type == "post":
-            # Query for matching posts
-            posts = (
-                Post.objects.filter(
-                    Q(title__icontains=search_query)
-                    | Q(body__icontains=search_query)
-                    | Q(tags__name__icontains=search_query),
-                    is_private=False,
-                )
-                .distinct()
-                .order_by("-created")
-            )
+            # Query the search cache or backend for matching post ids
+            post_ids = self.get_post_ids(search_query, page_size)
 
-            # Paginate and serialize the posts
-            paginated_posts = self.paginate_queryset(posts)
+            # Paginate the ids, then load and serialize that page of posts
+            paginated_posts = self.hydrate_posts(self.paginate_queryset(post_ids))
             post_serializer = PostsListSerializer(
                 paginated_posts, many=True, context=context
             )
@@ -71,17 +130,17 @@ class SearchView(generics.ListAPIView):
             )
 
         elif search_type == "tag":
-            # Query for matching posts
-            posts = (
-                Post.objects.filter(
-                    Q(tags__name__iexact=search_query), is_private=False
-                )
-                .distinct()
-                .order_by("-created")
+            # Query for the posts tagged with the tag matching the query
+            tag_slug = slugify(search_query)
+            post_ids = cached_results(
+                "tag",
+                tag_slug,
+                lambda: tagged_post_ids(tag_slug),
+                page_size,
             )
 
-            # Paginate and serialize the posts
-            paginated_posts = self.paginate_queryset(posts)
+            # Paginate the ids, then load and serialize that page of posts
+            paginated_posts = self.hydrate_posts(self.paginate_queryset(post_ids))
             post_serializer = PostsListSerializer(
                 paginated_posts, many=True, context=context
             )
@@ -94,10 +153,10 @@ class SearchView(generics.ListAPIView):
 
         elif search_type == "profile":
             # Query for matching profiles
-            profiles = Profile.objects.filter(username__icontains=search_query)
+            profile_ids = self.get_profile_ids(search_query, page_size)
 
             # Paginate and serialize the profiles
-            paginated_profiles = self.paginate_queryset(profiles)
+            paginated_profiles = self.hydrate_profiles(self.paginate_queryset(profile_ids))
             profile_serializer = PublicProfileSerializer(
                 paginated_profiles, many=True, context=context
             )
@@ -109,33 +168,193 @@ class SearchView(generics.ListAPIView):
             )
 
         else:
-            # If no type or an invalid type was provided, return both posts and profiles
-            posts = (
-                Post.objects.filter(
-                    Q(title__icontains=search_query)
-                    | Q(body__icontains=search_query)
-                    | Q(tags__name__icontains=search_query),
-                    is_private=False,
-                )
-                .distinct()
-                .order_by("-created")
+            # If no type or an invalid type was provided, return both posts and profiles,
+            # each section paginated on its own with `posts_page` and `profiles_page`
+            sections = run_concurrently(
+                {
+                    "posts": lambda: self.get_posts_section(search_query),
+                    "profiles": lambda: self.get_profiles_section(search_query),
+                }
             )
+            return Response(sections)
 
-            profiles = Profile.objects.filter(username__icontains=search_query)
+    def get_posts_section(self, search_query: str):
+        paginator = PostSearchPagination()
+        post_ids = self.get_post_ids(search_query, paginator.get_page_size(self.request))
+        posts = self.hydrate_posts(
+            paginator.paginate_queryset(post_ids, self.request, view=self)
+        )
+        serializer = PostsListSerializer(
+            posts, many=True, context={"request": self.request}
+        )
+        return paginator.get_paginated_response(serializer.data).data
 
-            paginated_posts = self.paginate_queryset(posts)
-            paginated_profiles = self.paginate_queryset(profiles)
+    def get_profiles_section(self, search_query: str):
+        paginator = ProfileSearchPagination()
+        profile_ids = self.get_profile_ids(
+            search_query, paginator.get_page_size(self.request)
+        )
+        profiles = self.hydrate_profiles(
+            paginator.paginate_queryset(profile_ids, self.request, view=self)
+        )
+        serializer = PublicProfileSerializer(
+            profiles, many=True, context={"request": self.request}
+        )
+        return paginator.get_paginated_response(serializer.data).data
 
-            post_serializer = PostsListSerializer(
-                paginated_posts, many=True, context=context
-            )
-            profile_serializer = PublicProfileSerializer(
-                paginated_profiles, many=True, context=context
-            )
 
-            return self.get_paginated_response(
-                {
-                    "profiles": profile_serializer.data,
-                    "posts": post_serializer.data,
-                }
+@lru_cache(maxsize=None)
+def _load_executor(max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process wide search thread pool of `SEARCH_CONCURRENCY` threads.
+    """
+    return _load_executor(getattr(settings, "SEARCH_CONCURRENCY", 4))
+
+
+def _close_broken_connections() -> None:
+    # The pool threads keep their connections whatever CONN_MAX_AGE, opening
+    # one per task would cost more than the searches run in parallel save.
+    # Only the connections an error left unusable are closed.
+    for conn in connections.all(initialized_only=True):
+        if conn.connection is not None and conn.errors_occurred:
+            if conn.is_usable():
+                conn.errors_occurred = False
+            else:
+                conn.close()
+
+
+def _in_worker(function: Callable, wrappers: Dict[str, List[Callable]]):
+    _close_broken_connections()
+    # Installs the request's execute wrappers, so the query budget, metrics
+    # and profiling middlewares count the worker's queries too
+    with ExitStack() as stack:
+        for alias, alias_wrappers in wrappers.items():
+            for wrapper in alias_wrappers:
+                stack.enter_context(connections[alias].execute_wrapper(wrapper))
+        return function()
+
+
+def run_concurrently(tasks: Dict[str, Callable]) -> Dict:
+    """
+    Runs independent search tasks on the search thread pool and returns their
+    results by name. Inside a transaction the tasks run one after the other,
+    since other connections cannot see its uncommitted rows.
+
+    The request's execute wrappers which can `fork()`, e.g. query counters, get
+    a fresh copy per task, merged back once the tasks are done, so the workers
+    never share them.
+    """
+    if connection.in_atomic_block or len(tasks) < 2:
+        return {name: task() for name, task in tasks.items()}
+
+    forks = []
+    futures = {}
+    for name, task in tasks.items():
+        copies = {}
+        wrappers = {}
+        for alias in connections:
+            wrappers[alias] = []
+            for wrapper in connections[alias].execute_wrappers:
+                if hasattr(wrapper, "fork"):
+                    # A wrapper installed on several connections is forked once
+                    if id(wrapper) not in copies:
+                        copies[id(wrapper)] = (wrapper, wrapper.fork())
+                    wrapper = copies[id(wrapper)][1]
+                wrappers[alias].append(wrapper)
+        forks.extend(copies.values())
+        # Tasks run in the request's context, e.g. to read from the same replica set
+        futures[name] = get_executor().submit(
+            contextvars.copy_context().run, _in_worker, task, wrappers
+        )
+    try:
+        return {name: future.result() for name, future in futures.items()}
+    finally:
+        wait(futures.values())
+        for wrapper, copy in forks:
+            wrapper.merge(copy)
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    if setting == "SEARCH_CONCURRENCY":
+        _load_executor.cache_clear()
+
+
+@extend_schema(
+    summary="Autocomplete profiles and tags",
+    description="Returns the most followed profiles whose username or full name, and the most used tags whose name, start with the query.",
+    parameters=[
+        OpenApiParameter(name="query", type=OpenApiTypes.STR, required=True),
+        OpenApiParameter(name="limit", type=OpenApiTypes.INT),
+    ],
+    responses=AutocompleteSerializer,
+    tags=["Search"],
+)
+class AutocompleteView(generics.GenericAPIView):
+    """
+    Typeahead endpoint for usernames, full names and tag names.
+
+    Matches are prefix matches, which PostgreSQL answers from the `pg_trgm` indexes
+    created by the search migrations and other databases from the unique indexes on
+    `Profile.username` and `Tag.name`. Results are capped to `limit` per section.
+
+    With `AUTOCOMPLETE_ENGINE = "memory"` usernames and tag names are answered from
+    the in-process index in `search.autocomplete` without touching the database.
+    """
+
+    pagination_class = None
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [AutocompleteRateThrottle]
+    serializer_class = AutocompleteSerializer
+
+    def get_limit(self) -> int:
+        default_limit = getattr(settings, "AUTOCOMPLETE_LIMIT", 10)
+        try:
+            limit = int(self.request.query_params.get("limit", default_limit))
+        except ValueError:
+            limit = default_limit
+        return max(1, min(limit, getattr(settings, "AUTOCOMPLETE_MAX_LIMIT", 25)))
+
+    def get(self, request, *args, **kwargs):
+        search_query = request.query_params.get("query", "").strip()
+        if not search_query:
+            return Response({"profiles": [], "tags": []})
+
+        limit = self.get_limit()
+
+        # The database answers until the memory index is ready
+        index = autocomplete.get_index() if autocomplete.is_enabled() else None
+        if index is not None:
+            matches = index.lookup(search_query, limit)
+            profiles = [
+                {"id": id, "username": username, "full_name": full_name, "followers_count": weight}
+                for id, username, full_name, weight in matches["profiles"]
+            ]
+            tags = [
+                {"id": id, "name": name, "slug": slug, "post_count": weight}
+                for id, name, slug, weight in matches["tags"]
+            ]
+            return Response({"profiles": profiles, "tags": tags})
+
+        profiles = (
+            Profile.objects.filter(
+                Q(username__istartswith=search_query)
+                | Q(full_name__istartswith=search_query)
             )
+            .order_by("-followers_count", "username")
+            .values("id", "username", "full_name", "followers_count")[:limit]
+        )
+        tags = (
+            Tag.objects.filter(name__istartswith=search_query)
+            .order_by("-post_count", "name")
+            .values("id", "name", "slug", "post_count")[:limit]
+        )
+
+        serializer = self.get_serializer(
+            {"profiles": list(profiles), "tags": list(tags)}
+        )
+        return Response(serializer.data)
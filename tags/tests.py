@@ -1,3 +1,3 @@
-from django.test import TestCase
+from app.testing import TestCase
 
 # Create your tests here.
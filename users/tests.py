@@ -1,3 +1,21 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from app.testing import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+
+class UsersViewSetTestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='rootroot')
+        self.bob = User.objects.create_user(username='bob', password='rootroot')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+
+    def test_delete_own_account(self):
+        response = self.client.delete('/api/users/alice/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(User.objects.filter(username='alice').exists())
+
+    def test_cannot_delete_other_account(self):
+        response = self.client.delete('/api/users/bob/')
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(User.objects.filter(username='bob').exists())